@@ -0,0 +1,81 @@
+"""
+Benchmark of rendering a GDM PDF as one document against rendering it in parts in
+parallel and merging them, with the gdm_pdf.json sample scaled up to increasing
+numbers of blood glucose readings. Prints the smallest number of readings at which
+chunked rendering was faster, as a starting point for PATIENT_PDF_CHUNK_THRESHOLD.
+
+This runs wkhtmltopdf, so it needs the binary on the PATH. Run from the repository
+root with the same environment variables as the unit tests:
+
+    python -m benchmarks.bench_chunked_pdf --readings 500 2000 5000 10000
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from dhos_pdf_api.blueprint_api import controller, renderers
+from dhos_pdf_api.blueprint_api.render_context import shape_patient_pdf_context
+from dhos_pdf_api.config import Configuration
+from tests.sample_data.scaled import scale_patient_pdf_data
+
+SAMPLE_DATA = Path(__file__).parent.parent / "tests" / "sample_data"
+
+OPTIONS: Dict[str, Optional[str]] = {
+    "--footer-center": "Generated by the benchmark",
+    "--header-left": "GDm-Health patient record",
+    "--header-right": "Page [page] of [toPage]",
+    "--header-spacing": "4",
+}
+
+
+def _time(fn: Callable[[], bytes], number: int) -> float:
+    timings = []
+    for _ in range(number):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--readings", type=int, nargs="+", default=[500, 2000, 5000, 10000]
+    )
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--number", type=int, default=3)
+    args = parser.parse_args()
+
+    renderers.init_renderers(vars(Configuration))
+    sample: Dict = json.loads((SAMPLE_DATA / "gdm_pdf.json").read_text())
+    crossover: Optional[int] = None
+
+    print(f"{'readings':>8} {'single s':>9} {'chunked s':>10} {'speedup':>8}")
+    for readings in args.readings:
+        context = shape_patient_pdf_context(scale_patient_pdf_data(sample, readings))
+        single = _time(
+            lambda: controller.render_patient_pdf("gdm", context, OPTIONS),
+            args.number,
+        )
+        chunked = _time(
+            lambda: controller.render_patient_pdf_in_chunks(
+                "gdm", context, OPTIONS, args.chunk_size
+            ),
+            args.number,
+        )
+        if chunked < single and crossover is None:
+            crossover = readings
+        print(
+            f"{readings:>8} {single:>9.2f} {chunked:>10.2f} {single / chunked:>7.1f}x"
+        )
+
+    if crossover is None:
+        print("Chunked rendering was not faster at any size")
+    else:
+        print(f"Chunked rendering was faster from {crossover} readings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Micro-benchmark of the discharge metadata XML serializer against the dicttoxml
+implementation it replaced.
+
+Run from the repository root with the same environment variables as the unit tests:
+
+    python -m benchmarks.bench_pdf_metadata --number 20000
+"""
+import argparse
+import json
+import logging
+import timeit
+from pathlib import Path
+from typing import Callable, Dict
+
+import dicttoxml
+
+from dhos_pdf_api.blueprint_api import controller
+from tests.sample_data.legacy_metadata import dicttoxml_pdf_metadata_xml
+
+SAMPLE_DATA = Path(__file__).parent.parent / "tests" / "sample_data" / "send_pdf.json"
+
+
+def _time(fn: Callable[[Dict], bytes], data: Dict, number: int) -> float:
+    return min(timeit.repeat(lambda: fn(data), number=number, repeat=5)) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=10000)
+    args = parser.parse_args()
+    # As configured by the controller before dicttoxml was replaced.
+    dicttoxml.LOG.setLevel(logging.ERROR)
+
+    data: Dict = json.loads(SAMPLE_DATA.read_text())
+    data["pdf_filename"] = "2018L73782250.pdf"
+    data["encounter_id"] = "2018L73782250"
+    assert controller.create_pdf_metadata_xml(data) == dicttoxml_pdf_metadata_xml(data)
+
+    template = _time(controller.create_pdf_metadata_xml, data, args.number)
+    legacy = _time(dicttoxml_pdf_metadata_xml, data, args.number)
+    print(f"dicttoxml: {legacy * 1e6:8.1f} us/call")
+    print(f"template:  {template * 1e6:8.1f} us/call ({legacy / template:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
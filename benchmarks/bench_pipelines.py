@@ -0,0 +1,196 @@
+"""
+Micro-benchmarks of each stage of the document pipelines, with the samples in
+tests/sample_data scaled to realistic sizes: 10,000 blood glucose readings for the
+GDM and DBM templates, 2,000 observation sets for the SEND documents and a year of
+daily ward metrics for the ward report.
+
+Results can be saved as JSON and compared against a saved baseline, e.g. one from
+the main branch, to show regressions in review:
+
+    python -m benchmarks.bench_pipelines --output main.json
+    python -m benchmarks.bench_pipelines --baseline main.json --max-regression 1.2
+
+The comparison exits non-zero when a benchmark's median is more than
+--max-regression times the baseline's. Run from the repository root with the same
+environment variables as the unit tests. Nothing here runs wkhtmltopdf or the PDF
+engine, see bench_renderers for those.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from dhos_pdf_api.blueprint_api import controller, hl7_cda
+from dhos_pdf_api.blueprint_api.helpers import write_file
+from dhos_pdf_api.blueprint_api.render_context import shape_patient_pdf_context
+from dhos_pdf_api.blueprint_api.send_ward_report import (
+    SendWardReportData,
+    SendWardReportWriter,
+)
+from tests.sample_data.scaled import (
+    scale_patient_pdf_data,
+    scale_send_data,
+    scale_ward_metrics,
+)
+
+SAMPLE_DATA = Path(__file__).parent.parent / "tests" / "sample_data"
+
+Benchmarks = Dict[str, Callable[[], Any]]
+
+
+def _load(name: str) -> Dict:
+    return json.loads((SAMPLE_DATA / name).read_text())
+
+
+def _render_template(product: str, data: Dict) -> str:
+    return controller.template[product].render(**shape_patient_pdf_context(data))
+
+
+def _benchmarks(args: argparse.Namespace, output_dir: Path) -> Benchmarks:
+    benchmarks: Benchmarks = {}
+
+    for product, sample in (("gdm", "gdm_pdf.json"), ("dbm", "dbm_pdf_post.json")):
+        benchmarks[f"{product}_template_render"] = partial(
+            _render_template,
+            product,
+            scale_patient_pdf_data(_load(sample), args.readings),
+        )
+
+    send_data = scale_send_data(_load("send_pdf.json"), args.observation_sets)
+    send_data["patient"]["dob"] = "1985-07-01"
+    parser: object = hl7_cda.get_cda_parser()
+    benchmarks["send_hl7_cda_xml"] = lambda: hl7_cda.create_hl7_cda_xml(
+        send_data, "//server/share/folder", "2018L73782250.pdf", parser
+    )
+    metadata = {
+        **send_data,
+        "pdf_filename": "2018L73782250.pdf",
+        "encounter_id": "2018L73782250",
+    }
+    benchmarks["send_pdf_metadata_xml"] = lambda: controller.create_pdf_metadata_xml(
+        metadata
+    )
+    content: bytes = bytes(args.file_kb * 1024)
+    benchmarks["write_file"] = lambda: write_file(
+        str(output_dir / "write_file.pdf"), content, temp_dir=str(output_dir)
+    )
+
+    ward_data = scale_ward_metrics(
+        _load("send_ward_report/sample_metric_data.json"), args.days
+    )
+    benchmarks["ward_report_data"] = lambda: SendWardReportData(
+        ward_data["pdf_data"], ward_data["location_uuid"]
+    )
+    benchmarks["ward_report_write"] = lambda: SendWardReportWriter(
+        pdf_data=ward_data["pdf_data"],
+        hospital_name=ward_data["hospital_name"],
+        ward_name=ward_data["ward_name"],
+        report_month=ward_data["report_month"],
+        report_year=ward_data["report_year"],
+        location_uuid=ward_data["location_uuid"],
+        file_path=output_dir / "ward_report.pdf",
+    ).write()
+    return benchmarks
+
+
+def _measure(fn: Callable[[], Any], number: int) -> Dict[str, Any]:
+    fn()  # Warm up caches and lazy imports.
+    timings: List[float] = []
+    for _ in range(number):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {
+        "median_seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+        "max_seconds": max(timings),
+        "number": number,
+    }
+
+
+def compare(
+    results: Dict[str, Dict], baseline: Dict[str, Dict], max_regression: float
+) -> List[str]:
+    """
+    Returns the benchmarks whose median is more than max_regression times the
+    baseline's.
+    """
+    regressions: List[str] = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median_seconds"] / baseline[name]["median_seconds"]
+        result["baseline_median_seconds"] = baseline[name]["median_seconds"]
+        result["ratio"] = ratio
+        if ratio > max_regression:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--only", nargs="+", help="Benchmarks to run")
+    parser.add_argument("--number", type=int, default=5)
+    parser.add_argument("--readings", type=int, default=10000)
+    parser.add_argument("--observation-sets", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--file-kb", type=int, default=2048)
+    parser.add_argument("--output", type=Path, help="Save the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Results to compare against")
+    parser.add_argument("--max-regression", type=float, default=1.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        benchmarks = _benchmarks(args, Path(output_dir))
+        results: Dict[str, Dict] = {
+            name: _measure(fn, args.number)
+            for name, fn in benchmarks.items()
+            if not args.only or name in args.only
+        }
+
+    regressions: List[str] = []
+    if args.baseline:
+        baseline: Dict = json.loads(args.baseline.read_text())
+        regressions = compare(results, baseline["results"], args.max_regression)
+
+    if args.output:
+        report: Dict[str, Any] = {
+            "created": datetime.now(tz=timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": {
+                "readings": args.readings,
+                "observation_sets": args.observation_sets,
+                "days": args.days,
+                "file_kb": args.file_kb,
+            },
+            "results": results,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+
+    print(f"{'benchmark':<24} {'median ms':>10} {'min ms':>9} {'baseline ms':>12}")
+    for name, result in results.items():
+        baseline_seconds: Optional[float] = result.get("baseline_median_seconds")
+        comparison = (
+            f" {baseline_seconds * 1e3:>12.1f} {result['ratio']:>5.2f}x"
+            if baseline_seconds is not None
+            else ""
+        )
+        flag = "  REGRESSION" if name in regressions else ""
+        print(
+            f"{name:<24} {result['median_seconds'] * 1e3:>10.1f}"
+            f" {result['min_seconds'] * 1e3:>9.1f}{comparison}{flag}"
+        )
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark of rendering the GDM template from the pre-shaped render context against
+rendering the previous template from the raw request data, with the gdm_pdf.json
+sample scaled up to increasing numbers of blood glucose readings.
+
+Run from the repository root with the same environment variables as the unit tests:
+
+    python -m benchmarks.bench_render_context --readings 100 1000 5000
+"""
+import argparse
+import json
+import timeit
+from pathlib import Path
+from typing import Callable, Dict
+
+from jinja2 import Environment, FileSystemLoader
+
+from dhos_pdf_api.blueprint_api import controller
+from dhos_pdf_api.blueprint_api.render_context import shape_patient_pdf_context
+from tests.sample_data.scaled import scale_patient_pdf_data
+
+SAMPLE_DATA = Path(__file__).parent.parent / "tests" / "sample_data"
+
+
+def _time(fn: Callable[[], str], number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--readings", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--number", type=int, default=5)
+    args = parser.parse_args()
+
+    reference_env = Environment(
+        autoescape=True, loader=FileSystemLoader(SAMPLE_DATA / "templates")
+    )
+    reference_env.filters.update(controller.env.filters)
+    reference = reference_env.get_template("gdm_181_patient.html")
+    shaped = controller.template["gdm"]
+    sample: Dict = json.loads((SAMPLE_DATA / "gdm_pdf.json").read_text())
+
+    print(f"{'readings':>8} {'previous ms':>12} {'shaped ms':>10} {'speedup':>8}")
+    for readings in args.readings:
+        data = scale_patient_pdf_data(sample, readings)
+        previous = _time(lambda: reference.render(**data), args.number)
+        current = _time(
+            lambda: shaped.render(**shape_patient_pdf_context(data)), args.number
+        )
+        print(
+            f"{readings:>8} {previous * 1e3:>12.1f} {current * 1e3:>10.1f}"
+            f" {previous / current:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark of the PDF render backends, rendering the sample GDM, DBM and SEND payloads
+through every backend that can render them, and through the in-process layout in
+html_pdf as a baseline without a wkhtmltopdf process. Reports the latency of each render, the
+CPU time used by this process and its child processes (wkhtmltopdf), and the size of
+the PDF. The remote engine's own CPU time isn't included.
+
+Backends that can't run here, e.g. because wkhtmltopdf isn't installed or the PDF
+engine isn't reachable, are reported as failed. Run from the repository root with
+the same environment variables as the unit tests:
+
+    python -m benchmarks.bench_renderers --readings 100 --engine-url http://localhost:3000
+"""
+import argparse
+import json
+import resource
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from dhos_pdf_api.blueprint_api import controller, renderers
+from dhos_pdf_api.blueprint_api.render_context import shape_patient_pdf_context
+from dhos_pdf_api.blueprint_api.renderers import PdfRenderer, RenderRequest
+from dhos_pdf_api.config import Configuration
+from tests.sample_data.scaled import scale_patient_pdf_data
+
+from .html_pdf import InProcessRenderer
+
+# Only for the benchmark, it isn't a production backend.
+renderers.register_renderer("in-process", lambda config: InProcessRenderer())
+
+SAMPLE_DATA = Path(__file__).parent.parent / "tests" / "sample_data"
+
+OPTIONS: Dict[str, Optional[str]] = {
+    "--footer-center": "Generated by the benchmark",
+    "--header-left": "Patient record",
+    "--header-right": "Page [page] of [toPage]",
+    "--header-spacing": "4",
+}
+
+
+def _sample_requests(readings: int) -> List[RenderRequest]:
+    requests: List[RenderRequest] = []
+    for product, sample in (("gdm", "gdm_pdf.json"), ("dbm", "dbm_pdf_post.json")):
+        data = json.loads((SAMPLE_DATA / sample).read_text())
+        context = shape_patient_pdf_context(scale_patient_pdf_data(data, readings))
+        html = controller.template[product].render(**context)
+        requests.append(RenderRequest(product=product, html=html, options=OPTIONS))
+    send_data = json.loads((SAMPLE_DATA / "send_pdf.json").read_text())
+    requests.append(RenderRequest(product="send", data=send_data))
+    return requests
+
+
+def _cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _measure(
+    renderer: PdfRenderer, request: RenderRequest, number: int
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    cpu: List[float] = []
+    size = 0
+    for _ in range(number):
+        start, start_cpu = time.perf_counter(), _cpu_seconds()
+        size = len(renderer.render(request))
+        latencies.append(time.perf_counter() - start)
+        cpu.append(_cpu_seconds() - start_cpu)
+    return {
+        "latency_median_seconds": statistics.median(latencies),
+        "latency_max_seconds": max(latencies),
+        "cpu_median_seconds": statistics.median(cpu),
+        "size_bytes": size,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--backends", nargs="+", default=list(renderers.RENDERERS), help="Backends"
+    )
+    parser.add_argument("--readings", type=int, default=100)
+    parser.add_argument("--number", type=int, default=5)
+    parser.add_argument("--engine-url", default=Configuration.DHOS_PDF_ENGINE_URL)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    config: Dict[str, Any] = {
+        **vars(Configuration),
+        "DHOS_PDF_ENGINE_URL": args.engine_url,
+    }
+    results: List[Dict[str, Any]] = []
+    for name in args.backends:
+        renderer = renderers.create_renderer(name, config)
+        for request in _sample_requests(args.readings):
+            if request.product not in renderer.products:
+                continue
+            result: Dict[str, Any] = {"backend": name, "product": request.product}
+            try:
+                result.update(_measure(renderer, request, args.number))
+            except Exception as e:
+                result["error"] = (str(e) or type(e).__name__).splitlines()[0]
+            results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(
+        f"{'backend':<17} {'product':<7} {'median s':>9} {'max s':>7} {'cpu s':>7}"
+        f" {'size kB':>8}"
+    )
+    for result in results:
+        if "error" in result:
+            print(
+                f"{result['backend']:<17} {result['product']:<7} failed: {result['error']}"
+            )
+            continue
+        print(
+            f"{result['backend']:<17} {result['product']:<7}"
+            f" {result['latency_median_seconds']:>9.3f}"
+            f" {result['latency_max_seconds']:>7.3f}"
+            f" {result['cpu_median_seconds']:>7.3f}"
+            f" {result['size_bytes'] / 1024:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
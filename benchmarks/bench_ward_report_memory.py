@@ -0,0 +1,75 @@
+"""
+Memory leak check of ward report generation. Writes the sample ward report, scaled
+to the given number of days of metrics, repeatedly and reports how much traced and
+resident memory is still held after the warm-up reports, with the source lines whose
+allocations grew the most. Exits non-zero when growth exceeds a budget.
+
+Run from the repository root with the same environment variables as the unit tests:
+
+    python -m benchmarks.bench_ward_report_memory --reports 50 --max-traced-growth-kb 1024
+"""
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+from dhos_pdf_api.helper.memory_profile import budget_failures, profile_ward_reports
+from tests.sample_data.scaled import scale_ward_metrics
+
+SAMPLE_DATA = (
+    Path(__file__).parent.parent
+    / "tests"
+    / "sample_data"
+    / "send_ward_report"
+    / "sample_metric_data.json"
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--reports", type=int, default=50)
+    parser.add_argument("--warm-up", type=int, default=3)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--max-traced-growth-kb", type=float)
+    parser.add_argument("--max-rss-growth-kb", type=float)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    data: Dict = scale_ward_metrics(json.loads(SAMPLE_DATA.read_text()), args.days)
+    with tempfile.TemporaryDirectory() as output_dir:
+        report = profile_ward_reports(
+            data, Path(output_dir) / "ward_report.pdf", args.reports, args.warm_up
+        )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        peaks = report["peak_alloc_bytes"]
+        print(
+            f"{report['reports']} reports: traced memory grew"
+            f" {report['traced_growth_kb']:.0f} kB,"
+            f" RSS grew {report['rss_growth_kb']} kB,"
+            f" peak allocation per report {min(peaks) / 2**20:.1f}"
+            f"-{max(peaks) / 2**20:.1f} MB"
+        )
+        for growth in report["top_growth"]:
+            print(
+                f"  {growth['size_diff_kb']:>8.1f} kB {growth['count_diff']:>+7d}"
+                f"  {growth['location']}"
+            )
+
+    failures = budget_failures(
+        report,
+        max_traced_growth_kb=args.max_traced_growth_kb,
+        max_rss_growth_kb=args.max_rss_growth_kb,
+    )
+    for failure in failures:
+        print(f"Over budget: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
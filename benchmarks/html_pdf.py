@@ -0,0 +1,240 @@
+"""
+In-process rendering of the patient PDF templates, for the renderer benchmark
+
+Lays out the rendered HTML of the GDM and DBM templates as pages of text and tables,
+and draws them with matplotlib, without starting a wkhtmltopdf process. Only the
+structure those templates use is supported: headings, blocks of text, lists and
+tables. Styles are ignored, so the output is plainer than wkhtmltopdf's. It is a
+baseline for what rendering without a separate process costs, not a production
+backend, so bench_renderers registers it only for the benchmark.
+
+Of the wkhtmltopdf options, only the header and footer text is used, with [page] and
+[toPage] replaced as wkhtmltopdf would.
+"""
+import io
+import textwrap
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from lxml import html as lxml_html
+
+from dhos_pdf_api.blueprint_api.renderers import (
+    PATIENT_PDF_PRODUCTS,
+    PdfRenderer,
+    RenderRequest,
+)
+
+# A4, in points.
+PAGE_WIDTH = 595.0
+PAGE_HEIGHT = 842.0
+MARGIN = 42.0
+
+BODY_SIZE = 9.0
+HEADING_SIZES = {"h1": 16.0, "h2": 13.0, "h3": 10.0, "h4": 10.0}
+# Average width of a DejaVu Sans character, as a fraction of the font size.
+CHARACTER_WIDTH = 0.55
+LINE_SPACING = 1.35
+
+_BLOCK_TAGS = {"div", "p", "section", "ul", "ol", "li", "table"} | set(HEADING_SIZES)
+_SKIPPED_TAGS = {"head", "style", "script", "title"}
+
+
+class _Text(NamedTuple):
+    text: str
+    size: float = BODY_SIZE
+    bold: bool = False
+
+
+class _Table(NamedTuple):
+    header: Optional[Tuple[str, ...]]
+    rows: List[Tuple[str, ...]]
+
+
+class _Glyphs(NamedTuple):
+    x: float
+    y: float
+    text: str
+    size: float
+    bold: bool
+
+
+_Block = Union[_Text, _Table]
+
+
+def _clean(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _cells(row: lxml_html.HtmlElement) -> Tuple[str, ...]:
+    return tuple(
+        _clean(cell.text_content()) for cell in row if cell.tag in ("td", "th")
+    )
+
+
+def _table(table: lxml_html.HtmlElement) -> _Table:
+    header: Optional[Tuple[str, ...]] = None
+    rows: List[Tuple[str, ...]] = []
+    for row in table.iter("tr"):
+        if row.getparent().tag == "thead" and header is None:
+            header = _cells(row)
+        else:
+            rows.append(_cells(row))
+    return _Table(header=header, rows=rows)
+
+
+def _blocks(element: lxml_html.HtmlElement) -> Iterator[_Block]:
+    for child in element:
+        if not isinstance(child.tag, str) or child.tag in _SKIPPED_TAGS:
+            continue
+        if child.tag == "table":
+            yield _table(child)
+        elif child.tag in HEADING_SIZES:
+            yield _Text(_clean(child.text_content()), HEADING_SIZES[child.tag], True)
+        elif any(grandchild.tag in _BLOCK_TAGS for grandchild in child):
+            yield from _blocks(child)
+        else:
+            text = _clean(child.text_content())
+            if text:
+                yield _Text(f"• {text}" if child.tag == "li" else text)
+
+
+def _wrap(text: str, width: float, size: float) -> List[str]:
+    characters = max(int(width / (size * CHARACTER_WIDTH)), 1)
+    return textwrap.wrap(text, characters) or [""]
+
+
+class _Layout:
+    def __init__(self) -> None:
+        self.pages: List[List[_Glyphs]] = []
+        self.y = 0.0
+        self._new_page()
+
+    def _new_page(self) -> None:
+        self.pages.append([])
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def _line_height(self, size: float) -> float:
+        return size * LINE_SPACING
+
+    def _fits(self, height: float) -> bool:
+        return self.y - height >= MARGIN
+
+    def text(self, block: _Text) -> None:
+        lines = _wrap(block.text, PAGE_WIDTH - 2 * MARGIN, block.size)
+        if block.bold:
+            # Keep headings with at least the start of what follows them.
+            if not self._fits(self._line_height(block.size) * 3):
+                self._new_page()
+            self.y -= block.size * 0.5
+        for line in lines:
+            if not self._fits(self._line_height(block.size)):
+                self._new_page()
+            self.y -= self._line_height(block.size)
+            self.pages[-1].append(_Glyphs(MARGIN, self.y, line, block.size, block.bold))
+
+    def _row(self, cells: Tuple[str, ...], widths: List[float]) -> List[List[str]]:
+        return [_wrap(cell, width - 4, BODY_SIZE) for cell, width in zip(cells, widths)]
+
+    def _draw_row(
+        self, wrapped: List[List[str]], widths: List[float], bold: bool
+    ) -> None:
+        x = MARGIN
+        for lines, width in zip(wrapped, widths):
+            for number, line in enumerate(lines, start=1):
+                y = self.y - self._line_height(BODY_SIZE) * number
+                self.pages[-1].append(_Glyphs(x, y, line, BODY_SIZE, bold))
+            x += width
+        self.y -= self._line_height(BODY_SIZE) * max(len(lines) for lines in wrapped)
+
+    def table(self, block: _Table) -> None:
+        all_rows = ([block.header] if block.header else []) + block.rows
+        if not all_rows:
+            return
+        columns = max(len(row) for row in all_rows)
+        # Columns get space in proportion to their longest value, within limits.
+        weights = [
+            min(max((len(row[i]) for row in all_rows if i < len(row)), default=0), 40)
+            + 2
+            for i in range(columns)
+        ]
+        widths = [
+            (PAGE_WIDTH - 2 * MARGIN) * weight / sum(weights) for weight in weights
+        ]
+        header = self._row(block.header, widths) if block.header else None
+        if header:
+            self._draw_row(header, widths, bold=True)
+        for row in block.rows:
+            wrapped = self._row(row, widths)
+            height = self._line_height(BODY_SIZE) * max(len(lines) for lines in wrapped)
+            if not self._fits(height):
+                # Repeat the table header on each page, as wkhtmltopdf does.
+                self._new_page()
+                if header:
+                    self._draw_row(header, widths, bold=True)
+            self._draw_row(wrapped, widths, bold=False)
+
+
+def _margin_text(option: Optional[str], page: int, pages: int) -> str:
+    if not option:
+        return ""
+    return option.replace("[page]", str(page)).replace("[toPage]", str(pages))
+
+
+def render_html_pdf(html: str, options: Dict[str, Optional[str]]) -> bytes:
+    """
+    Renders the HTML of a patient PDF template to a PDF.
+    """
+    # Only needed by this renderer, and slow to import.
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    document = lxml_html.document_fromstring(html)
+    layout = _Layout()
+    for block in _blocks(document.find("body")):
+        if isinstance(block, _Table):
+            layout.table(block)
+        else:
+            layout.text(block)
+
+    output = io.BytesIO()
+    pages = len(layout.pages)
+    with PdfPages(output) as pdf:
+        for page_number, page in enumerate(layout.pages, start=1):
+            figure = Figure(figsize=(PAGE_WIDTH / 72, PAGE_HEIGHT / 72))
+            for glyphs in page:
+                figure.text(
+                    glyphs.x / PAGE_WIDTH,
+                    glyphs.y / PAGE_HEIGHT,
+                    glyphs.text,
+                    fontsize=glyphs.size,
+                    fontweight="bold" if glyphs.bold else "normal",
+                    parse_math=False,
+                )
+            for option, x, alignment, y in (
+                ("--header-left", MARGIN, "left", PAGE_HEIGHT - MARGIN / 2),
+                (
+                    "--header-right",
+                    PAGE_WIDTH - MARGIN,
+                    "right",
+                    PAGE_HEIGHT - MARGIN / 2,
+                ),
+                ("--footer-center", PAGE_WIDTH / 2, "center", MARGIN / 2),
+            ):
+                text = _margin_text(options.get(option), page_number, pages)
+                if text:
+                    figure.text(
+                        x / PAGE_WIDTH,
+                        y / PAGE_HEIGHT,
+                        text,
+                        fontsize=BODY_SIZE,
+                        horizontalalignment=alignment,
+                        parse_math=False,
+                    )
+            pdf.savefig(figure)
+    return output.getvalue()
+
+
+class InProcessRenderer(PdfRenderer):
+    products = PATIENT_PDF_PRODUCTS
+
+    def render(self, request: RenderRequest) -> bytes:
+        return render_html_pdf(request.html or "", request.options or {})
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 import connexion
 import kombu_batteries_included
@@ -9,61 +10,106 @@ from flask_batteries_included.config import is_not_production_environment
 from flask_batteries_included.sqldb import db, init_db
 from she_logging import logger
 
-from dhos_pdf_api.blueprint_api import api_blueprint
-from dhos_pdf_api.config import init_config
+from dhos_pdf_api.blueprint_api import (
+    admission,
+    api_blueprint,
+    cda_publisher,
+    controller,
+    render_retry,
+    renderers,
+)
+from dhos_pdf_api.blueprint_api.hl7_cda import start_schema_warm_up
+from dhos_pdf_api.config import Configuration, init_config
 from dhos_pdf_api.helper.cli import add_cli_command
+from dhos_pdf_api.helper.request_profile import init_request_profiling
+from dhos_pdf_api.helper.startup_profile import StartupProfiler
+from dhos_pdf_api.request_timing import init_request_timing
 
 
 def create_app(
-    testing: bool = False, use_pgsql: bool = True, use_sqlite: bool = False
+    testing: bool = False,
+    use_pgsql: bool = True,
+    use_sqlite: bool = False,
+    profiler: Optional[StartupProfiler] = None,
 ) -> Flask:
-    openapi_dir: Path = Path(__file__).parent / "openapi"
-    connexion_app: FlaskApp = connexion.App(
-        __name__,
-        specification_dir=openapi_dir,
-        options={"swagger_ui": is_not_production_environment()},
-    )
-    connexion_app.add_api("openapi.yaml", strict_validation=True)
+    if profiler is None:
+        profiler = StartupProfiler(enabled=Configuration.STARTUP_PROFILE)
+
+    with profiler.phase("connexion"):
+        openapi_dir: Path = Path(__file__).parent / "openapi"
+        connexion_app: FlaskApp = connexion.App(
+            __name__,
+            specification_dir=openapi_dir,
+            options={"swagger_ui": is_not_production_environment()},
+        )
+        connexion_app.add_api("openapi.yaml", strict_validation=True)
 
     # Create a Flask app.
-    app: Flask = fbi_augment_app(
-        app=connexion_app.app,
-        use_pgsql=use_pgsql,
-        use_sqlite=use_sqlite,
-        use_auth0=True,
-        testing=testing,
-    )
+    with profiler.phase("augment app"):
+        app: Flask = fbi_augment_app(
+            app=connexion_app.app,
+            use_pgsql=use_pgsql,
+            use_sqlite=use_sqlite,
+            use_auth0=True,
+            testing=testing,
+        )
 
     init_config(app)
+    if app.config["WARD_REPORT_TRACE_MALLOC"] and not is_not_production_environment():
+        raise ValueError("WARD_REPORT_TRACE_MALLOC can't be used in production")
+    renderers.init_renderers(app.config)
+    render_retry.init_retry_queue(app)
+    admission.init_admission(app)
+    init_request_timing(app)
+    init_request_profiling(app)
 
     # Initialise k-b-i library to allow publishing to RabbitMQ.
-    kombu_batteries_included.init()
+    with profiler.phase("kombu"):
+        kombu_batteries_included.init()
 
     # Register the API blueprint.
     app.register_blueprint(api_blueprint, url_prefix="/dhos/v1")
     app.logger.info("Registered API blueprint")
 
     # Configure the SQL database
-    init_db(app=app, testing=testing)
+    with profiler.phase("database"):
+        init_db(app=app, testing=testing)
 
-    # Create all the tables in the in-memory database
-    if testing:
-        with app.app_context():
-            db.create_all()
+        # Create all the tables in the in-memory database
+        if testing:
+            with app.app_context():
+                db.create_all()
 
     add_cli_command(app)
 
     # Create directories we need if they don't already exist
-    for key in (
-        "SEND_BCP_OUTPUT_DIR",
-        "SEND_BCP_RSYNC_DIR",
-        "SEND_DISCHARGE_OUTPUT_DIR",
-        "SEND_TMP_OUTPUT_DIR",
-        "SEND_WARD_REPORT_OUTPUT_DIR",
-    ):
-        if app.config[key]:
-            path: Path = Path(app.config[key])
-            path.mkdir(parents=True, exist_ok=True)
+    with profiler.phase("directories"):
+        for key in (
+            "SEND_BCP_OUTPUT_DIR",
+            "SEND_BCP_RSYNC_DIR",
+            "SEND_DISCHARGE_OUTPUT_DIR",
+            "SEND_TMP_OUTPUT_DIR",
+            "SEND_WARD_REPORT_OUTPUT_DIR",
+            "CDA_PUBLISH_SPOOL_DIR",
+        ):
+            if app.config[key]:
+                path: Path = Path(app.config[key])
+                path.mkdir(parents=True, exist_ok=True)
+
+    # Compile the CDA schema off the request path if this deployment produces CDA
+    # documents. Deployments without CDA never compile it.
+    if app.config["SEND_BCP_CDA_UNC_PATH"] and app.config["CDA_SCHEMA_WARM_UP"]:
+        start_schema_warm_up()
+
+    if app.config["WARD_REPORT_WARM_UP"]:
+        controller.start_ward_report_warm_up()
+
+    if app.config["CDA_PUBLISH_MODE"] == "batched":
+        with profiler.phase("cda publisher"):
+            cda_publisher.init_publisher(app)
+
+    if profiler.enabled:
+        profiler.log()
 
     # Done!
     logger.info("App ready to serve requests")
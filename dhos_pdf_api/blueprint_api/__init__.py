@@ -1,17 +1,20 @@
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
-from flask import Blueprint, Response, current_app, make_response
+from flask import Blueprint, Response, current_app, jsonify, make_response
 from flask_batteries_included.helpers.security import protected_route
 from flask_batteries_included.helpers.security.endpoint_security import scopes_present
 from she_logging import logger
 
 from dhos_pdf_api.blueprint_api import controller
+from dhos_pdf_api.blueprint_api.admission import admission_controlled
+from dhos_pdf_api.metrics import time_stage
 from dhos_pdf_api.models.api_spec import (
     DbmPdfRequestSchema,
     GdmPdfRequestSchema,
     SendPdfRequestSchema,
     WardReportRequestSchema,
+    WardTrendReportRequestSchema,
 )
 
 api_blueprint = Blueprint("api", __name__)
@@ -19,6 +22,7 @@ api_blueprint = Blueprint("api", __name__)
 
 @api_blueprint.route("/gdm_pdf", methods=["POST"])
 @protected_route(scopes_present(required_scopes="write:gdm_pdf"))
+@admission_controlled("render")
 def create_gdm_patient_pdf(gdm_patient_details: Dict) -> Response:
     """---
     post:
@@ -38,6 +42,8 @@ def create_gdm_patient_pdf(gdm_patient_details: Dict) -> Response:
       responses:
         '201':
           description: PDF document created
+        '202':
+          description: PDF document will be created in the background
         default:
           description: >-
             Error, e.g. 400 Bad Request, 404 Not Found, 503 Service Unavailable
@@ -46,13 +52,15 @@ def create_gdm_patient_pdf(gdm_patient_details: Dict) -> Response:
               schema: Error
     """
     logger.debug(f"gdm_patient_details: {gdm_patient_details}")
-    pdf_data: Dict = GdmPdfRequestSchema().load(gdm_patient_details)
-    controller.create_patient_pdf(data=pdf_data, product_name="gdm")
-    return make_response("", 201)
+    with time_stage("gdm", "schema_load"):
+        pdf_data: Dict = GdmPdfRequestSchema().load(gdm_patient_details)
+    created: bool = controller.create_patient_pdf(data=pdf_data, product_name="gdm")
+    return make_response("", 201 if created else 202)
 
 
 @api_blueprint.route("/dbm_pdf", methods=["POST"])
 @protected_route(scopes_present(required_scopes="write:gdm_pdf"))
+@admission_controlled("render")
 def create_patient_pdf(patient_details: Dict) -> Response:
     """---
     post:
@@ -72,6 +80,8 @@ def create_patient_pdf(patient_details: Dict) -> Response:
       responses:
         '201':
           description: PDF document created
+        '202':
+          description: PDF document will be created in the background
         default:
           description: >-
             Error, e.g. 400 Bad Request, 404 Not Found, 503 Service Unavailable
@@ -79,13 +89,17 @@ def create_patient_pdf(patient_details: Dict) -> Response:
             application/json:
               schema: Error
     """
-    patient_details = DbmPdfRequestSchema().load(patient_details)
-    controller.create_patient_pdf(data=patient_details, product_name="dbm")
-    return make_response("", 201)
+    with time_stage("dbm", "schema_load"):
+        patient_details = DbmPdfRequestSchema().load(patient_details)
+    created: bool = controller.create_patient_pdf(
+        data=patient_details, product_name="dbm"
+    )
+    return make_response("", 201 if created else 202)
 
 
 @api_blueprint.route("/gdm_pdf/<patient_uuid>", methods=["GET"])
 @protected_route(scopes_present(required_scopes="read:gdm_pdf"))
+@admission_controlled("download")
 def get_gdm_patient_pdf(patient_uuid: str) -> Response:
     """---
     get:
@@ -123,6 +137,7 @@ def get_gdm_patient_pdf(patient_uuid: str) -> Response:
 
 @api_blueprint.route("/dbm_pdf/<patient_uuid>", methods=["GET"])
 @protected_route(scopes_present(required_scopes="read:gdm_pdf"))
+@admission_controlled("download")
 def get_patient_pdf(patient_uuid: str) -> Response:
     """---
     get:
@@ -160,6 +175,7 @@ def get_patient_pdf(patient_uuid: str) -> Response:
 
 @api_blueprint.route("/send_pdf", methods=["POST"])
 @protected_route(scopes_present(required_scopes="write:send_pdf"))
+@admission_controlled("engine")
 def create_send_documents(send_documents_details: Dict) -> Response:
     """---
     post:
@@ -185,13 +201,15 @@ def create_send_documents(send_documents_details: Dict) -> Response:
             application/json:
               schema: Error
     """
-    data: Dict = SendPdfRequestSchema().load(send_documents_details)
+    with time_stage("send", "schema_load"):
+        data: Dict = SendPdfRequestSchema().load(send_documents_details)
     controller.create_send_documents(data)
     return make_response("", 201)
 
 
 @api_blueprint.route("/patient/pdf/<encounter_uuid>", methods=["GET"])
 @protected_route(scopes_present(required_scopes="read:send_pdf"))
+@admission_controlled("download")
 def get_send_patient_pdf(encounter_uuid: str) -> Response:
     """---
     get:
@@ -227,6 +245,7 @@ def get_send_patient_pdf(encounter_uuid: str) -> Response:
 
 @api_blueprint.route("/ward_report", methods=["POST"])
 @protected_route(scopes_present(required_scopes="write:ward_report"))
+@admission_controlled("render")
 def create_ward_report(ward_report_details: Dict) -> Response:
     """---
     post:
@@ -252,7 +271,8 @@ def create_ward_report(ward_report_details: Dict) -> Response:
             application/json:
               schema: Error
     """
-    data = WardReportRequestSchema().load(ward_report_details)
+    with time_stage("ward", "schema_load"):
+        data = WardReportRequestSchema().load(ward_report_details)
     controller.generate_send_ward_report_pdf(
         data, ward_report_folder=Path(current_app.config["SEND_WARD_REPORT_OUTPUT_DIR"])
     )
@@ -261,7 +281,10 @@ def create_ward_report(ward_report_details: Dict) -> Response:
 
 @api_blueprint.route("/ward_report/<location_uuid>", methods=["GET"])
 @protected_route(scopes_present(required_scopes="read:ward_report"))
-def get_ward_report(location_uuid: str) -> Response:
+@admission_controlled("download")
+def get_ward_report(
+    location_uuid: str, year: Optional[int] = None, month: Optional[int] = None
+) -> Response:
     """---
     get:
       summary: Get SEND ward report PDF by location UUID
@@ -276,6 +299,22 @@ def get_ward_report(location_uuid: str) -> Response:
           schema:
             type: string
             example: '18439f36-ffa9-42ae-90de-0beda299cd37'
+        - name: year
+          in: query
+          required: false
+          description: Year of the report, with month. Defaults to the latest report
+          schema:
+            type: integer
+            example: 2019
+        - name: month
+          in: query
+          required: false
+          description: Month of the report from 1, with year
+          schema:
+            type: integer
+            minimum: 1
+            maximum: 12
+            example: 7
       responses:
         '200':
           description: The requested PDF document
@@ -293,5 +332,202 @@ def get_ward_report(location_uuid: str) -> Response:
     content: bytes = controller.get_send_ward_report_pdf(
         location_uuid,
         ward_report_folder=Path(current_app.config["SEND_WARD_REPORT_OUTPUT_DIR"]),
+        year=year,
+        month=month,
     )
     return controller.pdf_stream(content)
+
+
+@api_blueprint.route("/ward_report/<location_uuid>/index", methods=["GET"])
+@protected_route(scopes_present(required_scopes="read:ward_report"))
+@admission_controlled("download")
+def list_ward_reports(location_uuid: str) -> Response:
+    """---
+    get:
+      summary: List stored SEND ward reports for a location
+      description: >-
+        Get the stored SEND ward reports for the provided location UUID, latest month
+        first.
+      tags: [pdf]
+      parameters:
+        - name: location_uuid
+          in: path
+          required: true
+          description: The location UUID for the hospital ward
+          schema:
+            type: string
+            example: '18439f36-ffa9-42ae-90de-0beda299cd37'
+      responses:
+        '200':
+          description: The stored ward reports
+          content:
+            application/json:
+              schema:
+                type: array
+                items: WardReportSchema
+        default:
+          description: Error, e.g. 503 Service Unavailable
+          content:
+            application/json:
+              schema: Error
+    """
+    return jsonify(controller.list_ward_reports(location_uuid))
+
+
+@api_blueprint.route("/ward_report/<location_uuid>/summary", methods=["GET"])
+@protected_route(scopes_present(required_scopes="read:ward_report"))
+@admission_controlled("download")
+def get_ward_report_summary(
+    location_uuid: str, year: Optional[int] = None, month: Optional[int] = None
+) -> Response:
+    """---
+    get:
+      summary: Get the summary of a SEND ward report by location UUID
+      description: >-
+        Get the figures shown in a SEND ward report for the provided location UUID, as
+        JSON, without downloading the PDF.
+      tags: [pdf]
+      parameters:
+        - name: location_uuid
+          in: path
+          required: true
+          description: The location UUID for the hospital ward
+          schema:
+            type: string
+            example: '18439f36-ffa9-42ae-90de-0beda299cd37'
+        - name: year
+          in: query
+          required: false
+          description: Year of the report, with month. Defaults to the latest report
+          schema:
+            type: integer
+            example: 2019
+        - name: month
+          in: query
+          required: false
+          description: Month of the report from 1, with year
+          schema:
+            type: integer
+            minimum: 1
+            maximum: 12
+            example: 7
+      responses:
+        '200':
+          description: The summary of the requested ward report
+          content:
+            application/json:
+              schema: WardReportSummarySchema
+        default:
+          description: Error, e.g. 404 Not Found, 503 Service Unavailable
+          content:
+            application/json:
+              schema: Error
+    """
+    content: bytes = controller.get_send_ward_report_summary(
+        location_uuid,
+        ward_report_folder=Path(current_app.config["SEND_WARD_REPORT_OUTPUT_DIR"]),
+        year=year,
+        month=month,
+    )
+    return Response(content, mimetype="application/json")
+
+
+@api_blueprint.route("/ward_report/<location_uuid>/thumbnail", methods=["GET"])
+@protected_route(scopes_present(required_scopes="read:ward_report"))
+@admission_controlled("download")
+def get_ward_report_thumbnail(
+    location_uuid: str, year: Optional[int] = None, month: Optional[int] = None
+) -> Response:
+    """---
+    get:
+      summary: Get a thumbnail of a SEND ward report by location UUID
+      description: >-
+        Get a small PNG image of the first page of a SEND ward report for the provided
+        location UUID.
+      tags: [pdf]
+      parameters:
+        - name: location_uuid
+          in: path
+          required: true
+          description: The location UUID for the hospital ward
+          schema:
+            type: string
+            example: '18439f36-ffa9-42ae-90de-0beda299cd37'
+        - name: year
+          in: query
+          required: false
+          description: Year of the report, with month. Defaults to the latest report
+          schema:
+            type: integer
+            example: 2019
+        - name: month
+          in: query
+          required: false
+          description: Month of the report from 1, with year
+          schema:
+            type: integer
+            minimum: 1
+            maximum: 12
+            example: 7
+      responses:
+        '200':
+          description: The thumbnail of the requested ward report
+          content:
+            image/png:
+              schema:
+                type: string
+                format: binary
+        default:
+          description: Error, e.g. 404 Not Found, 503 Service Unavailable
+          content:
+            application/json:
+              schema: Error
+    """
+    content: bytes = controller.get_send_ward_report_thumbnail(
+        location_uuid,
+        ward_report_folder=Path(current_app.config["SEND_WARD_REPORT_OUTPUT_DIR"]),
+        year=year,
+        month=month,
+    )
+    return Response(content, mimetype="image/png")
+
+
+@api_blueprint.route("/ward_trend_report", methods=["POST"])
+@protected_route(scopes_present(required_scopes="read:ward_report"))
+@admission_controlled("render")
+def create_ward_trend_report(trend_report_details: Dict) -> Response:
+    """---
+    post:
+      summary: Get a SEND PDF trend report for a set of wards over a range of months
+      description: >-
+        Generate a SEND PDF trend report from the stored ward metrics of the provided
+        locations, with a page for the hospital, a page comparing the wards and a page
+        for each ward, each showing the observations by month.
+      tags: [pdf]
+      requestBody:
+        description: Wards and months to include in the report
+        required: true
+        content:
+          application/json:
+            schema:
+                x-body-name: trend_report_details
+                $ref: '#/components/schemas/WardTrendReportRequestSchema'
+      responses:
+        '200':
+          description: The trend report PDF document
+          content:
+            application/pdf:
+              schema:
+                type: string
+                format: binary
+        default:
+          description: >-
+            Error, e.g. 400 Bad Request, 404 Not Found, 503 Service Unavailable
+          content:
+            application/json:
+              schema: Error
+    """
+    with time_stage("ward", "schema_load"):
+        data = WardTrendReportRequestSchema().load(trend_report_details)
+    content: bytes = controller.generate_ward_trend_report_pdf(data)
+    return controller.pdf_stream(content)
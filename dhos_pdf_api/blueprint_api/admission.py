@@ -0,0 +1,152 @@
+"""
+Admission control for the API routes
+
+Each route belongs to a class: "render" routes render PDFs in this process, "engine"
+routes wait on the PDF engine, and "download" routes return stored files. Each class
+can be given its own limit on how many of its requests run at once, and on how many
+more may wait for one of those to finish. A request that finds the wait queue full,
+or waits longer than ADMISSION_MAX_WAIT_SEC, is rejected straight away with
+ADMISSION_REJECT_STATUS and a Retry-After header, rather than taking a server thread
+for the whole time.
+
+Waiting requests still occupy a waitress thread, so the running and waiting limits of
+the expensive classes together need to leave threads free for the others.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Generator, Optional, Tuple, TypeVar, cast
+
+import flask
+from flask import Flask, Response
+from she_logging import logger
+
+from dhos_pdf_api.metrics import ADMISSION_IN_FLIGHT, ADMISSION_REJECTIONS
+
+ROUTE_CLASSES = ("render", "engine", "download")
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, route_class: str, reason: str, retry_after: int) -> None:
+        super().__init__(f"Too many {route_class} requests: {reason}")
+        self.route_class = route_class
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    def __init__(
+        self,
+        route_class: str,
+        max_concurrent: int,
+        max_waiting: int,
+        max_wait_seconds: float,
+    ) -> None:
+        self.route_class = route_class
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.max_wait_seconds = max_wait_seconds
+        self.running = 0
+        self.waiting = 0
+        # Moving average of how long admitted requests take, for Retry-After.
+        self.average_seconds = 1.0
+        self._condition = threading.Condition()
+
+    def retry_after(self) -> int:
+        backlog = (self.running + self.waiting) / max(self.max_concurrent, 1)
+        return max(1, math.ceil(self.average_seconds * backlog))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        ADMISSION_REJECTIONS.labels(route_class=self.route_class).inc()
+        logger.warning("Rejected %s request: %s", self.route_class, reason)
+        return AdmissionRejected(self.route_class, reason, self.retry_after())
+
+    def _acquire(self) -> None:
+        with self._condition:
+            if self.running < self.max_concurrent and not self.waiting:
+                self.running += 1
+                return
+            if self.waiting >= self.max_waiting:
+                raise self._reject("wait queue is full")
+            self.waiting += 1
+            try:
+                admitted = self._condition.wait_for(
+                    lambda: self.running < self.max_concurrent,
+                    timeout=self.max_wait_seconds,
+                )
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                raise self._reject(f"waited {self.max_wait_seconds}s")
+            self.running += 1
+
+    def _release(self, seconds: float) -> None:
+        with self._condition:
+            self.running -= 1
+            self.average_seconds = 0.8 * self.average_seconds + 0.2 * seconds
+            self._condition.notify()
+
+    @contextmanager
+    def admit(self) -> Generator[None, None, None]:
+        self._acquire()
+        start = time.perf_counter()
+        try:
+            with ADMISSION_IN_FLIGHT.labels(
+                route_class=self.route_class
+            ).track_inprogress():
+                yield
+        finally:
+            self._release(time.perf_counter() - start)
+
+
+_limiters: Dict[str, AdmissionLimiter] = {}
+
+
+def init_admission(app: Flask) -> None:
+    """
+    Creates a limiter for each route class with a concurrency limit. Classes with a
+    limit of 0 aren't limited.
+    """
+    _limiters.clear()
+    for route_class in ROUTE_CLASSES:
+        prefix = f"ADMISSION_{route_class.upper()}"
+        max_concurrent: int = app.config[f"{prefix}_CONCURRENCY"]
+        if max_concurrent:
+            _limiters[route_class] = AdmissionLimiter(
+                route_class=route_class,
+                max_concurrent=max_concurrent,
+                max_waiting=app.config[f"{prefix}_QUEUE_SIZE"],
+                max_wait_seconds=app.config["ADMISSION_MAX_WAIT_SEC"],
+            )
+    app.register_error_handler(AdmissionRejected, catch_admission_rejected)
+
+
+def get_limiter(route_class: str) -> Optional[AdmissionLimiter]:
+    return _limiters.get(route_class)
+
+
+def admission_controlled(route_class: str) -> Callable[[F], F]:
+    if route_class not in ROUTE_CLASSES:
+        raise ValueError(f"Unknown route class '{route_class}'")
+
+    def decorator(view: F) -> F:
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            limiter = get_limiter(route_class)
+            if limiter is None:
+                return view(*args, **kwargs)
+            with limiter.admit():
+                return view(*args, **kwargs)
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+def catch_admission_rejected(error: AdmissionRejected) -> Tuple[Response, int]:
+    response: Response = flask.jsonify({"message": str(error)})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, flask.current_app.config["ADMISSION_REJECT_STATUS"]
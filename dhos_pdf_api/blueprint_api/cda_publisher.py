@@ -0,0 +1,291 @@
+"""
+Batched publishing of CDA messages
+
+Publishing a message to RabbitMQ inside the HTTP request means a slow broker adds
+directly to request latency. The BatchPublisher takes messages off the request path:
+each message is first persisted to a spool directory, then queued for a background
+thread which publishes them in batches and only removes them from the spool once the
+broker has confirmed them. The spool is scanned when the publisher starts and then
+periodically, so messages left there by a batch that failed, or by an earlier process,
+are published again.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import kombu_batteries_included
+from flask import Flask
+from flask_batteries_included.helpers.error_handler import ServiceUnavailableException
+from kombu import Connection, Producer
+from kombu_batteries_included import infra
+from she_logging import logger
+from she_logging.request_id import current_request_id
+
+from dhos_pdf_api.blueprint_api.helpers import write_file
+from dhos_pdf_api.metrics import time_stage
+
+SPOOL_SUFFIX = ".json"
+
+SpooledMessage = Tuple[Path, Dict[str, Any]]
+
+
+class KombuBatchTransport:
+    """
+    Publishes a batch of messages over a single connection with publisher confirms,
+    so a call only returns once the broker has accepted every message.
+    """
+
+    def __init__(self, connection_string: str, compression: Optional[str]) -> None:
+        self.connection_string = connection_string
+        self.compression = compression
+
+    def __call__(self, messages: List[Dict[str, Any]]) -> None:
+        if kombu_batteries_included.config.RABBITMQ_DISABLED:
+            logger.debug("Skipping RabbitMQ message publish due to config")
+            return
+        with Connection(
+            self.connection_string, transport_options={"confirm_publish": True}
+        ) as conn:
+            producer: Producer = Producer(conn)
+            for message in messages:
+                producer.publish(
+                    body=json.dumps(message["body"]),
+                    exchange=infra.TASK_EXCHANGE_NAME,
+                    routing_key=message["routing_key"],
+                    content_type="application/text",
+                    compression=self.compression,
+                    retry=True,
+                    timestamp=message["timestamp"],
+                    correlation_id=message["correlation_id"],
+                )
+        logger.debug("Published batch of %d messages", len(messages))
+
+
+class InMemoryTransport:
+    """
+    Collects published batches in memory. Fails the next `fail_next` calls, to allow
+    retry behaviour to be exercised.
+    """
+
+    def __init__(self, fail_next: int = 0) -> None:
+        self.batches: List[List[Dict[str, Any]]] = []
+        self.fail_next = fail_next
+
+    def __call__(self, messages: List[Dict[str, Any]]) -> None:
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            raise ConnectionError("In-memory transport failure")
+        self.batches.append(list(messages))
+
+
+class BatchPublisher:
+    def __init__(
+        self,
+        spool_dir: Path,
+        transport: Callable[[List[Dict[str, Any]]], None],
+        max_queue_size: int = 1000,
+        batch_size: int = 50,
+        flush_interval: float = 0.5,
+        max_retries: int = 5,
+        retry_delay: float = 1.0,
+        enqueue_timeout: float = 5.0,
+        spool_rescan_interval: float = 60.0,
+    ) -> None:
+        self.spool_dir = spool_dir
+        self.transport = transport
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.enqueue_timeout = enqueue_timeout
+        self.spool_rescan_interval = spool_rescan_interval
+        self._queue: "queue.Queue[SpooledMessage]" = queue.Queue(maxsize=max_queue_size)
+        # Spooled messages that are queued or being published, so that scanning the
+        # spool doesn't queue them again.
+        self._pending: Set[Path] = set()
+        self._pending_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._scan_spool()
+        self._thread = threading.Thread(
+            target=self._run, name="cda-batch-publisher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stops the publisher once everything already queued has been published or
+        has failed, without waiting to retry. Failed messages stay in the spool for
+        the next process.
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, routing_key: str, body: Dict[str, Any]) -> None:
+        message: Dict[str, Any] = {
+            "routing_key": routing_key,
+            "body": body,
+            "timestamp": int(time.time()),
+            "correlation_id": current_request_id(),
+        }
+        path = self.spool_dir / f"{time.time_ns():020d}-{uuid.uuid4()}{SPOOL_SUFFIX}"
+        with self._pending_lock:
+            self._pending.add(path)
+        try:
+            write_file(
+                str(path),
+                json.dumps(message).encode("utf8"),
+                temp_dir=str(self.spool_dir),
+                raise_on_failure=True,
+                stage_prefix="spool_",
+            )
+        except OSError:
+            # Queued without a spooled copy it would be lost if the process stopped.
+            self._done(path)
+            logger.exception("Failed to spool CDA message, message not published")
+            raise ServiceUnavailableException("Failed to spool CDA message")
+        try:
+            self._queue.put((path, message), timeout=self.enqueue_timeout)
+        except queue.Full:
+            # The client is told to retry, so the spooled copy must not be published
+            # later as well.
+            path.unlink()
+            self._done(path)
+            logger.error("CDA publish queue is full, message not published")
+            raise ServiceUnavailableException("CDA publish queue is full")
+
+    def _done(self, path: Path) -> None:
+        with self._pending_lock:
+            self._pending.discard(path)
+
+    def _scan_spool(self) -> None:
+        """
+        Queues the spooled messages that aren't already queued or being published.
+        """
+        with self._pending_lock:
+            spooled = [
+                path
+                for path in sorted(self.spool_dir.glob(f"*{SPOOL_SUFFIX}"))
+                if path not in self._pending
+            ]
+            self._pending.update(spooled)
+        if not spooled:
+            return
+        logger.info("Queueing %d spooled CDA messages", len(spooled))
+        for index, path in enumerate(spooled):
+            try:
+                message = json.loads(path.read_bytes())
+            except ValueError:
+                logger.exception("Discarding unreadable spooled message %s", path)
+                path.unlink()
+                self._done(path)
+                continue
+            try:
+                self._queue.put_nowait((path, message))
+            except queue.Full:
+                logger.warning(
+                    "CDA publish queue is full, remaining spooled messages will be"
+                    " queued by a later scan"
+                )
+                for unqueued in spooled[index:]:
+                    self._done(unqueued)
+                return
+
+    def _next_batch(self) -> List[SpooledMessage]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        next_scan = time.monotonic() + self.spool_rescan_interval
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._publish(batch)
+            elif self._stopping.is_set():
+                return
+            if time.monotonic() >= next_scan and not self._stopping.is_set():
+                self._scan_spool()
+                next_scan = time.monotonic() + self.spool_rescan_interval
+
+    def _publish(self, batch: List[SpooledMessage]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                with time_stage("send", "publish_batch"):
+                    self.transport([message for _, message in batch])
+            except Exception:
+                logger.exception(
+                    "Failed to publish batch of %d CDA messages (attempt %d)",
+                    len(batch),
+                    attempt + 1,
+                )
+                if self._stopping.wait(self.retry_delay * 2**attempt):
+                    break
+                continue
+            for path, _ in batch:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                self._done(path)
+            return
+        logger.error(
+            "Giving up publishing batch of %d CDA messages, left in spool", len(batch)
+        )
+        for path, _ in batch:
+            self._done(path)
+
+
+_publisher: Optional[BatchPublisher] = None
+
+
+def init_publisher(app: Flask) -> None:
+    global _publisher
+    if not app.config["CDA_PUBLISH_SPOOL_DIR"]:
+        raise ValueError("CDA_PUBLISH_SPOOL_DIR must be set to use batched publishing")
+    if _publisher is not None:
+        _publisher.stop()
+    else:
+        atexit.register(stop_publisher)
+    _publisher = BatchPublisher(
+        spool_dir=Path(app.config["CDA_PUBLISH_SPOOL_DIR"]),
+        transport=KombuBatchTransport(
+            connection_string=kombu_batteries_included.get_connection_string(),
+            compression=kombu_batteries_included.config.RABBITMQ_COMPRESSION,
+        ),
+        max_queue_size=app.config["CDA_PUBLISH_QUEUE_SIZE"],
+        batch_size=app.config["CDA_PUBLISH_BATCH_SIZE"],
+        flush_interval=app.config["CDA_PUBLISH_FLUSH_INTERVAL_SEC"],
+        max_retries=app.config["CDA_PUBLISH_MAX_RETRIES"],
+        spool_rescan_interval=app.config["CDA_PUBLISH_SPOOL_RESCAN_SEC"],
+    )
+    _publisher.start()
+    logger.info("Started batched CDA publisher")
+
+
+def get_publisher() -> BatchPublisher:
+    if _publisher is None:
+        raise ValueError("Batched CDA publisher has not been initialised")
+    return _publisher
+
+
+def stop_publisher() -> None:
+    if _publisher is not None:
+        _publisher.stop()
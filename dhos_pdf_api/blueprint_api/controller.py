@@ -1,65 +1,92 @@
-import logging
+import calendar
+import contextvars
+import hashlib
+import importlib
 import os
-from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime
 from pathlib import Path
-from threading import Lock
-from typing import Any, Dict, Generator, List, Optional
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple, TypeVar
 from urllib import parse
 
-import dicttoxml
 import draymed
 import kombu_batteries_included
-import pdfkit
 import pytz
-import requests
-from flask import Response, current_app
-from flask_batteries_included.helpers.error_handler import ServiceUnavailableException
+from flask import Flask, Response, current_app
+from flask_batteries_included.helpers.error_handler import EntityNotFoundException
 from flask_batteries_included.sqldb import db, generate_uuid
-from jinja2 import Environment, PackageLoader
-from requests import HTTPError
 from she_logging import logger
-from she_logging.request_id import current_request_id
 from sqlalchemy.exc import IntegrityError
 
 from dhos_pdf_api import trustomer
-from dhos_pdf_api.blueprint_api.hl7_cda import create_hl7_cda_xml
-from dhos_pdf_api.blueprint_api.send_ward_report import (
-    SendWardReportReader,
-    SendWardReportWriter,
+from dhos_pdf_api.blueprint_api import cda_publisher, render_retry, renderers
+from dhos_pdf_api.blueprint_api.hl7_cda import (
+    create_hl7_cda_xml,
+    create_hl7_cda_xml_from_skeleton,
+    get_cda_parser,
+)
+from dhos_pdf_api.config import Configuration
+from dhos_pdf_api.helper.memory_profile import MemoryUsage, measure_memory
+from dhos_pdf_api.metrics import (
+    OUTPUT_BYTES,
+    WARD_REPORT_PEAK_ALLOC_BYTES,
+    WARD_REPORT_RSS_BYTES,
+    time_stage,
 )
 from dhos_pdf_api.models.filename_lookup import FilenameLookup
+from dhos_pdf_api.models.ward_report import WardReport
 
 from .helpers import (
     PDF_DATETIME_FORMAT,
-    format_iso8601_datestring_to_pdf_format,
+    PDF_METADATA_XML_TEMPLATE,
+    escape_xml,
     get_iso_format_time_now,
-    value_or_none,
+    ward_report_digest,
+    ward_report_summary_path,
+    ward_report_thumbnail_path,
     write_file,
     xml_datetime_convert,
     xml_opt_datetime_convert,
-    yes_no_not_specified,
 )
-
-dicttoxml.LOG.setLevel(logging.ERROR)
-env = Environment(autoescape=True, loader=PackageLoader("dhos_pdf_api", "templates"))
-env.filters["yes_no_not_specified"] = yes_no_not_specified
-env.filters[
-    "format_iso8601_datestring_to_pdf_format"
-] = format_iso8601_datestring_to_pdf_format
-env.filters["value_or_none"] = value_or_none
+from .pdf_merge import Stamp, merge_pdfs
+from .render_context import shape_patient_pdf_context
+from .renderers import PdfRenderer, RenderRequest
+from .template_loader import create_environment
+
+env = create_environment(
+    compiled_templates=Configuration.JINJA_COMPILED_TEMPLATES,
+    bytecode_cache_dir=Configuration.JINJA_BYTECODE_CACHE_DIR,
+)
 template = {
     "gdm": env.get_template("gdm_181_patient.html"),
     "dbm": env.get_template("dbm_patient.html"),
 }
 
+# pyplot keeps figures in global state, so ward reports are drawn one at a time.
+# Reports are renamed into place when complete, so reading them needs no lock.
 report_writer_lock: Lock = Lock()
 
 
-def request_headers() -> Dict:
-    return {"X-Request-ID": current_request_id()}
+T = TypeVar("T")
+
+# Renders the parts of long patient PDFs in parallel.
+patient_pdf_executor: ThreadPoolExecutor = ThreadPoolExecutor(
+    max_workers=Configuration.PATIENT_PDF_CHUNK_WORKERS,
+    thread_name_prefix="patient-pdf",
+)
+
+# Runs the stages of SEND document generation that can overlap with the PDF engine
+# call. Threads are only started when first needed.
+send_pipeline_executor: ThreadPoolExecutor = ThreadPoolExecutor(
+    thread_name_prefix="send-pipeline"
+)
 
 
-def create_patient_pdf(data: Dict, product_name: str) -> None:
+def create_patient_pdf(data: Dict, product_name: str) -> bool:
+    """
+    Returns False if the PDF couldn't be rendered yet, and will be in the background.
+    """
     output_dir: str = _get_output_dir(product_name=product_name)
 
     # NOT utcnow, because this should reflect daylight savings
@@ -85,24 +112,23 @@ def create_patient_pdf(data: Dict, product_name: str) -> None:
     logger.info(f"Generating {product_name_header} PDF for {patient_uuid}")
     logger.debug(f"PDF data {data}")
 
+    options: Dict[str, Optional[str]] = {
+        "--footer-center": f"Generated by the Sensyne Health {product_name_header} system on {now_string}",
+        "--footer-font-size": "11",
+        "--footer-font-name": "OpenSans",
+        "--header-left": f"{product_name_header} patient record for {first_name} {last_name.upper()}",
+        "--header-right": "Page [page] of [toPage]",
+        "--header-line": "",
+        "--header-spacing": "4",
+        "--header-font-size": "11",
+        "--header-font-name": "OpenSans",
+    }
+
     # Do the deed
-    pdf = pdfkit.from_string(
-        template[product_name].render(**data),
-        False,
-        options={
-            "--footer-center": f"Generated by the Sensyne Health {product_name_header} system on {now_string}",
-            "--footer-font-size": "11",
-            "--footer-font-name": "OpenSans",
-            "--header-left": f"{product_name_header} patient record for {first_name} {last_name.upper()}",
-            "--header-right": "Page [page] of [toPage]",
-            "--header-line": "",
-            "--header-spacing": "4",
-            "--header-font-size": "11",
-            "--header-font-name": "OpenSans",
-        },
-    )
+    context: Dict[str, Any] = shape_patient_pdf_context(data)
+    chunk_threshold: int = current_app.config["PATIENT_PDF_CHUNK_THRESHOLD"]
+    chunk_size: int = current_app.config["PATIENT_PDF_CHUNK_SIZE"]
 
-    # Save PDF to file.
     directory: Path = Path(current_app.config[output_dir])
     directory.mkdir(exist_ok=True)
     pdf_filename = (
@@ -114,11 +140,105 @@ def create_patient_pdf(data: Dict, product_name: str) -> None:
     if pdf_destination.parent != directory:
         raise ValueError(f"Invalid `pdf_filename` value: `{pdf_filename}`")
 
-    pdf_destination.write_bytes(pdf)
-    logger.debug(f"Wrote {product_name} BCP PDF to file: {pdf_destination}")
+    def render_and_save() -> None:
+        if chunk_threshold and len(context["reading_rows"]) >= chunk_threshold:
+            pdf = render_patient_pdf_in_chunks(
+                product_name=product_name,
+                context=context,
+                options=options,
+                chunk_size=chunk_size,
+            )
+        else:
+            pdf = render_patient_pdf(
+                product_name=product_name, context=context, options=options
+            )
+
+        # Save PDF to file.
+        with time_stage(product_name, "write"):
+            pdf_destination.write_bytes(pdf)
+        OUTPUT_BYTES.labels(product=product_name).inc(len(pdf))
+        logger.debug(f"Wrote {product_name} BCP PDF to file: {pdf_destination}")
+
+        # Save the filename in the database.
+        with time_stage(product_name, "filename_lookup_save"):
+            _save_filename_lookup(lookup_uuid=patient_uuid, file_name=pdf_filename)
+
+    try:
+        render_and_save()
+    except Exception as e:
+        if not render_retry.is_retryable(e):
+            raise
+        queued: bool = render_retry.get_retry_queue().submit(
+            f"{product_name_header} PDF for {patient_uuid}",
+            _with_app_context(render_and_save),
+        )
+        if not queued:
+            raise
+        return False
+    return True
+
+
+def render_patient_pdf(
+    product_name: str, context: Dict[str, Any], options: Dict[str, Optional[str]]
+) -> bytes:
+    with time_stage(product_name, "template_render"):
+        html: str = template[product_name].render(**context)
+    return renderers.get_renderer(product_name).render(
+        RenderRequest(product=product_name, html=html, options=options)
+    )
 
-    # Save the filename in the database.
-    _save_filename_lookup(lookup_uuid=patient_uuid, file_name=pdf_filename)
+
+def render_patient_pdf_in_chunks(
+    product_name: str,
+    context: Dict[str, Any],
+    options: Dict[str, Optional[str]],
+    chunk_size: int,
+) -> bytes:
+    """
+    Renders the summary, each chunk of the readings table and the notes as separate
+    documents in parallel, then merges them. wkhtmltopdf's layout time grows faster
+    than linearly with the length of the document, so this is quicker for long
+    reading histories.
+    """
+    rows: List = context["reading_rows"]
+    parts: List[Dict[str, Any]] = [{**context, "part": "summary"}]
+    parts.extend(
+        {
+            **context,
+            "part": "readings",
+            "reading_rows": rows[start : start + chunk_size],
+            "first_reading_chunk": start == 0,
+        }
+        for start in range(0, len(rows), chunk_size)
+    )
+    if product_name == "gdm":
+        parts.append({**context, "part": "notes"})
+
+    # Each part only knows its own page numbers, so they are stamped after merging.
+    part_options: Dict[str, Optional[str]] = {
+        **{key: value for key, value in options.items() if key != "--header-right"},
+        "--no-outline": None,
+    }
+    renderer: PdfRenderer = renderers.get_renderer(product_name)
+    with time_stage(product_name, "template_render"):
+        part_requests: List[RenderRequest] = [
+            RenderRequest(
+                product=product_name,
+                html=template[product_name].render(**part),
+                options=part_options,
+            )
+            for part in parts
+        ]
+    # Render in copies of this context so the parts count towards the request timings.
+    request_context: contextvars.Context = contextvars.copy_context()
+    pdfs: List[bytes] = list(
+        patient_pdf_executor.map(
+            lambda part: request_context.copy().run(renderer.render, part),
+            part_requests,
+        )
+    )
+    logger.debug("Rendered patient PDF in %d parts", len(pdfs))
+    return merge_pdfs(pdfs, Stamp(text=lambda page, pages: f"Page {page} of {pages}"))
 
 
 def _get_output_dir(product_name: str) -> str:
@@ -165,21 +285,9 @@ def get_send_pdf(encounter_uuid: str) -> bytes:
 
 def generate_send_pdf(data: dict) -> bytes:
     logger.debug("Generating SEND PDF for encounter %s", data["encounter"]["uuid"])
-    url: str = f"{current_app.config['DHOS_PDF_ENGINE_URL']}/dhos/v1/send_pdf"
-    try:
-        response = requests.post(url, headers=request_headers(), json=data)
-        response.raise_for_status()
-
-    except requests.exceptions.ConnectionError as e:
-        logger.exception("Could not connect to PDF engine")
-        raise ServiceUnavailableException(e)
-
-    except HTTPError as e:
-        logger.exception("HTTP error running PDF engine")
-        raise ServiceUnavailableException(e)
-
-    logger.debug("Received result from PDF engine")
-    return response.content
+    return renderers.get_renderer("send").render(
+        RenderRequest(product="send", data=data)
+    )
 
 
 def create_send_documents(send_data: dict) -> None:
@@ -197,9 +305,6 @@ def create_send_documents(send_data: dict) -> None:
         )
         return
 
-    # Generate the BCP PDF bytes
-    pdf: bytes = generate_send_pdf(send_data)
-
     # Generate filename
     patient_mrn: str = send_data["patient"].get("hospital_number")
     patient_nhs: str = send_data["patient"].get("nhs_number")
@@ -211,6 +316,35 @@ def create_send_documents(send_data: dict) -> None:
     )
     pdf_filename = filename + ".pdf"
 
+    cda_unc_path: Optional[str] = current_app.config.get("SEND_BCP_CDA_UNC_PATH", None)
+
+    # Check for discharge document generation
+    discharge_dest: Optional[str] = None
+    if send_data["encounter"].get("discharged_at"):
+        discharge_dest = current_app.config["SEND_DISCHARGE_OUTPUT_DIR"]
+
+    # The CDA document and discharge metadata only depend on the request data, so
+    # build them while the PDF engine is working. Nothing is written or published
+    # until the PDF has been generated.
+    cda_future: Optional[Future] = None
+    if cda_unc_path:
+        cda_future = _submit_send_stage(
+            build_hl7_cda_xml, send_data, cda_unc_path, pdf_filename
+        )
+    metadata_future: Optional[Future] = None
+    if discharge_dest:
+        metadata_future = _submit_send_stage(
+            create_pdf_metadata_xml,
+            {
+                **send_data,
+                "pdf_filename": pdf_filename,
+                "encounter_id": epr_encounter_id or encounter_uuid,
+            },
+        )
+
+    # Generate the BCP PDF bytes
+    pdf: bytes = generate_send_pdf(send_data)
+
     # Make dir if it doesn't already exist
     directory: str = os.path.abspath(current_app.config["SEND_BCP_OUTPUT_DIR"])
     pdf_destination = os.path.join(directory, pdf_filename)
@@ -227,20 +361,16 @@ def create_send_documents(send_data: dict) -> None:
 
     write_file(rsync_pdf_destination, pdf)
     logger.debug("File written to destination: %s", rsync_pdf_destination)
+    OUTPUT_BYTES.labels(product="send").inc(len(pdf))
 
     # Save the filename in the database.
-    _save_filename_lookup(lookup_uuid=encounter_uuid, file_name=pdf_filename)
-
-    cda_unc_path: Optional[str] = current_app.config.get("SEND_BCP_CDA_UNC_PATH", None)
-    if cda_unc_path:
-        publish_hl7_cda_xml(send_data, cda_unc_path, pdf_filename)
+    with time_stage("send", "filename_lookup_save"):
+        _save_filename_lookup(lookup_uuid=encounter_uuid, file_name=pdf_filename)
 
-    if not send_data["encounter"].get("discharged_at"):
-        return
+    if cda_future is not None:
+        publish_cda_message(cda_future.result())
 
-    # Check for discharge document generation
-    discharge_dest: str = current_app.config["SEND_DISCHARGE_OUTPUT_DIR"]
-    if not discharge_dest:
+    if metadata_future is None or discharge_dest is None:
         return
 
     # Write duplicate PDF
@@ -248,13 +378,32 @@ def create_send_documents(send_data: dict) -> None:
     write_file(pdf_discharge_dest, pdf)
     # Write XML file
     xml_discharge_dest = os.path.join(discharge_dest, filename + ".xml")
-
-    send_data["pdf_filename"] = pdf_filename
-    send_data["encounter_id"] = epr_encounter_id or encounter_uuid
-    xml: bytes = create_pdf_metadata_xml(send_data)
+    xml: bytes = metadata_future.result()
     write_file(xml_discharge_dest, xml)
 
 
+def _with_app_context(fn: Callable[[], T]) -> Callable[[], T]:
+    """
+    Wraps a function to run in another thread with the current app and request id
+    available to it.
+    """
+    app: Flask = current_app._get_current_object()  # type: ignore
+    context: contextvars.Context = contextvars.copy_context()
+
+    def run() -> T:
+        with app.app_context():
+            return fn()
+
+    return lambda: context.copy().run(run)
+
+
+def _submit_send_stage(fn: Callable[..., bytes], *args: Any) -> Future:
+    """
+    Runs one stage of SEND document generation on the pipeline executor.
+    """
+    return send_pipeline_executor.submit(_with_app_context(lambda: fn(*args)))
+
+
 def create_pdf_metadata_xml(data: dict) -> bytes:
     encounter: dict = data.get("encounter", {})
     patient: Dict[str, Any] = data.get("patient", {})
@@ -265,51 +414,324 @@ def create_pdf_metadata_xml(data: dict) -> bytes:
             sex, category="sex"
         ).title()
 
-    full_data: dict = {
-        "Docinfo": {
-            "ExternalReferenceNumber": data.get("encounter_id"),
-            "Documentfilename": data.get("pdf_filename"),
-            "DocumentTypeCode": "01",
-            "DocumentCreatedDateTime": xml_datetime_convert(get_iso_format_time_now()),
-            "DocumentAuthor": "SEND",
-        },
-        "PatientInfo": {
-            "PatientEpisodeId": data.get("encounter_id"),
-            "PatientForename": patient.get("first_name"),
-            "PatientSurname": patient.get("last_name"),
-            "PatientDOB": xml_opt_datetime_convert(patient.get("dob")),
-            "PatientNHSNumber": patient.get("nhs_number"),
-            "PatientURNumber": patient.get("hospital_number"),
-            "PatientGender": patient_gender,
-            "PatientAdmissionDateTime": xml_opt_datetime_convert(
-                encounter.get("admitted_at")
-            ),
-            "PatientDischargeDateTime": xml_opt_datetime_convert(
-                encounter.get("discharged_at")
-            ),
-            "SpecialtyCode": "",
-            "SpecialtyName": "",
-        },
-        "GPPractice": {"PracticeName": "", "GpName": "", "PracticeNacsCode": ""},
-    }
-
-    xml: bytes = dicttoxml.dicttoxml(full_data, attr_type=False, root=False)
+    encounter_id: Optional[str] = data.get("encounter_id")
+    xml: bytes = PDF_METADATA_XML_TEMPLATE.format(
+        external_reference_number=escape_xml(encounter_id),
+        document_filename=escape_xml(data.get("pdf_filename")),
+        document_created_date_time=escape_xml(
+            xml_datetime_convert(get_iso_format_time_now())
+        ),
+        patient_episode_id=escape_xml(encounter_id),
+        patient_forename=escape_xml(patient.get("first_name")),
+        patient_surname=escape_xml(patient.get("last_name")),
+        patient_dob=escape_xml(xml_opt_datetime_convert(patient.get("dob"))),
+        patient_nhs_number=escape_xml(patient.get("nhs_number")),
+        patient_ur_number=escape_xml(patient.get("hospital_number")),
+        patient_gender=escape_xml(patient_gender),
+        patient_admission_date_time=escape_xml(
+            xml_opt_datetime_convert(encounter.get("admitted_at"))
+        ),
+        patient_discharge_date_time=escape_xml(
+            xml_opt_datetime_convert(encounter.get("discharged_at"))
+        ),
+    ).encode("utf-8")
     logger.debug("Created PDF metadata")
-    return b'<xml version="1.0" encoding="UTF-8" >' + xml + b"</xml>"
+    return xml
+
+
+# The ward report module pulls in pandas, numpy and matplotlib, which add seconds to
+# startup and tens of MB to every worker. It is only imported when first needed.
+WARD_REPORT_MODULE = "dhos_pdf_api.blueprint_api.send_ward_report"
+
+
+def start_ward_report_warm_up() -> Thread:
+    """
+    Imports the ward report module in a background thread, so the first ward report
+    request doesn't pay for the import.
+    """
+    thread = Thread(
+        target=importlib.import_module,
+        args=(WARD_REPORT_MODULE,),
+        name="ward-report-warm-up",
+        daemon=True,
+    )
+    thread.start()
+    return thread
 
 
 def generate_send_ward_report_pdf(data: dict, ward_report_folder: Path) -> None:
-    logger.info("Getting SEND ward report for location %s", data.get("location_uuid"))
-    with report_writer_lock:
-        return SendWardReportWriter(
-            file_path=ward_report_folder / f"{data['location_uuid']}.pdf", **data
+    from dhos_pdf_api.blueprint_api.send_ward_report import SendWardReportWriter
+
+    location_uuid: str = str(data["location_uuid"])
+    report_year, report_month = _report_year_month(data)
+    logger.info(
+        "Generating SEND ward report for location %s, %d-%02d",
+        location_uuid,
+        report_year,
+        report_month,
+    )
+    file_name: str = f"{location_uuid}/{report_year}-{report_month:02d}.pdf"
+    file_path: Path = ward_report_folder / file_name
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    daily_metrics: Any = None
+    metric_store_dir: Optional[str] = current_app.config["WARD_METRIC_STORE_DIR"]
+    if metric_store_dir:
+        daily_metrics = _stored_ward_metrics(
+            Path(metric_store_dir) / f"{location_uuid}.npy",
+            data["pdf_data"],
+            report_year,
+            report_month,
+        )
+
+    trace_malloc: bool = current_app.config["WARD_REPORT_TRACE_MALLOC"]
+    usage: MemoryUsage
+    with report_writer_lock, time_stage("ward", "report_write"), measure_memory(
+        trace_malloc=trace_malloc
+    ) as usage:
+        content: bytes = SendWardReportWriter(
+            file_path=file_path, daily_metrics=daily_metrics, **data
         ).write()
+    OUTPUT_BYTES.labels(product="ward").inc(len(content))
+    WARD_REPORT_RSS_BYTES.set(usage.rss_after_kb * 1024)
+    if usage.peak_alloc_bytes is not None:
+        WARD_REPORT_PEAK_ALLOC_BYTES.observe(usage.peak_alloc_bytes)
+
+    with time_stage("ward", "filename_lookup_save"):
+        _save_ward_report(
+            location_uuid=location_uuid,
+            report_year=report_year,
+            report_month=report_month,
+            file_name=file_name,
+            content=content,
+        )
+
+
+def _stored_ward_metrics(
+    store_path: Path, pdf_data: List[Dict], report_year: int, report_month: int
+) -> Any:
+    """
+    Adds the posted metrics to the location's stored metrics, and returns the stored
+    metrics for the report month.
+    """
+    from dhos_pdf_api.blueprint_api.ward_metric_store import WardMetricStore
+
+    store = WardMetricStore(store_path)
+    days_in_month: int = calendar.monthrange(report_year, report_month)[1]
+    with time_stage("ward", "metric_store"):
+        store.add(pdf_data)
+        daily_metrics = store.daily_metrics(
+            date(report_year, report_month, 1),
+            date(report_year, report_month, days_in_month),
+        )
+    if daily_metrics.empty:
+        raise ValueError(
+            f"No ward metrics for {report_year}-{report_month:02d} in the request"
+            " or stored for the location"
+        )
+    return daily_metrics
+
+
+def generate_ward_trend_report_pdf(data: Dict) -> bytes:
+    from dhos_pdf_api.blueprint_api.ward_trend_report import (
+        SendWardTrendReportWriter,
+        trend_report_data,
+    )
+
+    metric_store_dir: Optional[str] = current_app.config["WARD_METRIC_STORE_DIR"]
+    if not metric_store_dir:
+        raise EntityNotFoundException("Ward metrics are not stored")
+    first_day: date = _parse_month(data["start_month"])
+    last_day: date = _parse_month(data["end_month"])
+    last_day = last_day.replace(
+        day=calendar.monthrange(last_day.year, last_day.month)[1]
+    )
+    if last_day < first_day:
+        raise ValueError("Trend report end month is before its start month")
+    logger.info(
+        "Generating SEND ward trend report for %d locations from %s to %s",
+        len(data["locations"]),
+        first_day,
+        last_day,
+    )
+
+    with time_stage("ward", "metric_store"):
+        hospital, wards = trend_report_data(
+            Path(metric_store_dir), data["locations"], first_day, last_day
+        )
+    writer = SendWardTrendReportWriter(
+        hospital_name=data["hospital_name"],
+        first_day=first_day,
+        last_day=last_day,
+        hospital=hospital,
+        wards=wards,
+    )
+    with report_writer_lock, time_stage("ward", "report_write"):
+        content: bytes = writer.write()
+    OUTPUT_BYTES.labels(product="ward").inc(len(content))
+    return content
+
+
+def _parse_month(month: str) -> date:
+    """
+    The first day of a "YYYY-MM" month.
+    """
+    try:
+        return datetime.strptime(month, "%Y-%m").date()
+    except ValueError:
+        raise ValueError(f"Invalid month '{month}', expected YYYY-MM")
 
 
-def get_send_ward_report_pdf(location_uuid: str, ward_report_folder: Path) -> bytes:
+def _report_year_month(data: dict) -> Tuple[int, int]:
+    """
+    The year and month of a ward report request. The month may be given by its
+    English name, e.g. "July", or its number.
+    """
+    month: str = str(data["report_month"]).strip()
+    month_names: List[str] = [name.lower() for name in calendar.month_name]
+    if month.lower() in month_names:
+        report_month = month_names.index(month.lower())
+    elif month.isdigit() and 1 <= int(month) <= 12:
+        report_month = int(month)
+    else:
+        raise ValueError(f"Invalid report month '{month}'")
+    year: str = str(data["report_year"]).strip()
+    if not year.isdigit():
+        raise ValueError(f"Invalid report year '{year}'")
+    return int(year), report_month
+
+
+def _save_ward_report(
+    location_uuid: str,
+    report_year: int,
+    report_month: int,
+    file_name: str,
+    content: bytes,
+) -> None:
+    """
+    Adds the ward report to the index, replacing any earlier report for the month.
+    """
+    fields: Dict[str, Any] = {
+        "file_name": file_name,
+        "size_bytes": len(content),
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "generated": datetime.utcnow(),
+    }
+    key: Dict[str, Any] = {
+        "location_uuid": location_uuid,
+        "report_year": report_year,
+        "report_month": report_month,
+    }
+    existing: Optional[WardReport] = WardReport.query.filter_by(**key).first()
+    if existing is None:
+        try:
+            db.session.add(WardReport(uuid=generate_uuid(), **key, **fields))
+            db.session.commit()
+            return
+        except IntegrityError:
+            # Created by another request since the query above.
+            db.session.rollback()
+            existing = WardReport.query.filter_by(**key).first_or_404()
+    for name, value in fields.items():
+        setattr(existing, name, value)
+    db.session.commit()
+
+
+def list_ward_reports(location_uuid: str) -> List[Dict]:
+    reports: List[WardReport] = (
+        WardReport.query.filter_by(location_uuid=location_uuid)
+        .order_by(WardReport.report_year.desc(), WardReport.report_month.desc())
+        .all()
+    )
+    return [report.to_dict() for report in reports]
+
+
+def _ward_report_path(
+    location_uuid: str,
+    ward_report_folder: Path,
+    year: Optional[int],
+    month: Optional[int],
+) -> Path:
+    if (year is None) != (month is None):
+        raise ValueError("Both year and month are needed to get a past ward report")
+
+    query = WardReport.query.filter_by(location_uuid=location_uuid)
+    if year is not None:
+        query = query.filter_by(report_year=year, report_month=month)
+    report: Optional[WardReport] = query.order_by(WardReport.generated.desc()).first()
+
+    if report is not None:
+        return ward_report_folder / report.file_name
+    if year is None:
+        # Reports generated before they were stored by month.
+        return ward_report_folder / f"{location_uuid}.pdf"
+    raise EntityNotFoundException("No ward report for location and month")
+
+
+def get_send_ward_report_pdf(
+    location_uuid: str,
+    ward_report_folder: Path,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+) -> bytes:
+    """
+    Gets the stored ward report for the location and month or, without a month, the
+    most recently generated one.
+    """
+    from dhos_pdf_api.blueprint_api.send_ward_report import SendWardReportReader
+
     logger.info("Getting SEND ward report for location %s", location_uuid)
-    reader = SendWardReportReader(file_path=ward_report_folder / f"{location_uuid}.pdf")
-    return reader.read()
+    file_path: Path = _ward_report_path(location_uuid, ward_report_folder, year, month)
+    return SendWardReportReader(file_path=file_path).read()
+
+
+def get_send_ward_report_summary(
+    location_uuid: str,
+    ward_report_folder: Path,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+) -> bytes:
+    """
+    Gets the JSON summary saved alongside the ward report, as for the PDF.
+    """
+    logger.info("Getting SEND ward report summary for location %s", location_uuid)
+    return _read_ward_report_companion(
+        _ward_report_path(location_uuid, ward_report_folder, year, month),
+        ward_report_summary_path,
+        "summary",
+    )
+
+
+def get_send_ward_report_thumbnail(
+    location_uuid: str,
+    ward_report_folder: Path,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+) -> bytes:
+    """
+    Gets the PNG thumbnail of the ward report's first page, as for the PDF.
+    """
+    logger.info("Getting SEND ward report thumbnail for location %s", location_uuid)
+    return _read_ward_report_companion(
+        _ward_report_path(location_uuid, ward_report_folder, year, month),
+        ward_report_thumbnail_path,
+        "thumbnail",
+    )
+
+
+def _read_ward_report_companion(
+    report_path: Path, companion_path: Callable[[Path, str], Path], name: str
+) -> bytes:
+    """
+    Reads the summary or thumbnail of the report currently in place. The report is
+    what commits a regenerated report, so one being written is never mixed with the
+    report it replaces.
+    """
+    try:
+        digest: str = ward_report_digest(report_path.read_bytes())
+        return companion_path(report_path, digest).read_bytes()
+    except FileNotFoundError:
+        raise EntityNotFoundException(f"No ward report {name} for location")
 
 
 def _save_filename_lookup(lookup_uuid: str, file_name: str) -> None:
@@ -348,8 +770,31 @@ def _create_new_filename_lookup(lookup_uuid: str, file_name: str) -> None:
 
 
 def publish_hl7_cda_xml(data: Dict, base_unc_path: str, pdf_filename: str) -> None:
-    parser: object = current_app.config["CDA_XML_SCHEMA_PARSER"]
-    xml: bytes = create_hl7_cda_xml(data, base_unc_path, pdf_filename, parser)
-    kombu_batteries_included.publish_message(
-        routing_key="dhos.423779001", body={"content": xml.decode("utf-8")}
-    )
+    publish_cda_message(build_hl7_cda_xml(data, base_unc_path, pdf_filename))
+
+
+def build_hl7_cda_xml(data: Dict, base_unc_path: str, pdf_filename: str) -> bytes:
+    parser: object = get_cda_parser()
+    with time_stage("send", "cda_build"):
+        if current_app.config["CDA_GENERATION_MODE"] == "skeleton":
+            return create_hl7_cda_xml_from_skeleton(
+                data,
+                base_unc_path,
+                pdf_filename,
+                parser,
+                validation_sample_rate=current_app.config["CDA_VALIDATION_SAMPLE_RATE"],
+            )
+        return create_hl7_cda_xml(data, base_unc_path, pdf_filename, parser)
+
+
+def publish_cda_message(xml: bytes) -> None:
+    body: Dict = {"content": xml.decode("utf-8")}
+    with time_stage("send", "publish"):
+        if current_app.config["CDA_PUBLISH_MODE"] == "batched":
+            cda_publisher.get_publisher().submit(
+                routing_key="dhos.423779001", body=body
+            )
+        else:
+            kombu_batteries_included.publish_message(
+                routing_key="dhos.423779001", body=body
+            )
@@ -1,6 +1,8 @@
+import hashlib
 import os
 import tempfile
 from datetime import datetime
+from pathlib import Path
 from typing import Any, Optional
 
 import pytz
@@ -11,10 +13,44 @@ from flask_batteries_included.helpers.timestamp import (
 )
 from she_logging import logger
 
+from dhos_pdf_api.metrics import time_stage
+
 PDF_DATETIME_FORMAT = "%d-%b-%Y %H:%M:%S"
 XML_DATE_FORMAT = "%Y%m%d"
 XML_DATETIME_FORMAT = "%Y%m%d %H:%M:%S"
 
+# Discharge document metadata. The layout is fixed, so only the values need to be
+# escaped and filled in.
+PDF_METADATA_XML_TEMPLATE = (
+    '<xml version="1.0" encoding="UTF-8" >'
+    "<Docinfo>"
+    "<ExternalReferenceNumber>{external_reference_number}</ExternalReferenceNumber>"
+    "<Documentfilename>{document_filename}</Documentfilename>"
+    "<DocumentTypeCode>01</DocumentTypeCode>"
+    "<DocumentCreatedDateTime>{document_created_date_time}</DocumentCreatedDateTime>"
+    "<DocumentAuthor>SEND</DocumentAuthor>"
+    "</Docinfo>"
+    "<PatientInfo>"
+    "<PatientEpisodeId>{patient_episode_id}</PatientEpisodeId>"
+    "<PatientForename>{patient_forename}</PatientForename>"
+    "<PatientSurname>{patient_surname}</PatientSurname>"
+    "<PatientDOB>{patient_dob}</PatientDOB>"
+    "<PatientNHSNumber>{patient_nhs_number}</PatientNHSNumber>"
+    "<PatientURNumber>{patient_ur_number}</PatientURNumber>"
+    "<PatientGender>{patient_gender}</PatientGender>"
+    "<PatientAdmissionDateTime>{patient_admission_date_time}</PatientAdmissionDateTime>"
+    "<PatientDischargeDateTime>{patient_discharge_date_time}</PatientDischargeDateTime>"
+    "<SpecialtyCode></SpecialtyCode>"
+    "<SpecialtyName></SpecialtyName>"
+    "</PatientInfo>"
+    "<GPPractice>"
+    "<PracticeName></PracticeName>"
+    "<GpName></GpName>"
+    "<PracticeNacsCode></PracticeNacsCode>"
+    "</GPPractice>"
+    "</xml>"
+)
+
 
 def yes_no_not_specified(value: Any) -> str:
     if value is True:
@@ -40,20 +76,73 @@ def value_or_none(value: Any) -> str:
     return "NOT SPECIFIED"
 
 
-def write_file(file_destination: str, content: bytes) -> None:
-    # Make dir if it doesn't already exist
-    temp_dir: str = os.path.abspath(current_app.config["SEND_TMP_OUTPUT_DIR"])
+def escape_xml(value: Any) -> str:
+    """
+    Escapes a value for use as XML element content, the same way dicttoxml did.
+    None becomes an empty string.
+    """
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        return str(value)
+    return (
+        value.replace("&", "&amp;")
+        .replace('"', "&quot;")
+        .replace("'", "&apos;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+    )
+
+
+def write_file(
+    file_destination: str,
+    content: bytes,
+    temp_dir: Optional[str] = None,
+    product: str = "send",
+    raise_on_failure: bool = False,
+    stage_prefix: str = "",
+) -> None:
+    """
+    Writes the content to a temporary file that is renamed to the destination. If the
+    rename fails it is logged and the temporary file is left to be recovered, or with
+    raise_on_failure the temporary file is removed and the error raised. The write,
+    fsync and rename stages are timed with stage_prefix before their names.
+    """
+    # The temporary file must be on the same file system as the destination for the
+    # rename to be atomic.
+    if temp_dir is None:
+        temp_dir = os.path.abspath(current_app.config["SEND_TMP_OUTPUT_DIR"])
     with tempfile.NamedTemporaryFile(delete=False, dir=temp_dir) as fp:
         temp_filename: str = fp.name
-        fp.write(content)
-        fp.flush()
-        os.fsync(fp.fileno())
+        with time_stage(product, f"{stage_prefix}write"):
+            fp.write(content)
+            fp.flush()
+        with time_stage(product, f"{stage_prefix}fsync"):
+            os.fsync(fp.fileno())
     try:
-        os.replace(temp_filename, file_destination)
+        with time_stage(product, f"{stage_prefix}rename"):
+            os.replace(temp_filename, file_destination)
     except OSError:
+        if raise_on_failure:
+            Path(temp_filename).unlink(missing_ok=True)
+            raise
         logger.exception("Failed to move '%s' to '%s'", temp_filename, file_destination)
 
 
+def ward_report_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+# A report's summary and thumbnail are named after the digest of the report, so that
+# a reader finds those of the report it read. See SendWardReportWriter.save.
+def ward_report_summary_path(report_path: Path, digest: str) -> Path:
+    return report_path.with_name(f"{report_path.stem}.{digest[:16]}.json")
+
+
+def ward_report_thumbnail_path(report_path: Path, digest: str) -> Path:
+    return report_path.with_name(f"{report_path.stem}.{digest[:16]}.png")
+
+
 def xml_opt_datetime_convert(datetime_to_convert: Optional[str]) -> Optional[str]:
     if not datetime_to_convert:
         return None
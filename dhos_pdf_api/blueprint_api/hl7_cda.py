@@ -11,8 +11,11 @@ This document includes summary information about the patient, a clinician involv
 the first clinician to take observations within this encounter, or the clinician who created the encounter if there
 are no observations), the patient's location, the EPR encounter id, and of course the path to the PDF document.
 """
-from pathlib import PurePath, PureWindowsPath
-from typing import Dict
+import random
+import threading
+import time
+from pathlib import Path, PurePath, PureWindowsPath
+from typing import Any, Dict, Optional
 from xml.etree.ElementTree import Element, SubElement, register_namespace, tostring
 
 import draymed
@@ -21,6 +24,7 @@ from lxml import etree
 from she_logging import logger
 
 from dhos_pdf_api.blueprint_api.helpers import get_datetime_now, xml_datetime_convert
+from dhos_pdf_api.metrics import CDA_SCHEMA_COMPILE_SECONDS, time_stage
 
 # N.B. The commented out out Java code below is taken from the original SEND product.
 # It is left here for easy comparison, but at some point (once we are confident everything was ported correctly)
@@ -35,8 +39,53 @@ HL7_REFINED_MESSAGE_INFORMATION_MODELS = "2.16.840.1.113883.1.3"
 DATETIME_FORMAT = "%Y%m%d%H%M%S"
 DATE_FORMAT = "%Y%m%d"
 
+CDA_SCHEMA_PATH = (
+    Path(__file__).parent.parent / "schema" / "infrastructure" / "cda" / "CDA_SDTC.xsd"
+)
+
 register_namespace("", "urn:hl7-org:v3")
 
+# The compiled schema is shared by every thread, but lxml parsers must not be shared
+# between threads so each thread gets its own parser wrapping the shared schema.
+_schema: Optional[etree.XMLSchema] = None
+_schema_lock = threading.Lock()
+_thread_local = threading.local()
+
+
+def get_cda_schema() -> etree.XMLSchema:
+    """
+    Returns the compiled CDA schema, compiling it on first use. Compiling the schema
+    takes a noticeable amount of time so it is only done by processes that need it.
+    """
+    global _schema
+    if _schema is None:
+        with _schema_lock:
+            if _schema is None:
+                start = time.perf_counter()
+                with open(CDA_SCHEMA_PATH, "r") as f:
+                    compiled = etree.XMLSchema(etree.parse(f))
+                elapsed = time.perf_counter() - start
+                CDA_SCHEMA_COMPILE_SECONDS.set(elapsed)
+                logger.info("Compiled CDA XML schema in %.3fs", elapsed)
+                _schema = compiled
+    return _schema
+
+
+def get_cda_parser() -> object:
+    parser: Optional[object] = getattr(_thread_local, "parser", None)
+    if parser is None:
+        parser = etree.XMLParser(schema=get_cda_schema())
+        _thread_local.parser = parser
+    return parser
+
+
+def start_schema_warm_up() -> threading.Thread:
+    thread = threading.Thread(
+        target=get_cda_schema, name="cda-schema-warm-up", daemon=True
+    )
+    thread.start()
+    return thread
+
 
 def xml_person_name(parent: Element, person: Dict) -> Element:
     name = SubElement(parent, "name")
@@ -49,6 +98,29 @@ def xml_person_name(parent: Element, person: Dict) -> Element:
     return name
 
 
+def _encounter_id(encounter: dict) -> str:
+    return encounter.get("epr_encounter_id", "") or encounter.get("uuid", "")
+
+
+def _sex_abbreviation(patient: dict) -> str:
+    sex = draymed.codes.description_from_code(patient.get("sex", ""), category="sex")
+    return sex[0].title()
+
+
+def _document_author(data: dict, encounter: dict) -> Any:
+    obs_sets = data.get("observation_sets")
+    if obs_sets:
+        return obs_sets[0].get("created_by")
+    return encounter.get("created_by")
+
+
+def _parse_datetime(value: str, field: str) -> str:
+    parsed = parse_iso8601_to_datetime(value)
+    if parsed is None:
+        raise ValueError(f"{field} is None")
+    return parsed.strftime(DATETIME_FORMAT)
+
+
 def create_hl7_cda_xml(
     data: dict, base_unc_path: str, pdf_filename: str, parser: object
 ) -> bytes:
@@ -97,7 +169,7 @@ def _append_header_elements(encounter: dict, root: Element) -> None:
         root,
         "id",
         root=HL7_EXTERNAL_IDENTIFICATION_SCHEME,
-        extension=encounter.get("epr_encounter_id", "") or encounter.get("uuid", ""),
+        extension=_encounter_id(encounter),
         assigningAuthorityName="PAS",
     )
     # 				CE code = this.datatypesFactory.createCE("pdf-cda-tt-chart", "OCI", "Case Notes", "NEWS Chart");
@@ -174,13 +246,10 @@ def _append_patient_element(patient: dict, root: Element) -> None:
     # 				GenderModel genderModel = patientModel.getGender();
     # 				CE administrativeGenderCode = this.datatypesFactory.createCE(genderModel.getCode(), "2.16.840.1.113883.2.1.3.2.4.16.25");
     # 				patient.setAdministrativeGenderCode(administrativeGenderCode);
-    sex_abbreviation = draymed.codes.description_from_code(
-        patient.get("sex", ""), category="sex"
-    )[0].title()
     SubElement(
         patient_el,
         "administrativeGenderCode",
-        code=sex_abbreviation,
+        code=_sex_abbreviation(patient),
         codeSystem=HL7_ADMINISTRATIVE_SEX,
     )
     #
@@ -211,10 +280,7 @@ def _append_author_element(data: dict, encounter: dict, root: Element) -> None:
     # 				author.setAssignedAuthor(assignedAuthor);
     # 				ccdDocument.getAuthors().add(author);
     author = SubElement(root, "author", typeCode="AUT", contextControlCode="OP")
-    created = parse_iso8601_to_datetime(encounter["created"])
-    if created is None:
-        raise ValueError("created is None")
-    SubElement(author, "time", value=created.strftime(DATETIME_FORMAT))
+    SubElement(author, "time", value=_parse_datetime(encounter["created"], "created"))
     assigned_author = SubElement(author, "assignedAuthor", classCode="ASSIGNED")
     #
     # 				if (!encounterModel.getObservationSessions().isEmpty())
@@ -250,12 +316,7 @@ def _append_author_element(data: dict, encounter: dict, root: Element) -> None:
     # 					personName.addFamily(consultantModel.getSurname());
     # 					person.getNames().add(personName);
     # 				}
-    obs_sets = data.get("observation_sets")
-    if obs_sets:
-        creator = obs_sets[0].get("created_by")
-    else:
-        creator = encounter.get("created_by")
-
+    creator = _document_author(data, encounter)
     uuid = creator.get("uuid")
     if uuid is not None:
         SubElement(
@@ -347,7 +408,7 @@ def _append_component1_encounter(encounter: dict, root: Element) -> None:
     SubElement(
         encompassing_encounter,
         "code",
-        code=encounter.get("epr_encounter_id", "") or encounter.get("uuid", ""),
+        code=_encounter_id(encounter),
         codeSystem="PAS",
     )
     admitted_time = parse_iso8601_to_datetime(encounter["admitted_at"])
@@ -386,5 +447,168 @@ def _append_component2_pdf_document(
     pdf_unc_path.text = str(pdf_file_path)
 
 
-def _validate_xml(xml: str, parser: object) -> None:
-    etree.fromstring(xml, parser)
+def _validate_xml(xml: bytes, parser: object) -> None:
+    with time_stage("send", "cda_validate"):
+        etree.fromstring(xml, parser)
+
+
+# Skeleton generation mode. Everything that is the same for every encounter is
+# prepared once as a string, and only the per-encounter slots are escaped and filled
+# in. The output is byte-for-byte the same as create_hl7_cda_xml.
+
+_CDA_SKELETON = (
+    "<?xml version='1.0' encoding='utf8'?>\n"
+    '<ClinicalDocument xmlns="urn:hl7-org:v3" classCode="DOCCLIN" moodCode="EVN">'
+    f'<typeId root="{HL7_REFINED_MESSAGE_INFORMATION_MODELS}" extension="POCD_HD000040" />'
+    f'<id root="{HL7_EXTERNAL_IDENTIFICATION_SCHEME}" extension="{{encounter_id}}" assigningAuthorityName="PAS" />'
+    '<code code="pdf-cda-news2-chart" codeSystem="OCI" codeSystemName="Case Notes" displayName="NEWS2 Chart" />'
+    '<title representation="TXT" mediaType="text/plain">NEWS2 Chart</title>'
+    '<effectiveTime value="{effective_time}" />'
+    "<confidentialityCode />"
+    '<recordTarget typeCode="RCT" contextControlCode="OP">'
+    '<patientRole classCode="PAT">'
+    "{patient_ids}"
+    '<patient classCode="PSN" determinerCode="INSTANCE">'
+    "{patient_name}"
+    f'<administrativeGenderCode code="{{sex}}" codeSystem="{HL7_ADMINISTRATIVE_SEX}" />'
+    "{birth_time}"
+    "</patient></patientRole></recordTarget>"
+    '<author typeCode="AUT" contextControlCode="OP">'
+    '<time value="{author_time}" />'
+    '<assignedAuthor classCode="ASSIGNED">{assigned_author}</assignedAuthor>'
+    "</author>"
+    '<custodian typeCode="CST"><assignedCustodian classCode="ASSIGNED">'
+    '<representedCustodianOrganization classCode="ORG" determinerCode="INSTANCE">'
+    f'<id root="{HL7_EXTERNAL_IDENTIFICATION_SCHEME}" extension="{{ods_code}}" assigningAuthorityName="OUH" />'
+    "{organisation_name}"
+    "</representedCustodianOrganization></assignedCustodian></custodian>"
+    '<componentOf typeCode="COMP"><encompassingEncounter classCode="ENC" moodCode="EVN">'
+    '<code code="{encounter_id}" codeSystem="PAS" />'
+    "{admitted_time}"
+    "</encompassingEncounter></componentOf>"
+    '<component typeCode="COMP" contextConductionInd="true">'
+    '<nonXMLBody classCode="DOCBODY" moodCode="EVN">'
+    '<text mediaType="application/pdf" representation="TXT">{pdf_path}</text>'
+    "</nonXMLBody></component>"
+    "</ClinicalDocument>"
+)
+_ID_SLOT = (
+    '<id root="{root}" extension="{extension}" assigningAuthorityName="{authority}" />'
+)
+_BIRTH_TIME_SLOT = '<birthTime value="{value}" />'
+_ADMITTED_TIME_SLOT = '<effectiveTime value="{value}" operator="I" />'
+_ASSIGNED_PERSON_SLOT = (
+    '<assignedPerson classCode="PSN" determinerCode="INSTANCE">{name}</assignedPerson>'
+)
+
+
+def _escape_text(value: str) -> str:
+    return value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _escape_attribute(value: str) -> str:
+    return (
+        _escape_text(value)
+        .replace('"', "&quot;")
+        .replace("\r", "&#13;")
+        .replace("\n", "&#10;")
+        .replace("\t", "&#09;")
+    )
+
+
+def _element_slot(tag: str, attributes: str, text: Optional[str]) -> str:
+    # ElementTree writes elements without text, including empty text, self-closing.
+    start = f"{tag} {attributes}" if attributes else tag
+    if not text:
+        return f"<{start} />"
+    return f"<{start}>{_escape_text(text)}</{tag}>"
+
+
+def _name_part_slot(tag: str, part_type: str, text: Optional[str]) -> str:
+    attributes = f'partType="{part_type}" representation="TXT" mediaType="text/plain"'
+    return _element_slot(tag, attributes, text)
+
+
+def _person_name_slot(person: Dict) -> str:
+    return (
+        "<name>"
+        + _name_part_slot("given", "GIV", person.get("first_name"))
+        + _name_part_slot("family", "FAM", person.get("last_name"))
+        + "</name>"
+    )
+
+
+def create_hl7_cda_xml_from_skeleton(
+    data: dict,
+    base_unc_path: str,
+    pdf_filename: str,
+    parser: object,
+    validation_sample_rate: float = 1.0,
+) -> bytes:
+    """
+    Equivalent to create_hl7_cda_xml, but fills the per-encounter values into a
+    prepared document skeleton instead of building an element tree. Only a sample
+    of documents are validated against the schema, according to
+    validation_sample_rate (0 to never validate, 1 to always validate).
+    """
+    encounter: dict = data.get("encounter", {})
+    patient: dict = data.get("patient", {})
+
+    patient_ids = "".join(
+        _ID_SLOT.format(
+            root=oid,
+            extension=_escape_attribute(patient_id),
+            authority=assigning_authority,
+        )
+        for patient_id, oid, assigning_authority in [
+            (patient.get("nhs_number"), HL7_NHS_NUMBER, "NHS"),
+            (patient.get("hospital_number"), HL7_EXTERNAL_IDENTIFICATION_SCHEME, "PAS"),
+        ]
+        if patient_id is not None
+    )
+
+    birth_time = ""
+    dob = patient.get("dob")
+    if dob is not None:
+        birth_time = _BIRTH_TIME_SLOT.format(
+            value=_escape_attribute(xml_datetime_convert(dob))
+        )
+
+    author_time = _parse_datetime(encounter["created"], "created")
+    assigned_author = ""
+    creator = _document_author(data, encounter)
+    if creator.get("uuid") is not None:
+        assigned_author = _ID_SLOT.format(
+            root=HL7_EXTERNAL_IDENTIFICATION_SCHEME,
+            extension=_escape_attribute(creator["uuid"]),
+            authority="SEND",
+        ) + _ASSIGNED_PERSON_SLOT.format(name=_person_name_slot(creator))
+
+    location = _find_top_level_location(data["location"])
+
+    admitted_time = ""
+    admitted = parse_iso8601_to_datetime(encounter["admitted_at"])
+    if admitted is not None:
+        admitted_time = _ADMITTED_TIME_SLOT.format(
+            value=admitted.strftime(DATETIME_FORMAT)
+        )
+
+    xml = _CDA_SKELETON.format(
+        encounter_id=_escape_attribute(_encounter_id(encounter)),
+        effective_time=get_datetime_now().strftime(DATETIME_FORMAT),
+        patient_ids=patient_ids,
+        patient_name=_person_name_slot(patient),
+        sex=_escape_attribute(_sex_abbreviation(patient)),
+        birth_time=birth_time,
+        author_time=author_time,
+        assigned_author=assigned_author,
+        ods_code=_escape_attribute(location["ods_code"]),
+        organisation_name=_element_slot("name", "", location["display_name"]),
+        admitted_time=admitted_time,
+        pdf_path=_escape_text(str(PureWindowsPath(base_unc_path) / pdf_filename)),
+    ).encode("utf8")
+
+    logger.debug("Created HL7 XML CDA from skeleton")
+    if validation_sample_rate > 0 and random.random() < validation_sample_rate:
+        _validate_xml(xml, parser)
+    return xml
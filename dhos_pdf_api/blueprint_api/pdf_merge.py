@@ -0,0 +1,197 @@
+"""
+Merging of PDF documents
+
+Joins PDFs that were rendered separately into one document, using pypdf. Outlines and
+document information are not carried over.
+
+Each page of the merged document can be stamped with a line of text, such as its page
+number. The page's content streams are kept as they are, wrapped so that they can't
+change the graphics state of the stamp drawn after them.
+
+overlay_pages draws one page over pages of another document in the same way. The
+overlay is added once, as a form XObject that each page draws, so that it is neither
+drawn again nor copied for each page.
+"""
+import io
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, cast
+
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.errors import PyPdfError
+from pypdf.generic import (
+    ArrayObject,
+    ContentStream,
+    DecodedStreamObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+)
+
+# Widths of the standard Helvetica glyphs, in thousandths of the font size.
+_HELVETICA_WIDTHS = {
+    **{c: 556 for c in "0123456789abdeghnopqu"},
+    **{c: 278 for c in " fijlt./"},
+    **{c: 667 for c in "ABEKPSVXY"},
+    **{c: 722 for c in "CDHNRUw"},
+    **{c: 611 for c in "FTZ"},
+    "r": 333,
+    "m": 833,
+}
+_HELVETICA_DEFAULT_WIDTH = 556
+
+
+class Stamp(NamedTuple):
+    # Called with the page number and the number of pages.
+    text: Callable[[int, int], str]
+    font_size: float = 11
+    # Distance of the text baseline from the top of the page, and of the end of the
+    # text from the right of the page, in points.
+    top: float = 14
+    right: float = 28.35
+
+
+def _escape_string(text: str) -> bytes:
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return escaped.encode("cp1252", errors="replace")
+
+
+def _text_width(text: str, font_size: float) -> float:
+    widths = (_HELVETICA_WIDTHS.get(c, _HELVETICA_DEFAULT_WIDTH) for c in text)
+    return sum(widths) * font_size / 1000
+
+
+def _read(document: bytes) -> PdfReader:
+    try:
+        reader = PdfReader(io.BytesIO(document))
+        if reader.is_encrypted:
+            raise ValueError("Encrypted PDFs are not supported")
+        # Reads the page tree, which is otherwise only read when first used.
+        len(reader.pages)
+    except (PyPdfError, NotImplementedError) as e:
+        # pypdf raises NotImplementedError for encryption it can't open.
+        raise ValueError(f"Unreadable PDF: {e}") from e
+    return reader
+
+
+def merge_pdfs(documents: List[bytes], stamp: Optional[Stamp] = None) -> bytes:
+    """
+    Merges PDF documents into one, in order, optionally stamping each page.
+    """
+    writer = PdfWriter()
+    for reader in [_read(document) for document in documents]:
+        for page in reader.pages:
+            writer.add_page(page)
+
+    if stamp is not None:
+        _stamp_pages(writer, stamp)
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def overlay_pages(document: bytes, overlay: bytes, pages: Iterable[int]) -> bytes:
+    """
+    Draws the first page of the overlay over the given pages of the document, counted
+    from 0. The overlay's page should be the same size as the document's.
+    """
+    writer = PdfWriter()
+    for page in _read(document).pages:
+        writer.add_page(page)
+
+    overlay_page: PageObject = _read(overlay).pages[0]
+    contents: Optional[ContentStream] = overlay_page.get_contents()
+    if contents is None:
+        raise ValueError("The overlay page is empty")
+    resources = cast(DictionaryObject, overlay_page["/Resources"].get_object())
+    form_reference: IndirectObject = _stream(writer, contents.get_data())
+    cast(DecodedStreamObject, form_reference.get_object()).update(
+        {
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Form"),
+            NameObject("/BBox"): overlay_page.mediabox,
+            NameObject("/Resources"): resources.clone(writer),
+        }
+    )
+    save_state: IndirectObject = _stream(writer, b"q\n")
+    restore_state: IndirectObject = _stream(writer, b"\nQ\n")
+    draw_overlay: IndirectObject = _stream(writer, b"/Overlay Do")
+    for number in pages:
+        page = writer.pages[number]
+        _resources(page, "/XObject")[NameObject("/Overlay")] = form_reference
+        _append_content(page, save_state, restore_state, draw_overlay)
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+# pypdf has no public way to add an indirect object to a writer, so _add_object is
+# used and pypdf is pinned to the minor version it was tested with in pyproject.toml.
+def _stream(writer: PdfWriter, data: bytes) -> IndirectObject:
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return writer._add_object(stream)
+
+
+def _stamp_pages(writer: PdfWriter, stamp: Stamp) -> None:
+    font: IndirectObject = writer._add_object(
+        DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+                NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+            }
+        )
+    )
+    save_state: IndirectObject = _stream(writer, b"q\n")
+    restore_state: IndirectObject = _stream(writer, b"\nQ\n")
+    page_count = len(writer.pages)
+    for number, page in enumerate(writer.pages, start=1):
+        text = stamp.text(number, page_count)
+        x = (
+            float(page.mediabox.right)
+            - stamp.right
+            - _text_width(text, stamp.font_size)
+        )
+        y = float(page.mediabox.top) - stamp.top
+        stamp_content = _stream(
+            writer,
+            b"BT /Stamp %g Tf %.2f %.2f Td (%s) Tj ET"
+            % (stamp.font_size, x, y, _escape_string(text)),
+        )
+        _resources(page, "/Font")[NameObject("/Stamp")] = font
+        _append_content(page, save_state, restore_state, stamp_content)
+
+
+def _append_content(
+    page: PageObject,
+    save_state: IndirectObject,
+    restore_state: IndirectObject,
+    content: IndirectObject,
+) -> None:
+    """
+    Appends the content stream to the page, after the page's own wrapped in
+    save_state and restore_state.
+    """
+    streams: List[Any] = []
+    if "/Contents" in page:
+        contents = page.raw_get("/Contents")
+        if isinstance(contents.get_object(), ArrayObject):
+            streams = list(contents.get_object())
+        else:
+            streams = [contents]
+    page[NameObject("/Contents")] = ArrayObject(
+        [save_state, *streams, restore_state, content]
+    )
+
+
+def _resources(page: PageObject, kind: str) -> DictionaryObject:
+    resources = cast(
+        DictionaryObject,
+        page.setdefault(NameObject("/Resources"), DictionaryObject()).get_object(),
+    )
+    return cast(
+        DictionaryObject,
+        resources.setdefault(NameObject(kind), DictionaryObject()).get_object(),
+    )
@@ -0,0 +1,137 @@
+"""
+Render context for the GDM and DBM patient PDFs
+
+The per-row tables in the patient PDFs can run to thousands of rows. Rather than have
+the templates run filters and medication lookups for every cell, the rows are shaped
+into strings here in a single pass, and the templates only output them. Strings are
+produced exactly as Jinja would have rendered the raw values, so missing values
+render as empty strings and None renders as "None".
+"""
+from typing import Any, Dict, List, NamedTuple
+
+from .helpers import format_iso8601_datestring_to_pdf_format, value_or_none
+
+MEAL_TIMES = ("Breakfast", "Lunch", "Evening meal", "Before bed")
+
+DISPLAYED_MESSAGE_TYPES = (
+    "DHOS-MESSAGES-GENERAL",
+    "DHOS-MESSAGES-DOSAGE",
+    "DHOS-MESSAGES-DIETARY",
+    "DHOS-MESSAGES-ACTIVATION-CODE",
+)
+
+
+class ReadingRow(NamedTuple):
+    alert: bool
+    measured_at: str
+    activity: str
+    value: str
+    doses: str
+    comment: str
+
+
+class NoteRow(NamedTuple):
+    created: str
+    clinician: str
+    content: str
+
+
+class MessageRow(NamedTuple):
+    created: str
+    clinician: str
+    content: str
+
+
+def _text(obj: Dict, key: str) -> str:
+    if key not in obj:
+        return ""
+    return str(obj[key])
+
+
+def _created(obj: Dict) -> str:
+    return str(format_iso8601_datestring_to_pdf_format(obj.get("created", "")))
+
+
+def _clinician(clinician: Dict) -> str:
+    return (
+        f"{_text(clinician, 'first_name')} {_text(clinician, 'last_name')},"
+        f" {_text(clinician, 'job_title')}"
+    )
+
+
+def _dose(dose: Dict, medications: Dict[str, Dict]) -> str:
+    medication_id = dose.get("medication_id")
+    if "medication_id" in dose and medication_id in medications:
+        medication = medications[medication_id]
+        description = f"{_text(medication, 'unit')} {_text(medication, 'name')}"
+    else:
+        description = f"UNKNOWN MEDICATION ({_text(dose, 'medication_id')})"
+    return f"{_text(dose, 'amount')} {description}"
+
+
+def _reading_row(reading: Dict, medications: Dict[str, Dict]) -> ReadingRow:
+    alert: Dict = reading.get("alert") or {}
+    prandial_tag = reading.get("prandial_tag")
+    return ReadingRow(
+        alert=bool(alert) and not alert.get("dismissed"),
+        measured_at=str(
+            format_iso8601_datestring_to_pdf_format(
+                reading.get("measured_timestamp", "")
+            )
+        ),
+        activity=_text(prandial_tag, "description") if prandial_tag else "",
+        value=f"{_text(reading, 'blood_glucose_value')} {_text(reading, 'units')}",
+        doses=" ".join(_dose(dose, medications) for dose in reading.get("doses") or []),
+        comment=value_or_none(reading["comment"]) if "comment" in reading else "",
+    )
+
+
+def _note_rows(patient: Dict) -> List[NoteRow]:
+    notes: List[Dict] = (patient.get("record") or {}).get("notes") or []
+    return [
+        NoteRow(
+            created=_created(note),
+            clinician=_clinician(note.get("clinician") or {}),
+            content=_text(note, "content"),
+        )
+        for note in notes
+    ]
+
+
+def _message_rows(messages: List[Dict]) -> List[MessageRow]:
+    return [
+        MessageRow(
+            created=_created(message),
+            clinician=_clinician(message["clinician"])
+            if message.get("clinician")
+            else "",
+            content=_text(message, "content"),
+        )
+        for message in messages
+        if (message.get("message_type") or {}).get("uuid") in DISPLAYED_MESSAGE_TYPES
+    ]
+
+
+def shape_patient_pdf_context(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the template context for a GDM or DBM patient PDF: the request data plus
+    the table rows, already formatted. The whole document is rendered unless `part`
+    is set to "summary", "readings" or "notes".
+    """
+    medications: Dict[str, Dict] = data.get("medications") or {}
+    medication_plan: Dict[str, List[Dict]] = data.get("medication_plan") or {}
+    return {
+        **data,
+        "medication_plan_doses": {
+            meal: [_dose(dose, medications) for dose in medication_plan.get(meal) or []]
+            for meal in MEAL_TIMES
+        },
+        "reading_rows": [
+            _reading_row(reading, medications)
+            for reading in data.get("blood_glucose_readings") or []
+        ],
+        "note_rows": _note_rows(data.get("patient") or {}),
+        "message_rows": _message_rows(data.get("messages") or []),
+        "part": "all",
+        "first_reading_chunk": True,
+    }
@@ -0,0 +1,153 @@
+"""
+Retrying failed PDF renders
+
+A render that failed because no PDF engine was free is retried in the background a few
+times, with an increasing delay between attempts, and the request is accepted rather
+than failed. Other failures aren't retried: wkhtmltopdf killed for its time or memory
+use would be killed again, and a missing executable or unwritable file won't fix
+itself. At most max_queue_size renders wait to be retried, so when renders are failing
+faster than they can be retried the extra ones fail rather than building up.
+"""
+import atexit
+import queue
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+from flask import Flask
+from flask_batteries_included.helpers.error_handler import ServiceUnavailableException
+from she_logging import logger
+
+from dhos_pdf_api.blueprint_api.wkhtmltopdf import WkhtmltopdfTerminated
+from dhos_pdf_api.metrics import RENDER_RETRIES, RENDER_RETRY_QUEUE_SIZE
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether a render that failed with this error may succeed if tried again later, i.e.
+    all wkhtmltopdf processes were busy or the remote PDF engine was unavailable.
+    """
+    return isinstance(error, ServiceUnavailableException) and not isinstance(
+        error, WkhtmltopdfTerminated
+    )
+
+
+class RetryJob(NamedTuple):
+    description: str
+    run: Callable[[], None]
+    attempt: int
+    not_before: float
+
+
+class RetryQueue:
+    def __init__(
+        self, max_queue_size: int = 50, max_attempts: int = 3, delay: float = 10.0
+    ) -> None:
+        self.max_queue_size = max_queue_size
+        self.max_attempts = max_attempts
+        self.delay = delay
+        self._queue: "queue.Queue[RetryJob]" = queue.Queue()
+        # Renders waiting for their next attempt, including the one being waited on.
+        self._pending = 0
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, description: str, run: Callable[[], None]) -> bool:
+        """
+        Queues a failed render to be retried. Returns False if the queue is full.
+        """
+        with self._lock:
+            if self._pending >= self.max_queue_size:
+                RENDER_RETRIES.labels(outcome="dropped").inc()
+                logger.error("Render retry queue is full, not retrying %s", description)
+                return False
+            self._pending += 1
+            RENDER_RETRY_QUEUE_SIZE.set(self._pending)
+        self._put(RetryJob(description, run, attempt=1, not_before=0.0))
+        RENDER_RETRIES.labels(outcome="queued").inc()
+        logger.info("Queued %s to be retried", description)
+        self._start()
+        return True
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _put(self, job: RetryJob) -> None:
+        self._queue.put(
+            job._replace(not_before=time.monotonic() + self._delay(job.attempt))
+        )
+
+    def _done(self) -> None:
+        with self._lock:
+            self._pending -= 1
+            RENDER_RETRY_QUEUE_SIZE.set(self._pending)
+
+    def _delay(self, attempt: int) -> float:
+        return self.delay * 2 ** (attempt - 1)
+
+    def _start(self) -> None:
+        # The thread is only started when something first needs retrying.
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="render-retry", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if self._stopping.wait(max(job.not_before - time.monotonic(), 0)):
+                return
+            self._retry(job)
+
+    def _retry(self, job: RetryJob) -> None:
+        try:
+            job.run()
+        except Exception as e:
+            logger.exception("Retry %d of %s failed", job.attempt, job.description)
+            retryable = is_retryable(e)
+        else:
+            RENDER_RETRIES.labels(outcome="succeeded").inc()
+            logger.info("Retry %d of %s succeeded", job.attempt, job.description)
+            self._done()
+            return
+        if retryable and job.attempt < self.max_attempts:
+            self._put(job._replace(attempt=job.attempt + 1))
+            return
+        self._done()
+        RENDER_RETRIES.labels(outcome="failed").inc()
+        logger.error("Giving up retrying %s", job.description)
+
+
+_retry_queue: Optional[RetryQueue] = None
+
+
+def init_retry_queue(app: Flask) -> None:
+    global _retry_queue
+    if _retry_queue is not None:
+        _retry_queue.stop()
+    else:
+        atexit.register(stop_retry_queue)
+    _retry_queue = RetryQueue(
+        max_queue_size=app.config["RENDER_RETRY_QUEUE_SIZE"],
+        max_attempts=app.config["RENDER_RETRY_MAX_ATTEMPTS"],
+        delay=app.config["RENDER_RETRY_DELAY_SEC"],
+    )
+
+
+def get_retry_queue() -> RetryQueue:
+    if _retry_queue is None:
+        raise ValueError("Render retry queue has not been initialised")
+    return _retry_queue
+
+
+def stop_retry_queue() -> None:
+    if _retry_queue is not None:
+        _retry_queue.stop()
@@ -0,0 +1,192 @@
+"""
+PDF render backends
+
+Each of the GDM, DBM and SEND PDFs is rendered by the backend named in its config
+(GDM_PDF_RENDERER, DBM_PDF_RENDERER, SEND_PDF_RENDERER):
+
+- "wkhtmltopdf" runs a wkhtmltopdf process for each PDF, within the time and memory
+  limits WKHTMLTOPDF_TIMEOUT_SEC and WKHTMLTOPDF_MAX_MEMORY_MB.
+- "wkhtmltopdf-pool" runs at most WKHTMLTOPDF_POOL_SIZE wkhtmltopdf processes at a
+  time, shared by every product using it. Other renders wait for a free slot.
+- "remote" posts the request data to the PDF engine, which renders it with its own
+  template.
+
+The SEND template lives in the PDF engine, so SEND PDFs can only be rendered by the
+remote engine, and the remote engine only renders SEND PDFs. Further backends can be
+added with `register_renderer`.
+"""
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, FrozenSet, Mapping, NamedTuple, Optional
+
+import requests
+from flask_batteries_included.helpers.error_handler import ServiceUnavailableException
+from requests import HTTPError
+from she_logging import logger
+
+from dhos_pdf_api.metrics import time_stage
+from dhos_pdf_api.request_headers import request_headers
+
+from .wkhtmltopdf import Wkhtmltopdf, WkhtmltopdfLimits
+
+PATIENT_PDF_PRODUCTS: FrozenSet[str] = frozenset({"gdm", "dbm"})
+
+# The config key naming the backend for each product.
+PRODUCT_RENDERER_CONFIG: Dict[str, str] = {
+    "gdm": "GDM_PDF_RENDERER",
+    "dbm": "DBM_PDF_RENDERER",
+    "send": "SEND_PDF_RENDERER",
+}
+
+
+class RenderRequest(NamedTuple):
+    product: str
+    # The rendered template, for backends that render HTML.
+    html: Optional[str] = None
+    # The request data, for backends that render it with their own template.
+    data: Optional[Dict[str, Any]] = None
+    # wkhtmltopdf options.
+    options: Optional[Dict[str, Optional[str]]] = None
+
+
+class PdfRenderer(ABC):
+    # The products this backend can render.
+    products: FrozenSet[str] = frozenset()
+
+    @abstractmethod
+    def render(self, request: RenderRequest) -> bytes:
+        """
+        Returns the PDF for the request.
+        """
+
+
+class WkhtmltopdfRenderer(PdfRenderer):
+    products = PATIENT_PDF_PRODUCTS
+
+    def __init__(self, wkhtmltopdf: Wkhtmltopdf) -> None:
+        self.wkhtmltopdf = wkhtmltopdf
+
+    def render(self, request: RenderRequest) -> bytes:
+        with time_stage(request.product, "wkhtmltopdf"):
+            return self.wkhtmltopdf.render(request.html or "", request.options or {})
+
+
+class WkhtmltopdfPoolRenderer(WkhtmltopdfRenderer):
+    """
+    Limits the number of wkhtmltopdf processes running at once, so a burst of
+    requests queues for a process rather than starting one for every request.
+    """
+
+    def __init__(
+        self, wkhtmltopdf: Wkhtmltopdf, size: int, acquire_timeout: float
+    ) -> None:
+        super().__init__(wkhtmltopdf)
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(size)
+
+    def render(self, request: RenderRequest) -> bytes:
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            logger.error(
+                "No wkhtmltopdf process free after %.1fs", self.acquire_timeout
+            )
+            raise ServiceUnavailableException("All wkhtmltopdf processes are busy")
+        try:
+            return super().render(request)
+        finally:
+            self._slots.release()
+
+
+class RemoteEngineRenderer(PdfRenderer):
+    products = frozenset({"send"})
+
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url
+
+    def render(self, request: RenderRequest) -> bytes:
+        url: str = f"{self.base_url}/dhos/v1/{request.product}_pdf"
+        try:
+            with time_stage(request.product, "engine_http"):
+                response = requests.post(
+                    url, headers=request_headers(), json=request.data
+                )
+                response.raise_for_status()
+
+        except requests.exceptions.ConnectionError as e:
+            logger.exception("Could not connect to PDF engine")
+            raise ServiceUnavailableException(e)
+
+        except HTTPError as e:
+            logger.exception("HTTP error running PDF engine")
+            raise ServiceUnavailableException(e)
+
+        logger.debug("Received result from PDF engine")
+        return response.content
+
+
+RendererFactory = Callable[[Mapping[str, Any]], PdfRenderer]
+
+
+def _wkhtmltopdf(config: Mapping[str, Any]) -> Wkhtmltopdf:
+    return Wkhtmltopdf(
+        limits=WkhtmltopdfLimits(
+            timeout_seconds=config["WKHTMLTOPDF_TIMEOUT_SEC"],
+            max_memory_mb=config["WKHTMLTOPDF_MAX_MEMORY_MB"],
+        ),
+        executable=config["WKHTMLTOPDF_PATH"],
+    )
+
+
+RENDERERS: Dict[str, RendererFactory] = {
+    "wkhtmltopdf": lambda config: WkhtmltopdfRenderer(_wkhtmltopdf(config)),
+    "wkhtmltopdf-pool": lambda config: WkhtmltopdfPoolRenderer(
+        _wkhtmltopdf(config),
+        size=config["WKHTMLTOPDF_POOL_SIZE"],
+        acquire_timeout=config["WKHTMLTOPDF_POOL_TIMEOUT_SEC"],
+    ),
+    "remote": lambda config: RemoteEngineRenderer(config["DHOS_PDF_ENGINE_URL"]),
+}
+
+
+def register_renderer(name: str, factory: RendererFactory) -> None:
+    RENDERERS[name] = factory
+
+
+def create_renderer(name: str, config: Mapping[str, Any]) -> PdfRenderer:
+    if name not in RENDERERS:
+        raise ValueError(f"Unknown PDF renderer '{name}'")
+    return RENDERERS[name](config)
+
+
+_renderers: Dict[str, PdfRenderer] = {}
+
+
+def init_renderers(config: Mapping[str, Any]) -> None:
+    """
+    Creates the backend for each product. Products configured with the same backend
+    share one instance of it.
+    """
+    by_name: Dict[str, PdfRenderer] = {}
+    renderers: Dict[str, PdfRenderer] = {}
+    for product, key in PRODUCT_RENDERER_CONFIG.items():
+        name: str = config[key]
+        if name not in by_name:
+            by_name[name] = create_renderer(name, config)
+        if product not in by_name[name].products:
+            raise ValueError(f"PDF renderer '{name}' can't render {product} PDFs")
+        renderers[product] = by_name[name]
+    _renderers.clear()
+    _renderers.update(renderers)
+    logger.debug(
+        "PDF renderers: %s",
+        ", ".join(
+            f"{product}={config[key]}"
+            for product, key in PRODUCT_RENDERER_CONFIG.items()
+        ),
+    )
+
+
+def get_renderer(product: str) -> PdfRenderer:
+    if product not in _renderers:
+        raise ValueError("PDF renderers have not been initialised")
+    return _renderers[product]
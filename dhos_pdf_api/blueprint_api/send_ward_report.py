@@ -1,6 +1,9 @@
+import io
+import json
 import logging
 from pathlib import Path
-from typing import Any, Dict, List, Type
+from threading import Lock
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type
 
 import numpy as np
 import pandas as pd
@@ -14,6 +17,38 @@ import matplotlib
 matplotlib.use("pdf")
 from matplotlib import pyplot as plot
 from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.gridspec import GridSpec
+from matplotlib.transforms import BboxTransformTo
+from PIL import Image
+
+from dhos_pdf_api.blueprint_api.helpers import (
+    ward_report_digest,
+    ward_report_summary_path,
+    ward_report_thumbnail_path,
+    write_file,
+)
+from dhos_pdf_api.blueprint_api.pdf_merge import overlay_pages
+
+# Resolution of the page thumbnails, about 330 by 470 pixels, and the number of
+# colours in their palette. The pages are mostly flat colour, so a small palette keeps
+# the thumbnails to a few kB.
+THUMBNAIL_DPI = 40
+THUMBNAIL_COLOURS = 16
+
+# A4, in inches.
+PAGE_SIZE = (8.27, 11.69)
+
+
+class StaticLayer(NamedTuple):
+    # A page of the text and legends that are the same on every page of a report.
+    pdf: bytes
+    # The same page as a transparent image, at the resolution of the thumbnails.
+    thumbnail: Image.Image
+
+
+# Drawn once per process for each writer class, see SendWardReportWriter.static_layer.
+_static_layers: Dict[type, StaticLayer] = {}
+_static_layers_lock = Lock()
 
 
 class CellStyles:
@@ -133,16 +168,24 @@ class SendWardReportData:
     #
     ################################
 
-    def __init__(self, subset: List, location_uuid: str) -> None:
+    def __init__(
+        self,
+        subset: List,
+        location_uuid: str,
+        daily_metrics: Optional[pd.DataFrame] = None,
+    ) -> None:
         """
         computing aggregate metrics for pie chart and bar plot
-        """
 
-        formatted_subst = self.report_formatting(subset)
-
-        self.subset = pd.DataFrame.from_dict(formatted_subst)
-
-        self.out_df = self.preprocess()
+        daily_metrics, a column per metric indexed by metric_date, is used instead of
+        subset when given, e.g. from the stored metrics in ward_metric_store.
+        """
+        if daily_metrics is None:
+            formatted_subst = self.report_formatting(subset)
+            self.subset = pd.DataFrame.from_dict(formatted_subst)
+            self.out_df = self.preprocess()
+        else:
+            self.out_df = self.derive_metrics(daily_metrics.copy())
         self.location_uuid = location_uuid
 
         self.count_obs_sets_on_time = self.out_df["count_obs_sets_on_time"].sum()
@@ -178,6 +221,30 @@ class SendWardReportData:
             ),
         )
 
+    def summary(self) -> Dict[str, Any]:
+        """
+        The aggregates shown in the report, for dashboards
+        """
+        return {
+            "location_uuid": str(self.location_uuid),
+            "count_obs_sets_on_time": int(self.count_obs_sets_on_time),
+            "count_obs_sets_late": int(self.count_obs_sets_late),
+            "perc_obs_sets_on_time": float(self.perc_obs_sets_on_time),
+            "perc_obs_sets_late": float(self.perc_obs_sets_late),
+            "count_obs_sets_complete": int(self.count_obs_sets_complete),
+            "count_obs_sets_partial": int(self.count_obs_sets_partial),
+            "perc_obs_sets_complete": float(self.perc_obs_sets_complete),
+            "count_obs_missing": {
+                "acvpu": int(self.count_obs_missing_acvpu),
+                "hr": int(self.count_obs_missing_hr),
+                "spo2": int(self.count_obs_missing_spo2),
+                "o2therapy": int(self.count_obs_missing_o2therapy),
+                "rr": int(self.count_obs_missing_rr),
+                "sbp": int(self.count_obs_missing_sbp),
+                "temperature": int(self.count_obs_missing_temperature),
+            },
+        }
+
     def locate(self, metric_name: str) -> Any:
         return self.subset.loc[self.subset["metric_name"] == metric_name]
 
@@ -267,6 +334,12 @@ class SendWardReportData:
         out_df["count_obs_missing_o2therapy"] = self.output(
             metric_name="count_obs_missing_o2therapy"
         )
+        return self.derive_metrics(out_df)
+
+    def derive_metrics(self, out_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        adding the derived metrics to the daily metrics in out_df
+        """
         # computing derived metrics - perc obs sets taken on time are used for time series plot
         out_df["count_obs_sets_on_time"] = (
             out_df["count_obs_sets_on_time_high_risk"]
@@ -360,42 +433,208 @@ class SendWardReportWriter(SendWardReportIO):
         report_year: str,
         location_uuid: str,
         file_path: Path,
+        daily_metrics: Optional[pd.DataFrame] = None,
     ):
-        self.data: SendWardReportData = SendWardReportData(pdf_data, location_uuid)
+        self.data: SendWardReportData = SendWardReportData(
+            pdf_data, location_uuid, daily_metrics
+        )
 
+        self.hospital_name = hospital_name
+        self.ward_name = ward_name
+        self.report_month = report_month
+        self.report_year = report_year
         self.hospital_name_ward_name = " ".join((hospital_name, ward_name))
         self.month_year = " ".join((report_month, report_year))
 
         # post set
+        self.buffer: Any = None
         self.pdf_pages: Any = None
         self.grid_size: Any = None
+        self.grid: Any = None
         self.fig: Any = None
+        # Pages to draw the static layer over, counted from 0.
+        self.static_pages: List[int] = []
+        self.content: bytes = b""
+        self.thumbnail: Optional[bytes] = None
 
         super(SendWardReportWriter, self).__init__(file_path)
 
     def __enter__(
         self,
     ) -> "SendWardReportWriter":  # has to be string since type does not exist yet
-        self.pdf_pages = PdfPages(self.file_path)
+        # Rendered in memory and saved when complete, see save.
+        self.buffer = io.BytesIO()
+        self.pdf_pages = PdfPages(self.buffer)
         self.grid_size = (25, 5)
-        self.fig = plot.figure(figsize=(8.27, 11.69), dpi=100)
+        self.static_pages = []
+        self.new_page()
         return self
 
     def __exit__(
         self, exc_type: Type[Exception], exc_val: Exception, exc_tb: Any
     ) -> None:
-        self.pdf_pages.savefig(self.fig)
-        self.pdf_pages.close()
-        plot.close("all")
+        try:
+            if exc_type is None:
+                self.pdf_pages.savefig(self.fig)
+                self.thumbnail = self.render_thumbnail()
+            self.pdf_pages.close()
+        finally:
+            plot.close("all")
+        if exc_type is None:
+            self.content = overlay_pages(
+                self.buffer.getvalue(), self.static_layer().pdf, self.static_pages
+            )
+            self.save(self.content)
+
+    def new_page(self, static_layer: bool = True) -> None:
+        """
+        Starts a page, made the current figure. With static_layer, the static layer
+        is drawn over it when the report is complete.
+        """
+        # Drawn first, as drawing it changes the current figure.
+        self.static_layer()
+        if static_layer:
+            self.static_pages.append(self.pdf_pages.get_pagecount())
+        self.fig = plot.figure(figsize=PAGE_SIZE, dpi=100)
+        self.grid = GridSpec(*self.grid_size, figure=self.fig)
+
+    def static_layer(self) -> StaticLayer:
+        """
+        The text and legends that are the same on every page, drawn by
+        draw_static_layer once per process for each writer class. Pages then only
+        draw their charts and numbers.
+        """
+        with _static_layers_lock:
+            layer: Optional[StaticLayer] = _static_layers.get(type(self))
+            if layer is None:
+                fig = plot.figure(figsize=PAGE_SIZE, dpi=100)
+                pdf = io.BytesIO()
+                rendered = io.BytesIO()
+                try:
+                    self.draw_static_layer()
+                    fig.savefig(pdf, format="pdf", transparent=True)
+                    fig.savefig(
+                        rendered, format="png", dpi=THUMBNAIL_DPI, transparent=True
+                    )
+                finally:
+                    plot.close(fig)
+                layer = StaticLayer(
+                    pdf=pdf.getvalue(),
+                    thumbnail=Image.open(rendered).convert("RGBA"),
+                )
+                _static_layers[type(self)] = layer
+        return layer
+
+    def cell_text(
+        self,
+        loc: Tuple[int, int],
+        x: float,
+        y: float,
+        s: str,
+        colspan: int = 1,
+        rowspan: int = 1,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Draws text where plot.text would on a hidden plot.subplot2grid cell of the
+        page, without adding the axes. The cell's static text is in the static layer.
+        """
+        row, column = loc
+        cell = self.grid[row : row + rowspan, column : column + colspan]
+        self.fig.text(
+            x,
+            y,
+            s,
+            transform=BboxTransformTo(cell.get_position(self.fig))
+            + self.fig.transFigure,
+            **kwargs,
+        )
+
+    def render_thumbnail(self) -> Optional[bytes]:
+        """
+        A small PNG of the page, for dashboards
+        """
+        rendered = io.BytesIO()
+        self.fig.savefig(rendered, format="png", dpi=THUMBNAIL_DPI)
+        page = Image.open(rendered).convert("RGBA")
+        page.alpha_composite(self.static_layer().thumbnail)
+        image = page.convert("RGB").quantize(colors=THUMBNAIL_COLOURS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="png", optimize=True)
+        return buffer.getvalue()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "hospital_name": self.hospital_name,
+            "ward_name": self.ward_name,
+            "report_month": self.report_month,
+            "report_year": self.report_year,
+            **self.data.summary(),
+        }
+
+    def save(self, content: bytes) -> None:
+        """
+        Writes the report, and its summary and thumbnail beside it, each to a
+        temporary file that is renamed into place, so readers never see part of a
+        report and a failed report leaves the previous one. A failed rename is raised,
+        so that the report isn't recorded.
+
+        Renaming the report commits it. The summary and thumbnail are named after the
+        report's digest and written first, so a reader finds those of the report it
+        read, never a newer one's. Once the report is in place, those of earlier
+        reports are removed, except the one it replaced, which a reader may have just
+        read.
+        """
+        digest: str = ward_report_digest(content)
+        previous_digest: Optional[str] = (
+            ward_report_digest(self.file_path.read_bytes())
+            if self.file_path.exists()
+            else None
+        )
+        outputs: List[Tuple[Path, Optional[bytes]]] = [
+            (
+                ward_report_summary_path(self.file_path, digest),
+                json.dumps(self.summary()).encode("utf-8"),
+            ),
+            (ward_report_thumbnail_path(self.file_path, digest), self.thumbnail),
+            (self.file_path, content),
+        ]
+        for file_path, file_content in outputs:
+            if file_content is not None:
+                write_file(
+                    str(file_path),
+                    file_content,
+                    temp_dir=str(file_path.parent),
+                    product="ward",
+                    raise_on_failure=True,
+                )
+
+        keep: List[Path] = [
+            path(self.file_path, kept)
+            for path in (ward_report_summary_path, ward_report_thumbnail_path)
+            for kept in (digest, previous_digest)
+            if kept is not None
+        ]
+        for suffix in (".json", ".png"):
+            for stale in self.file_path.parent.glob(f"{self.file_path.stem}.*{suffix}"):
+                if stale not in keep:
+                    stale.unlink(missing_ok=True)
 
     def draw_pie_chart_text(self) -> None:
         """
-        text above pie chart
+        text above pie chart, beside draw_pie_chart_headings
         """
         # takes up the first (0th) row, starts in column 0, stretches across 5 columns
+        self.cell_text(
+            (0, 0), 0, 3.0, self.hospital_name_ward_name, colspan=5, fontsize=13
+        )
+        self.cell_text((0, 0), 0, 2.15, self.month_year, colspan=5, fontsize=13)
+
+    def draw_pie_chart_headings(self) -> None:
+        """
+        static text above pie chart
+        """
         plot.subplot2grid(self.grid_size, (0, 0), colspan=5)
-        plot.text(x=0, y=3.0, s=self.hospital_name_ward_name, fontsize=13)
-        plot.text(x=0, y=2.15, s=self.month_year, fontsize=13)
         plot.text(x=0, y=1.0, s="Overall Performance", fontsize=11)
         plot.text(x=0, y=0.45, s="All observation sets taken on time", fontsize=8)
         plot.text(x=0, y=0.00, s="or late in the specified month", fontsize=8)
@@ -431,47 +670,68 @@ class SendWardReportWriter(SendWardReportIO):
 
     def draw_pie_chart_legend(self) -> None:
         """
-        Legend below Pie chart
+        Legend below Pie chart, beside the squares of draw_pie_chart_legend_keys
         """
         # (Not handled as legend() in Python because I wanted more control over what I display)
         pie_labels = [
             "Observation sets taken late",
             "Observation sets taken on time",
         ]  # careful, don't change the order of pie_labels
+        self.cell_text(
+            (5, 0),
+            0.10,
+            -0.3,
+            f"{pie_labels[0]}: {str(int(round(self.data.perc_obs_sets_late)))}%",
+            colspan=2,
+            fontsize=8,
+        )
+        self.cell_text(
+            (5, 0),
+            0.10,
+            0.4,
+            f"{pie_labels[1]}: {str(int(round(self.data.perc_obs_sets_on_time)))}%",
+            colspan=2,
+            fontsize=8,
+        )
+
+    def draw_pie_chart_legend_keys(self) -> None:
+        """
+        Coloured squares of the legend below Pie chart
+        """
         plot.subplot2grid(self.grid_size, (5, 0), colspan=2)
         plot.text(
             x=0, y=-0.3, s="\u25a0", fontsize=14, color="#B4464D"
         )  # print red square
-        plot.text(
-            x=0.10,
-            y=-0.3,
-            s=f"{pie_labels[0]}: {str(int(round(self.data.perc_obs_sets_late)))}%",
-            fontsize=8,
-        )
         plot.text(
             x=0, y=0.4, s="\u25a0", fontsize=14, color="#46B4AD"
         )  # print green square
-        plot.text(
-            x=0.10,
-            y=0.4,
-            s=f"{pie_labels[1]}: {str(int(round(self.data.perc_obs_sets_on_time)))}%",
-            fontsize=8,
-        )
         # hiding both axes and the graph frame (spines)
         CellStyles.hide_all(plot.gca())
 
     def draw_pie_chart_summary(self) -> None:
+        """
+        Percentages to the RHS of pie chart, beside draw_pie_chart_summary_text
+        """
+        for y, percentage in (
+            (0.55, self.data.perc_obs_sets_on_time),
+            (0.25, self.data.perc_obs_sets_late),
+        ):
+            self.cell_text(
+                (1, 2),
+                0.05,
+                y,
+                f"{str(int(round(percentage)))}%",
+                colspan=3,
+                rowspan=4,
+                fontsize=8,
+            )
+
+    def draw_pie_chart_summary_text(self) -> None:
         """
         Text to the RHS of pie chart
         """
         plot.subplot2grid(self.grid_size, (1, 2), colspan=3, rowspan=4)
         plot.text(x=0.05, y=0.75, s="Summary", fontsize=11)
-        plot.text(
-            x=0.05,
-            y=0.55,
-            s=f"{str(int(round(self.data.perc_obs_sets_on_time)))}%",
-            fontsize=8,
-        )
         plot.text(
             x=0.15,
             y=0.55,
@@ -479,12 +739,6 @@ class SendWardReportWriter(SendWardReportIO):
             fontsize=8,
         )
         plot.text(x=0.15, y=0.45, s="or early in the specified month.", fontsize=8)
-        plot.text(
-            x=0.05,
-            y=0.25,
-            s=f"{str(int(round(self.data.perc_obs_sets_late)))}%",
-            fontsize=8,
-        )
         plot.text(
             x=0.15,
             y=0.25,
@@ -530,12 +784,8 @@ class SendWardReportWriter(SendWardReportIO):
         data_to_plot.index = pd.to_datetime(
             data_to_plot.index
         )  # python datetime functions expect datetime objects
-        # default index is "YYYY-MM-DD", we are changing this to be "MMM dd, day"
         data_to_plot = data_to_plot.assign(
-            formatted_date=[
-                f"{elem.strftime('%b %d')}, {elem.day_name()[0:3]}"
-                for elem in data_to_plot.index
-            ]
+            formatted_date=self.time_series_labels(data_to_plot.index)
         )
         data_to_plot.set_index(
             "formatted_date", inplace=True
@@ -557,6 +807,12 @@ class SendWardReportWriter(SendWardReportIO):
         ax.set_xlabel("")  # hiding x axis label
         AxesStyles.hide_legend(ax)
 
+    def time_series_labels(self, index: pd.DatetimeIndex) -> List[str]:
+        """
+        default index is "YYYY-MM-DD", we are changing this to be "MMM dd, day"
+        """
+        return [f"{elem.strftime('%b %d')}, {elem.day_name()[0:3]}" for elem in index]
+
     def draw_time_series_legend(self) -> None:
         """
         legend below timeseries
@@ -661,17 +917,35 @@ class SendWardReportWriter(SendWardReportIO):
 
     def draw_vital_signs_recording(self) -> None:
         """
-        Vital signs recordings
+        Vital signs recordings, beside the labels of draw_vital_signs_labels
+        """
+        for y, count in (
+            (0.8, f"{str(int(round(self.data.perc_obs_sets_complete))) }%"),
+            (0.10, str(int(round(self.data.count_obs_sets_partial)))),
+            (-0.8, str(int(round(self.data.count_obs_missing_acvpu)))),
+            (-1.05, str(int(round(self.data.count_obs_missing_hr)))),
+            (-1.3, str(int(round(self.data.count_obs_missing_spo2)))),
+            (-1.55, str(int(round(self.data.count_obs_missing_o2therapy)))),
+            (-1.8, str(int(round(self.data.count_obs_missing_rr)))),
+            (-2.05, str(int(round(self.data.count_obs_missing_sbp)))),
+            (-2.3, str(int(round(self.data.count_obs_missing_temperature)))),
+        ):
+            self.cell_text(
+                (19, 0),
+                0.25,
+                y,
+                count,
+                rowspan=2,
+                fontsize=8,
+                horizontalalignment="right",
+                verticalalignment="bottom",
+            )
+
+    def draw_vital_signs_labels(self) -> None:
+        """
+        Vital signs recording labels
         """
         plot.subplot2grid(self.grid_size, (19, 0), colspan=1, rowspan=2)
-        plot.text(
-            x=0.25,
-            y=0.8,
-            s=f"{str(int(round(self.data.perc_obs_sets_complete))) }%",
-            fontsize=8,
-            horizontalalignment="right",
-            verticalalignment="bottom",
-        )
         plot.text(
             x=0.32,
             y=0.8,
@@ -688,14 +962,6 @@ class SendWardReportWriter(SendWardReportIO):
             horizontalalignment="left",
             verticalalignment="bottom",
         )
-        plot.text(
-            x=0.25,
-            y=0.10,
-            s=str(int(round(self.data.count_obs_sets_partial))),
-            fontsize=8,
-            horizontalalignment="right",
-            verticalalignment="bottom",
-        )
         plot.text(
             x=0.32,
             y=0.10,
@@ -720,63 +986,6 @@ class SendWardReportWriter(SendWardReportIO):
             horizontalalignment="left",
             verticalalignment="bottom",
         )
-
-        plot.text(
-            x=0.25,
-            y=-0.8,
-            s=str(int(round(self.data.count_obs_missing_acvpu))),
-            fontsize=8,
-            horizontalalignment="right",
-            verticalalignment="bottom",
-        )
-        plot.text(
-            x=0.25,
-            y=-1.05,
-            s=str(int(round(self.data.count_obs_missing_hr))),
-            fontsize=8,
-            horizontalalignment="right",
-            verticalalignment="bottom",
-        )
-        plot.text(
-            x=0.25,
-            y=-1.3,
-            s=str(int(round(self.data.count_obs_missing_spo2))),
-            fontsize=8,
-            horizontalalignment="right",
-            verticalalignment="bottom",
-        )
-        plot.text(
-            x=0.25,
-            y=-1.55,
-            s=str(int(round(self.data.count_obs_missing_o2therapy))),
-            fontsize=8,
-            horizontalalignment="right",
-            verticalalignment="bottom",
-        )
-        plot.text(
-            x=0.25,
-            y=-1.8,
-            s=str(int(round(self.data.count_obs_missing_rr))),
-            fontsize=8,
-            horizontalalignment="right",
-            verticalalignment="bottom",
-        )
-        plot.text(
-            x=0.25,
-            y=-2.05,
-            s=str(int(round(self.data.count_obs_missing_sbp))),
-            fontsize=8,
-            horizontalalignment="right",
-            verticalalignment="bottom",
-        )
-        plot.text(
-            x=0.25,
-            y=-2.3,
-            s=str(int(round(self.data.count_obs_missing_temperature))),
-            fontsize=8,
-            horizontalalignment="right",
-            verticalalignment="bottom",
-        )
         plot.text(
             x=0.32,
             y=-0.8,
@@ -836,8 +1045,10 @@ class SendWardReportWriter(SendWardReportIO):
 
         CellStyles.hide_all(plot.gca())
 
-    def write(self) -> None:
+    def write(self) -> bytes:
         """
+        Draws and saves the report, and returns the PDF.
+
         >>> message_content = ...  # from RabbitMQ message body
 
         >>> SendWardReportWriter(
@@ -847,24 +1058,44 @@ class SendWardReportWriter(SendWardReportIO):
         ...    location_uuid="some location",
         ...    report_month="March",
         ...    report_year="2019",
-        ...).write
+        ...).write()
         """
         with self as drawer:
-            # pie chart stuff
-            drawer.draw_pie_chart_text()
-            drawer.draw_pie_chart()
-            drawer.draw_pie_chart_legend()
-            drawer.draw_pie_chart_summary()
-            # time series stuff
-            drawer.draw_time_series_text()
-            drawer.draw_time_series_percentages()
-            drawer.draw_time_series_legend()
-            # bar chart stuff
-            drawer.draw_bar_chart_header()
-            drawer.draw_bar_chart()
-            drawer.draw_bar_chart_text()
-            # vital signs stuff
-            drawer.draw_vital_signs_recording()
+            drawer.draw_page()
+        return self.content
+
+    def draw_page(self) -> None:
+        """
+        Draws what changes from page to page, the rest is in draw_static_layer
+        """
+        # pie chart stuff
+        self.draw_pie_chart_text()
+        self.draw_pie_chart()
+        self.draw_pie_chart_legend()
+        self.draw_pie_chart_summary()
+        # time series stuff
+        self.draw_time_series_percentages()
+        # bar chart stuff
+        self.draw_bar_chart()
+        # vital signs stuff
+        self.draw_vital_signs_recording()
+
+    def draw_static_layer(self) -> None:
+        """
+        Draws what is the same on every page, see static_layer
+        """
+        # pie chart stuff
+        self.draw_pie_chart_headings()
+        self.draw_pie_chart_legend_keys()
+        self.draw_pie_chart_summary_text()
+        # time series stuff
+        self.draw_time_series_text()
+        self.draw_time_series_legend()
+        # bar chart stuff
+        self.draw_bar_chart_header()
+        self.draw_bar_chart_text()
+        # vital signs stuff
+        self.draw_vital_signs_labels()
 
 
 class SendWardReportReader(SendWardReportIO):
@@ -0,0 +1,110 @@
+"""
+Jinja environment for the GDM and DBM patient PDFs
+
+Compiling the templates from source takes a noticeable part of startup in every
+process. `compile_templates` compiles them once into a zip of Python modules that
+Jinja's ModuleLoader can load, together with a manifest of the source templates they
+were compiled from. At startup the precompiled templates are only used if the
+manifest still matches the source templates, otherwise the templates are compiled
+from source, using a bytecode cache if one is configured.
+"""
+import hashlib
+import json
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from jinja2 import (
+    BaseLoader,
+    Environment,
+    FileSystemBytecodeCache,
+    ModuleLoader,
+    PackageLoader,
+)
+from she_logging import logger
+
+from .helpers import (
+    format_iso8601_datestring_to_pdf_format,
+    value_or_none,
+    yes_no_not_specified,
+)
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _create_environment(
+    loader: BaseLoader, bytecode_cache: Optional[FileSystemBytecodeCache] = None
+) -> Environment:
+    env = Environment(autoescape=True, loader=loader, bytecode_cache=bytecode_cache)
+    env.filters["yes_no_not_specified"] = yes_no_not_specified
+    env.filters[
+        "format_iso8601_datestring_to_pdf_format"
+    ] = format_iso8601_datestring_to_pdf_format
+    env.filters["value_or_none"] = value_or_none
+    return env
+
+
+def source_environment(
+    bytecode_cache_dir: Optional[str] = None,
+) -> Environment:
+    bytecode_cache = None
+    if bytecode_cache_dir:
+        Path(bytecode_cache_dir).mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+    return _create_environment(
+        PackageLoader("dhos_pdf_api", "templates"), bytecode_cache
+    )
+
+
+def source_checksums(env: Environment) -> Dict[str, str]:
+    checksums: Dict[str, str] = {}
+    for name in env.list_templates():
+        source, _, _ = env.loader.get_source(env, name)  # type: ignore
+        checksums[name] = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    return checksums
+
+
+def compile_templates(target: Path) -> None:
+    """
+    Compiles the templates into a zip that can be loaded with ModuleLoader.
+    """
+    env = source_environment()
+    env.compile_templates(str(target), zip="deflated", ignore_errors=False)
+    with zipfile.ZipFile(target, "a") as compiled:
+        compiled.writestr(MANIFEST_NAME, json.dumps(source_checksums(env), indent=2))
+    logger.info("Compiled %d templates to %s", len(env.list_templates()), target)
+
+
+def verify_compiled_templates(target: Path) -> List[str]:
+    """
+    Returns the names of templates that are missing from the compiled templates or
+    whose source has changed since they were compiled.
+    """
+    with zipfile.ZipFile(target) as compiled:
+        manifest: Dict[str, str] = json.loads(compiled.read(MANIFEST_NAME))
+    expected = source_checksums(source_environment())
+    return sorted(
+        name
+        for name in expected.keys() | manifest.keys()
+        if expected.get(name) != manifest.get(name)
+    )
+
+
+def create_environment(
+    compiled_templates: Optional[str] = None,
+    bytecode_cache_dir: Optional[str] = None,
+) -> Environment:
+    if compiled_templates:
+        try:
+            mismatched = verify_compiled_templates(Path(compiled_templates))
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            logger.exception("Could not read compiled templates %s", compiled_templates)
+        else:
+            if not mismatched:
+                logger.debug("Using compiled templates from %s", compiled_templates)
+                return _create_environment(ModuleLoader(compiled_templates))
+            logger.warning(
+                "Compiled templates are out of date, compiling from source: %s",
+                ", ".join(mismatched),
+            )
+    return source_environment(bytecode_cache_dir)
@@ -0,0 +1,143 @@
+"""
+Stored daily ward metrics
+
+With WARD_METRIC_STORE_DIR set, the metrics posted for ward reports are kept per
+location, so callers need only post the days that are new or have changed and each
+report is built from the stored metrics for its month.
+
+Each location's metrics are a single .npy file holding a 2-D int64 array with one row
+per day, in order and without gaps, and a column per metric: the day (as a date
+ordinal) followed by the metrics in METRIC_NAMES, with MISSING where there is no
+value. Reports read the file memory-mapped and only touch the rows for their month.
+New metrics must be added to the end of METRIC_NAMES; files written before then are
+read with the new metrics missing.
+"""
+import io
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from dhos_pdf_api.blueprint_api.helpers import write_file
+
+METRIC_NAMES: List[str] = [
+    "count_obs_sets_on_time_high_risk",
+    "count_obs_sets_on_time_med_risk",
+    "count_obs_sets_on_time_lomed_risk",
+    "count_obs_sets_on_time_low_risk",
+    "count_obs_sets_on_time_zero_risk",
+    "count_obs_sets_late_high_risk",
+    "count_obs_sets_late_med_risk",
+    "count_obs_sets_late_lomed_risk",
+    "count_obs_sets_late_low_risk",
+    "count_obs_sets_late_zero_risk",
+    "count_obs_sets_complete",
+    "count_obs_sets_partial",
+    "count_obs_missing_temperature",
+    "count_obs_missing_spo2",
+    "count_obs_missing_acvpu",
+    "count_obs_missing_hr",
+    "count_obs_missing_rr",
+    "count_obs_missing_sbp",
+    "count_obs_missing_o2therapy",
+    "count_obs_missing_temperature_pat_refused",
+    "count_obs_missing_spo2_pat_refused",
+    "count_obs_missing_hr_pat_refused",
+    "count_obs_missing_rr_pat_refused",
+    "count_obs_missing_sbp_pat_refused",
+]
+MISSING = -1
+
+_COLUMNS: Dict[str, int] = {name: index + 1 for index, name in enumerate(METRIC_NAMES)}
+
+# Stores are read, merged and rewritten, so updates in this process are serialised.
+# Updates to the same location from several processes may lose days.
+_store_lock = threading.Lock()
+
+
+class WardMetricStore:
+    def __init__(self, file_path: Path) -> None:
+        self.file_path = file_path
+
+    def _load(self) -> Optional[np.ndarray]:
+        if not self.file_path.exists():
+            return None
+        values: np.ndarray = np.load(self.file_path, mmap_mode="r")
+        return values
+
+    def add(self, pdf_data: List[Dict]) -> None:
+        """
+        Stores the metrics, replacing any stored values for the same day and metric.
+        Metrics not in METRIC_NAMES are ignored.
+        """
+        metrics: List[Dict] = [m for m in pdf_data if m["metric_name"] in _COLUMNS]
+        if not metrics:
+            return
+        days: List[int] = [
+            date.fromisoformat(m["metric_date"][:10]).toordinal() for m in metrics
+        ]
+        with _store_lock:
+            stored: Optional[np.ndarray] = self._load()
+            first_day: int = min(days)
+            last_day: int = max(days)
+            if stored is not None:
+                first_day = min(first_day, int(stored[0, 0]))
+                last_day = max(last_day, int(stored[-1, 0]))
+
+            values = np.full(
+                (last_day - first_day + 1, len(METRIC_NAMES) + 1),
+                MISSING,
+                dtype=np.int64,
+            )
+            values[:, 0] = np.arange(first_day, last_day + 1)
+            if stored is not None:
+                offset = int(stored[0, 0]) - first_day
+                values[offset : offset + len(stored), : stored.shape[1]] = stored
+            for day, metric in zip(days, metrics):
+                values[day - first_day, _COLUMNS[metric["metric_name"]]] = int(
+                    metric["metric_value"]
+                )
+            self._save(values)
+
+    def _save(self, values: np.ndarray) -> None:
+        buffer = io.BytesIO()
+        np.save(buffer, values)
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file and renamed, so readers never see part of it.
+        write_file(
+            str(self.file_path),
+            buffer.getvalue(),
+            temp_dir=str(self.file_path.parent),
+            product="ward",
+        )
+
+    def daily_metrics(self, first_day: date, last_day: date) -> pd.DataFrame:
+        """
+        The stored metrics from first_day to last_day inclusive, a column per metric
+        indexed by "YYYY-MM-DD" dates, as SendWardReportData expects. Days with no
+        stored metrics are left out.
+        """
+        stored: Optional[np.ndarray] = self._load()
+        if stored is None:
+            return pd.DataFrame(columns=METRIC_NAMES, dtype=float)
+        start: int = max(first_day.toordinal() - int(stored[0, 0]), 0)
+        stop: int = max(last_day.toordinal() - int(stored[0, 0]) + 1, 0)
+        rows: np.ndarray = np.array(stored[start:stop])
+
+        values: np.ndarray = np.full(
+            (len(rows), len(METRIC_NAMES)), np.nan, dtype=np.float64
+        )
+        values[:, : rows.shape[1] - 1] = rows[:, 1:]
+        values[values == MISSING] = np.nan
+        daily_metrics = pd.DataFrame(
+            values,
+            columns=METRIC_NAMES,
+            index=pd.Index(
+                [date.fromordinal(int(day)).isoformat() for day in rows[:, 0]],
+                name="metric_date",
+            ),
+        )
+        return daily_metrics.dropna(how="all")
@@ -0,0 +1,197 @@
+"""
+Ward trend reports
+
+Trend reports cover a range of months and a set of wards in a hospital, from the
+metrics kept by ward_metric_store. The wards' daily metrics are combined into one
+frame and summed by ward and month, and by month across all the wards, and
+SendWardReportData derives the percentages from the monthly sums just as it does from
+the daily metrics of a single month's report.
+
+The PDF has a page for the hospital, a page comparing the wards, then a page for each
+ward, drawn with the same layout as the single month report but with a point per
+month.
+"""
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from flask_batteries_included.helpers.error_handler import EntityNotFoundException
+
+# pyplot is imported from send_ward_report, which sets the matplotlib backend first.
+from dhos_pdf_api.blueprint_api.send_ward_report import (
+    CellStyles,
+    SendWardReportData,
+    SendWardReportWriter,
+    plot,
+)
+from dhos_pdf_api.blueprint_api.ward_metric_store import WardMetricStore
+
+
+def trend_report_data(
+    metric_store_dir: Path, locations: List[Dict], first_day: date, last_day: date
+) -> Tuple[SendWardReportData, List[Tuple[str, SendWardReportData]]]:
+    """
+    The report data of all the locations together and of each location, from the
+    stored metrics summed by month. Locations without stored metrics in the range are
+    left out. Raises ValueError for a location UUID that would name a file outside
+    the metric store.
+    """
+    ward_names: Dict[str, str] = {
+        str(location["location_uuid"]): location["ward_name"] for location in locations
+    }
+    daily: Dict[str, pd.DataFrame] = {}
+    for location_uuid in ward_names:
+        file_path: Path = metric_store_dir / f"{location_uuid}.npy"
+        if file_path.resolve().parent != metric_store_dir.resolve():
+            raise ValueError(f"Invalid location UUID '{location_uuid}'")
+        daily_metrics: pd.DataFrame = WardMetricStore(file_path).daily_metrics(
+            first_day, last_day
+        )
+        if not daily_metrics.empty:
+            daily[location_uuid] = daily_metrics
+    if not daily:
+        raise EntityNotFoundException("No stored ward metrics for locations and months")
+
+    combined: pd.DataFrame = pd.concat(daily, names=["location_uuid", "metric_date"])
+    wards: pd.Index = combined.index.get_level_values("location_uuid")
+    months: pd.Index = combined.index.get_level_values("metric_date").str[:7]
+    # min_count keeps a metric missing for a month when it is missing on every day.
+    by_ward: pd.DataFrame = combined.groupby([wards, months]).sum(min_count=1)
+    by_month: pd.DataFrame = combined.groupby(months).sum(min_count=1)
+
+    hospital = SendWardReportData([], "", daily_metrics=by_month)
+    ward_data: List[Tuple[str, SendWardReportData]] = [
+        (
+            ward_names[location_uuid],
+            SendWardReportData(
+                [], location_uuid, daily_metrics=by_ward.xs(location_uuid, level=0)
+            ),
+        )
+        for location_uuid in ward_names
+        if location_uuid in daily
+    ]
+    return hospital, ward_data
+
+
+class SendWardTrendReportWriter(SendWardReportWriter):
+    def __init__(
+        self,
+        hospital_name: str,
+        first_day: date,
+        last_day: date,
+        hospital: SendWardReportData,
+        wards: List[Tuple[str, SendWardReportData]],
+    ) -> None:
+        self.hospital_name = hospital_name
+        self.hospital = hospital
+        self.wards = wards
+
+        self.data: SendWardReportData = hospital
+        self.hospital_name_ward_name = f"{hospital_name} all wards"
+        self.month_year = f"{first_day:%B %Y} to {last_day:%B %Y}"
+
+        # post set
+        self.buffer: Any = None
+        self.pdf_pages: Any = None
+        self.grid_size: Any = None
+        self.grid: Any = None
+        self.fig: Any = None
+        self.static_pages: List[int] = []
+        self.content: bytes = b""
+        self.thumbnail: Optional[bytes] = None
+
+    def render_thumbnail(self) -> Optional[bytes]:
+        return None
+
+    def save(self, content: bytes) -> None:
+        """
+        Trend reports are returned in the response rather than stored.
+        """
+
+    def __enter__(self) -> "SendWardTrendReportWriter":
+        super().__enter__()
+        return self
+
+    def next_page(self, static_layer: bool = True) -> None:
+        self.pdf_pages.savefig(self.fig)
+        plot.close(self.fig)
+        self.new_page(static_layer)
+
+    def write(self) -> bytes:
+        with self as drawer:
+            drawer.draw_page()
+            drawer.next_page(static_layer=False)
+            drawer.draw_ward_comparison()
+            for ward_name, data in self.wards:
+                drawer.next_page()
+                drawer.data = data
+                drawer.hospital_name_ward_name = " ".join(
+                    (self.hospital_name, ward_name)
+                )
+                drawer.draw_page()
+        return self.content
+
+    def time_series_labels(self, index: pd.DatetimeIndex) -> List[str]:
+        return [elem.strftime("%b %Y") for elem in index]
+
+    def draw_time_series_text(self) -> None:
+        """
+        Text above timeseries
+        """
+        plot.subplot2grid(self.grid_size, (7, 0), colspan=5)
+        plot.text(
+            x=0,
+            y=0.2,
+            s="Percentage of all observation sets taken on time by month",
+            fontsize=11,
+        )
+        CellStyles.hide_all(plot.gca())
+
+    def draw_ward_comparison(self) -> None:
+        """
+        Observation sets on time by ward, by month and over the whole period
+        """
+        plot.subplot2grid(self.grid_size, (0, 0), colspan=5)
+        plot.text(x=0, y=3.0, s=self.hospital_name, fontsize=13)
+        plot.text(x=0, y=2.15, s=self.month_year, fontsize=13)
+        plot.text(x=0, y=1.0, s="Ward Comparison", fontsize=11)
+        plot.text(
+            x=0, y=0.45, s="All observation sets taken on time by month", fontsize=8
+        )
+        CellStyles.hide_all(plot.gca())
+
+        ax = plot.subplot2grid(self.grid_size, (2, 0), colspan=5, rowspan=9)
+        by_month = pd.DataFrame(
+            {name: data.out_df["perc_obs_sets_on_time"] for name, data in self.wards}
+        )
+        by_month.index = self.time_series_labels(pd.to_datetime(by_month.index))
+        plot.axhline(y=90, color="grey", linestyle="--")  # target line
+        by_month.plot(ax=ax, marker="o", markersize=5)
+        ax.tick_params(axis="both", which="major", labelsize=8)
+        ax.set_ylim(-0.05, 105.5)
+        ax.legend(fontsize=7, loc="lower left")
+
+        plot.subplot2grid(self.grid_size, (12, 0), colspan=5)
+        plot.text(x=0, y=0.2, s="Over the whole period", fontsize=11)
+        CellStyles.hide_all(plot.gca())
+
+        ax = plot.subplot2grid(self.grid_size, (13, 1), colspan=4, rowspan=11)
+        overall = pd.DataFrame(
+            {
+                "Observation sets taken on time": [
+                    data.perc_obs_sets_on_time for _, data in self.wards
+                ],
+                "Complete observation sets": [
+                    data.perc_obs_sets_complete for _, data in self.wards
+                ],
+            },
+            index=[name for name, _ in self.wards],
+        )
+        overall.plot.barh(
+            ax=ax, color=["#57606C", "#46B4AD"], width=0.8, zorder=3
+        ).invert_yaxis()
+        ax.tick_params(axis="both", which="major", labelsize=8)
+        ax.set_xlim(0, 105.5)
+        ax.grid(axis="x", zorder=0, linestyle="--")
+        ax.legend(fontsize=7, loc="lower right")
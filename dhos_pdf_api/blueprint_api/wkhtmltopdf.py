@@ -0,0 +1,149 @@
+"""
+Running wkhtmltopdf with limits
+
+pdfkit waits for wkhtmltopdf for as long as it takes, so a run that hangs on a
+pathological document holds its thread forever. Here wkhtmltopdf is started in a
+session of its own and watched while it runs: if it runs longer than the timeout, or
+the processes in its session use more resident memory than the limit, the whole
+session is killed and the process reaped, and WkhtmltopdfTerminated is raised.
+
+pdfkit is still used to find the executable and build the command line.
+"""
+import os
+import signal
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import pdfkit
+from flask_batteries_included.helpers.error_handler import ServiceUnavailableException
+from she_logging import logger
+
+from dhos_pdf_api.metrics import WKHTMLTOPDF_RUNNING, WKHTMLTOPDF_TERMINATIONS
+
+# How often a running process is checked against its limits.
+POLL_INTERVAL_SECONDS = 0.1
+
+
+class WkhtmltopdfLimits(NamedTuple):
+    timeout_seconds: float
+    # 0 for no limit.
+    max_memory_mb: int = 0
+
+
+class WkhtmltopdfTerminated(ServiceUnavailableException):
+    def __init__(self, reason: str, message: str) -> None:
+        super().__init__(message)
+        self.reason = reason
+
+
+def _session_processes(session_id: int) -> Iterator[int]:
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # The fields after the command name, which may itself contain spaces.
+        fields = stat[stat.rindex(")") + 2 :].split()
+        if int(fields[3]) == session_id:
+            yield int(entry.name)
+
+
+def session_rss_kb(session_id: int) -> int:
+    """
+    Returns the resident memory of the processes in a session, in kB.
+    """
+    total = 0
+    for pid in _session_processes(session_id):
+        try:
+            with open(f"/proc/{pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total
+
+
+def _kill(process: "subprocess.Popen[bytes]") -> None:
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    # Reaps the process, so it doesn't stay around as a zombie.
+    process.communicate()
+
+
+class Wkhtmltopdf:
+    def __init__(
+        self, limits: WkhtmltopdfLimits, executable: Optional[str] = None
+    ) -> None:
+        self.limits = limits
+        self.executable = executable
+        self._configuration: Any = None
+
+    def _command(self, html: str, options: Dict[str, Optional[str]]) -> List[str]:
+        if self._configuration is None:
+            # Looking up the executable runs `which`, so only do it once.
+            self._configuration = pdfkit.configuration(
+                wkhtmltopdf=self.executable or ""
+            )
+        kit = pdfkit.PDFKit(
+            html, "string", options=options, configuration=self._configuration
+        )
+        return kit.command()
+
+    def render(self, html: str, options: Dict[str, Optional[str]]) -> bytes:
+        command = self._command(html, options)
+        with WKHTMLTOPDF_RUNNING.track_inprogress():
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                start_new_session=True,
+            )
+            stdout, stderr = self._communicate(process, html.encode("utf-8"))
+        pdfkit.PDFKit.handle_error(
+            process.returncode, stderr.decode("utf-8", errors="replace")
+        )
+        return stdout
+
+    def _communicate(
+        self, process: "subprocess.Popen[bytes]", html: bytes
+    ) -> Tuple[bytes, bytes]:
+        deadline = time.monotonic() + self.limits.timeout_seconds
+        stdin: Optional[bytes] = html
+        while True:
+            try:
+                return process.communicate(stdin, timeout=POLL_INTERVAL_SECONDS)
+            except subprocess.TimeoutExpired:
+                # The input has been passed on, and isn't passed again.
+                stdin = None
+            if time.monotonic() > deadline:
+                self._terminate(
+                    process,
+                    "timeout",
+                    f"wkhtmltopdf took longer than {self.limits.timeout_seconds}s",
+                )
+            if self.limits.max_memory_mb:
+                rss_kb = session_rss_kb(process.pid)
+                if rss_kb > self.limits.max_memory_mb * 1024:
+                    self._terminate(
+                        process,
+                        "memory",
+                        f"wkhtmltopdf used {rss_kb // 1024}MB,"
+                        f" limit is {self.limits.max_memory_mb}MB",
+                    )
+
+    def _terminate(
+        self, process: "subprocess.Popen[bytes]", reason: str, message: str
+    ) -> None:
+        _kill(process)
+        WKHTMLTOPDF_TERMINATIONS.labels(reason=reason).inc()
+        logger.error("Killed wkhtmltopdf process %d: %s", process.pid, message)
+        raise WkhtmltopdfTerminated(reason, message)
@@ -1,18 +1,7 @@
-import os
 from typing import Optional
 
 from environs import Env
 from flask import Flask
-from lxml import etree
-
-
-def _load_parser() -> object:
-    root_path = os.path.dirname(os.path.abspath(__file__))
-    xsd = os.path.join(root_path, "schema", "infrastructure", "cda", "CDA_SDTC.xsd")
-    with open(xsd, "r") as f:
-        schema_doc = etree.parse(f)
-        schema = etree.XMLSchema(schema_doc)
-        return etree.XMLParser(schema=schema)
 
 
 class Configuration:
@@ -31,7 +20,83 @@ class Configuration:
     SEND_TMP_OUTPUT_DIR: str = env.str("SEND_TMP_OUTPUT_DIR")
     SEND_BCP_CDA_UNC_PATH: Optional[str] = env.str("SEND_BCP_CDA_UNC_PATH", None)
     SEND_WARD_REPORT_OUTPUT_DIR: str = env.str("SEND_WARD_REPORT_OUTPUT_DIR")
-    CDA_XML_SCHEMA_PARSER: object = _load_parser()
+    # Import the ward report dependencies (pandas, numpy, matplotlib) in a background
+    # thread at startup rather than on the first ward report request.
+    WARD_REPORT_WARM_UP: bool = env.bool("WARD_REPORT_WARM_UP", False)
+    # Trace allocations while writing each ward report, for the peak allocation
+    # metric. This makes ward reports about five times slower, so is refused in
+    # production.
+    WARD_REPORT_TRACE_MALLOC: bool = env.bool("WARD_REPORT_TRACE_MALLOC", False)
+    # Ward metrics are stored per location here, and ward reports built from the
+    # stored metrics for their month. See blueprint_api/ward_metric_store.py.
+    WARD_METRIC_STORE_DIR: Optional[str] = env.str("WARD_METRIC_STORE_DIR", None)
+    # Backend rendering each product's PDFs, see blueprint_api/renderers.py.
+    GDM_PDF_RENDERER: str = env.str("GDM_PDF_RENDERER", "wkhtmltopdf")
+    DBM_PDF_RENDERER: str = env.str("DBM_PDF_RENDERER", "wkhtmltopdf")
+    SEND_PDF_RENDERER: str = env.str("SEND_PDF_RENDERER", "remote")
+    # Found on the PATH if not set.
+    WKHTMLTOPDF_PATH: Optional[str] = env.str("WKHTMLTOPDF_PATH", None)
+    # wkhtmltopdf processes are killed after this long, or when they use more than
+    # this much resident memory (0 for no limit).
+    WKHTMLTOPDF_TIMEOUT_SEC: float = env.float("WKHTMLTOPDF_TIMEOUT_SEC", 120)
+    WKHTMLTOPDF_MAX_MEMORY_MB: int = env.int("WKHTMLTOPDF_MAX_MEMORY_MB", 0)
+    # Failed GDM/DBM renders are retried in the background, up to this many times.
+    RENDER_RETRY_QUEUE_SIZE: int = env.int("RENDER_RETRY_QUEUE_SIZE", 50)
+    RENDER_RETRY_MAX_ATTEMPTS: int = env.int("RENDER_RETRY_MAX_ATTEMPTS", 3)
+    RENDER_RETRY_DELAY_SEC: float = env.float("RENDER_RETRY_DELAY_SEC", 10)
+    # How many requests of each route class run at once (0 for no limit), and how
+    # many more may wait, for up to ADMISSION_MAX_WAIT_SEC, before being rejected
+    # with ADMISSION_REJECT_STATUS. See blueprint_api/admission.py.
+    ADMISSION_RENDER_CONCURRENCY: int = env.int("ADMISSION_RENDER_CONCURRENCY", 0)
+    ADMISSION_RENDER_QUEUE_SIZE: int = env.int("ADMISSION_RENDER_QUEUE_SIZE", 0)
+    ADMISSION_ENGINE_CONCURRENCY: int = env.int("ADMISSION_ENGINE_CONCURRENCY", 0)
+    ADMISSION_ENGINE_QUEUE_SIZE: int = env.int("ADMISSION_ENGINE_QUEUE_SIZE", 0)
+    ADMISSION_DOWNLOAD_CONCURRENCY: int = env.int("ADMISSION_DOWNLOAD_CONCURRENCY", 0)
+    ADMISSION_DOWNLOAD_QUEUE_SIZE: int = env.int("ADMISSION_DOWNLOAD_QUEUE_SIZE", 0)
+    ADMISSION_MAX_WAIT_SEC: float = env.float("ADMISSION_MAX_WAIT_SEC", 5)
+    ADMISSION_REJECT_STATUS: int = env.int("ADMISSION_REJECT_STATUS", 503)
+    # Maximum wkhtmltopdf processes for the "wkhtmltopdf-pool" renderer, and how long
+    # a render waits for one before failing.
+    WKHTMLTOPDF_POOL_SIZE: int = env.int("WKHTMLTOPDF_POOL_SIZE", 4)
+    WKHTMLTOPDF_POOL_TIMEOUT_SEC: float = env.float("WKHTMLTOPDF_POOL_TIMEOUT_SEC", 30)
+    # GDM/DBM PDFs with at least this many blood glucose readings are rendered in
+    # parts, in parallel, with this many readings in each part. 0 disables this.
+    PATIENT_PDF_CHUNK_THRESHOLD: int = env.int("PATIENT_PDF_CHUNK_THRESHOLD", 0)
+    PATIENT_PDF_CHUNK_SIZE: int = env.int("PATIENT_PDF_CHUNK_SIZE", 500)
+    PATIENT_PDF_CHUNK_WORKERS: int = env.int("PATIENT_PDF_CHUNK_WORKERS", 4)
+    # Zip of precompiled templates, see `flask compile-templates`. Templates are
+    # compiled from source if this isn't set or doesn't match the source templates.
+    JINJA_COMPILED_TEMPLATES: Optional[str] = env.str("JINJA_COMPILED_TEMPLATES", None)
+    # Cache for templates compiled from source.
+    JINJA_BYTECODE_CACHE_DIR: Optional[str] = env.str("JINJA_BYTECODE_CACHE_DIR", None)
+    # Log the wall time and memory of each phase of app startup.
+    STARTUP_PROFILE: bool = env.bool("STARTUP_PROFILE", False)
+    # Outside production, requests with an X-Profile header are profiled and the
+    # profile written here. See helper/request_profile.py.
+    PROFILE_OUTPUT_DIR: Optional[str] = env.str("PROFILE_OUTPUT_DIR", None)
+    PROFILE_SAMPLE_INTERVAL_MS: float = env.float("PROFILE_SAMPLE_INTERVAL_MS", 5)
+    PROFILE_LIST_LIMIT: int = env.int("PROFILE_LIST_LIMIT", 50)
+    # Compile the CDA schema in a background thread at startup rather than on the
+    # first SEND request. Only applies when SEND_BCP_CDA_UNC_PATH is set.
+    CDA_SCHEMA_WARM_UP: bool = env.bool("CDA_SCHEMA_WARM_UP", True)
+    # "element" builds each CDA document as an element tree, "skeleton" fills the
+    # per-encounter values into a prepared document.
+    CDA_GENERATION_MODE: str = env.str("CDA_GENERATION_MODE", "element")
+    # Fraction of skeleton-generated CDA documents validated against the schema.
+    CDA_VALIDATION_SAMPLE_RATE: float = env.float("CDA_VALIDATION_SAMPLE_RATE", 1.0)
+    # "sync" publishes each CDA message inside the request, "batched" spools them and
+    # publishes in batches from a background thread.
+    CDA_PUBLISH_MODE: str = env.str("CDA_PUBLISH_MODE", "sync")
+    CDA_PUBLISH_SPOOL_DIR: Optional[str] = env.str("CDA_PUBLISH_SPOOL_DIR", None)
+    CDA_PUBLISH_QUEUE_SIZE: int = env.int("CDA_PUBLISH_QUEUE_SIZE", 1000)
+    CDA_PUBLISH_BATCH_SIZE: int = env.int("CDA_PUBLISH_BATCH_SIZE", 50)
+    CDA_PUBLISH_FLUSH_INTERVAL_SEC: float = env.float(
+        "CDA_PUBLISH_FLUSH_INTERVAL_SEC", 0.5
+    )
+    CDA_PUBLISH_MAX_RETRIES: int = env.int("CDA_PUBLISH_MAX_RETRIES", 5)
+    # How often the batched publisher queues messages left in the spool by failed
+    # batches.
+    CDA_PUBLISH_SPOOL_RESCAN_SEC: float = env.float("CDA_PUBLISH_SPOOL_RESCAN_SEC", 60)
     CUSTOMER_CODE: str = env.str("CUSTOMER_CODE")
     DHOS_TRUSTOMER_API_HOST: str = env.str("DHOS_TRUSTOMER_API_HOST")
     POLARIS_API_KEY: str = env.str("POLARIS_API_KEY")
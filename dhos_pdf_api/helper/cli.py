@@ -1,8 +1,14 @@
+import subprocess
+import sys
+from pathlib import Path
+from typing import Tuple
+
 import click
 from flask import Flask
 from flask_batteries_included.helpers.apispec import generate_openapi_spec
 
 from dhos_pdf_api import blueprint_api
+from dhos_pdf_api.blueprint_api import template_loader
 from dhos_pdf_api.models.api_spec import dhos_pdf_api_spec
 
 
@@ -11,3 +17,38 @@ def add_cli_command(app: Flask) -> None:
     @click.argument("output", type=click.Path())
     def create_api(output: str) -> None:
         generate_openapi_spec(dhos_pdf_api_spec, output, blueprint_api.api_blueprint)
+
+    @app.cli.command(
+        "profile-startup",
+        context_settings={"ignore_unknown_options": True},
+        help="Profile a cold start of the app in a fresh interpreter. Options are"
+        " passed to `python -m dhos_pdf_api.helper.startup_profile`.",
+    )
+    @click.argument("args", nargs=-1, type=click.UNPROCESSED)
+    def profile_startup(args: Tuple[str, ...]) -> None:
+        result = subprocess.run(
+            [sys.executable, "-m", "dhos_pdf_api.helper.startup_profile", *args]
+        )
+        sys.exit(result.returncode)
+
+    @app.cli.command("compile-templates")
+    @click.argument("output", type=click.Path(dir_okay=False))
+    def compile_templates(output: str) -> None:
+        """Precompile the PDF templates for JINJA_COMPILED_TEMPLATES."""
+        template_loader.compile_templates(Path(output))
+        _verify_templates(output)
+
+    @app.cli.command("verify-templates")
+    @click.argument("compiled", type=click.Path(exists=True, dir_okay=False))
+    def verify_templates(compiled: str) -> None:
+        """Check precompiled templates against the source templates."""
+        _verify_templates(compiled)
+
+
+def _verify_templates(compiled: str) -> None:
+    mismatched = template_loader.verify_compiled_templates(Path(compiled))
+    if mismatched:
+        raise click.ClickException(
+            f"Compiled templates don't match source: {', '.join(mismatched)}"
+        )
+    click.echo(f"Compiled templates in {compiled} match the source templates")
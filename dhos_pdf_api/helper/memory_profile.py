@@ -0,0 +1,150 @@
+"""
+Memory profiling of ward report generation
+
+Ward reports are drawn with pyplot, which keeps figures in global state until they
+are closed. measure_memory records the peak allocation and the resident memory of a
+single report, and profile_ward_reports writes the same report repeatedly and
+measures how much traced and resident memory is still held after the warm-up reports,
+which is what a leak looks like:
+
+    python -m benchmarks.bench_ward_report_memory --reports 50 --max-traced-growth-kb 1024
+
+tracemalloc slows every allocation down while it is tracing, making a ward report about
+five times slower with the single frame measure_memory records, so the service only
+traces ward reports when WARD_REPORT_TRACE_MALLOC is set, and not in production.
+"""
+import gc
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Optional
+
+from dhos_pdf_api.helper.startup_profile import current_rss_kb
+
+
+class MemoryUsage:
+    def __init__(self) -> None:
+        self.rss_before_kb: int = 0
+        self.rss_after_kb: int = 0
+        # Only measured while tracemalloc is tracing.
+        self.peak_alloc_bytes: Optional[int] = None
+
+
+@contextmanager
+def measure_memory(trace_malloc: bool = True) -> Generator[MemoryUsage, None, None]:
+    """
+    Measures the resident memory before and after the block and, with trace_malloc,
+    the peak memory allocated in it. tracemalloc is started for the block if it isn't
+    already tracing. Allocations by other threads during the block are included.
+    """
+    usage = MemoryUsage()
+    started_tracing = False
+    traced_before = 0
+    if trace_malloc:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+    usage.rss_before_kb = current_rss_kb()
+    try:
+        yield usage
+    finally:
+        usage.rss_after_kb = current_rss_kb()
+        if trace_malloc:
+            usage.peak_alloc_bytes = tracemalloc.get_traced_memory()[1] - traced_before
+            if started_tracing:
+                tracemalloc.stop()
+
+
+def write_ward_report(data: Dict, file_path: Path) -> None:
+    from dhos_pdf_api.blueprint_api.send_ward_report import SendWardReportWriter
+
+    SendWardReportWriter(
+        pdf_data=data["pdf_data"],
+        hospital_name=data["hospital_name"],
+        ward_name=data["ward_name"],
+        report_month=data["report_month"],
+        report_year=data["report_year"],
+        location_uuid=data["location_uuid"],
+        file_path=file_path,
+    ).write()
+
+
+def profile_ward_reports(
+    data: Dict,
+    file_path: Path,
+    reports: int,
+    warm_up: int = 3,
+    top: int = 10,
+    traceback_frames: int = 25,
+) -> Dict[str, Any]:
+    """
+    Writes the ward report warm_up times, then reports more times, and returns how
+    much traced and resident memory grew over the later reports, the peak allocation
+    of each report, and the source lines whose allocations grew the most. Tracing
+    fewer traceback_frames is faster but the lines reported are less useful.
+    """
+    tracemalloc.start(traceback_frames)
+    try:
+        for _ in range(warm_up):
+            write_ward_report(data, file_path)
+        gc.collect()
+        rss_baseline_kb: int = current_rss_kb()
+        baseline: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+
+        peaks: List[int] = []
+        rss_kb: List[int] = []
+        for _ in range(reports):
+            with measure_memory() as usage:
+                write_ward_report(data, file_path)
+            peaks.append(usage.peak_alloc_bytes or 0)
+            rss_kb.append(usage.rss_after_kb)
+
+        gc.collect()
+        # Before the snapshot, which holds a copy of every trace and would count as
+        # growth.
+        rss_final_kb: int = current_rss_kb()
+        final: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    differences: List[tracemalloc.StatisticDiff] = final.compare_to(baseline, "lineno")
+    return {
+        "reports": reports,
+        "traced_growth_kb": sum(diff.size_diff for diff in differences) / 1024,
+        "rss_growth_kb": rss_final_kb - rss_baseline_kb,
+        "peak_alloc_bytes": peaks,
+        "rss_kb": rss_kb,
+        "top_growth": [
+            {
+                "location": str(diff.traceback[0]),
+                "size_diff_kb": diff.size_diff / 1024,
+                "count_diff": diff.count_diff,
+            }
+            for diff in differences[:top]
+            if diff.size_diff > 0
+        ],
+    }
+
+
+def budget_failures(
+    report: Dict[str, Any],
+    max_traced_growth_kb: Optional[float] = None,
+    max_rss_growth_kb: Optional[float] = None,
+) -> List[str]:
+    failures: List[str] = []
+    if (
+        max_traced_growth_kb is not None
+        and report["traced_growth_kb"] > max_traced_growth_kb
+    ):
+        failures.append(
+            f"traced memory grew {report['traced_growth_kb']:.0f} kB over"
+            f" {report['reports']} reports, budget {max_traced_growth_kb:.0f} kB"
+        )
+    if max_rss_growth_kb is not None and report["rss_growth_kb"] > max_rss_growth_kb:
+        failures.append(
+            f"RSS grew {report['rss_growth_kb']} kB over {report['reports']} reports,"
+            f" budget {max_rss_growth_kb:.0f} kB"
+        )
+    return failures
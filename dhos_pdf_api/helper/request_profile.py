@@ -0,0 +1,206 @@
+"""
+On-demand request profiling
+
+Outside production, a request sent with an X-Profile header of "collapsed" or
+"pstats", and a token with the read:profiles scope, is profiled on its own, and the
+profile is written to PROFILE_OUTPUT_DIR:
+
+    curl -H "X-Profile: collapsed" ... http://localhost:5000/dhos/v1/ward_report
+
+"collapsed" samples the request thread's stack every PROFILE_SAMPLE_INTERVAL_MS and
+writes one line per distinct stack with the number of samples, ready for
+flamegraph.pl or speedscope. "pstats" runs the request under cProfile and writes a
+file for pstats or snakeviz. Only the thread handling the request is profiled, not
+the threads it hands work to. A header is used rather than a query parameter because
+the API's strict validation rejects unknown query parameters.
+
+Profiles are named after the route rather than the path, so that they don't carry the
+patient or encounter UUIDs in it. GET /profiles lists the most recent profiles, and
+needs the same scope. In production none of this is registered, and other requests
+only pay for looking for the header.
+"""
+import cProfile
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Dict, List, Optional, Union
+
+import flask
+from flask import Flask, Response, current_app, g, request
+from flask_batteries_included.config import is_not_production_environment
+from flask_batteries_included.helpers.security import protected_route
+from flask_batteries_included.helpers.security.endpoint_security import scopes_present
+from she_logging import logger
+from she_logging.request_id import current_request_id
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_FORMATS = {"collapsed": ".collapsed", "pstats": ".pstats"}
+PROFILE_SCOPE = "read:profiles"
+
+
+@protected_route(scopes_present(required_scopes=PROFILE_SCOPE))
+def _authorise_profile() -> None:
+    """
+    Raises PermissionError unless the request's token has the profiling scope.
+    """
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread from a background thread.
+    """
+
+    def __init__(self, thread_id: int, interval_seconds: float) -> None:
+        self.thread_id = thread_id
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(
+            target=self._run, name="request-profiler", daemon=True
+        )
+
+    def start(self) -> None:
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._sampler.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval_seconds):
+            frame: Optional[FrameType] = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def write(self, path: Path) -> None:
+        path.write_text(
+            "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+        )
+
+
+def _collapse(frame: Optional[FrameType]) -> str:
+    names: List[str] = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+Profiler = Union[SamplingProfiler, cProfile.Profile]
+
+
+def _profile_path(directory: Path, profile_format: str) -> Path:
+    # e.g. /dhos/v1/gdm_pdf/<patient_uuid> rather than the UUID itself.
+    rule: str = request.url_rule.rule if request.url_rule else "unknown_route"
+    path_slug: str = re.sub(r"[^A-Za-z0-9]+", "_", rule).strip("_")
+    return directory / (
+        f"{time.strftime('%Y%m%dT%H%M%S')}-{request.method.lower()}-{path_slug}"
+        f"-{current_request_id() or 'no-request-id'}{PROFILE_FORMATS[profile_format]}"
+    )
+
+
+def _start_profile() -> None:
+    profile_format: Optional[str] = request.headers.get(PROFILE_HEADER)
+    if not profile_format:
+        return
+    if profile_format not in PROFILE_FORMATS:
+        logger.warning("Unknown profile format '%s', not profiling", profile_format)
+        return
+    if not current_app.config["PROFILE_OUTPUT_DIR"]:
+        logger.warning("PROFILE_OUTPUT_DIR is not set, not profiling")
+        return
+    try:
+        _authorise_profile()
+    except PermissionError:
+        logger.warning("Request is not authorised to be profiled, not profiling")
+        return
+
+    profiler: Profiler
+    if profile_format == "collapsed":
+        profiler = SamplingProfiler(
+            thread_id=threading.get_ident(),
+            interval_seconds=current_app.config["PROFILE_SAMPLE_INTERVAL_MS"] / 1000,
+        )
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    g.request_profile = (profile_format, profiler)
+
+
+def _finish_profile() -> Optional[Path]:
+    """
+    Stops the profiler started for this request, if any, and writes its profile.
+    """
+    profile = g.pop("request_profile", None)
+    if profile is None:
+        return None
+    profile_format, profiler = profile
+    directory = Path(current_app.config["PROFILE_OUTPUT_DIR"])
+    directory.mkdir(parents=True, exist_ok=True)
+    path: Path = _profile_path(directory, profile_format)
+    if isinstance(profiler, SamplingProfiler):
+        profiler.stop()
+        profiler.write(path)
+    else:
+        profiler.disable()
+        profiler.dump_stats(str(path))
+    logger.info("Wrote %s profile to %s", profile_format, path)
+    return path
+
+
+def list_profiles(directory: Path, limit: int) -> List[Dict]:
+    if not directory.is_dir():
+        return []
+    paths: List[Path] = [
+        path for path in directory.iterdir() if path.suffix in PROFILE_FORMATS.values()
+    ]
+    paths.sort(key=lambda path: path.stat().st_mtime, reverse=True)
+    return [
+        {
+            "name": path.name,
+            "format": path.suffix[1:],
+            "size_bytes": path.stat().st_size,
+            "created": time.strftime(
+                "%Y-%m-%dT%H:%M:%S", time.localtime(path.stat().st_mtime)
+            ),
+        }
+        for path in paths[:limit]
+    ]
+
+
+def init_request_profiling(app: Flask) -> None:
+    if not is_not_production_environment():
+        return
+
+    @app.before_request
+    def start_request_profile() -> None:
+        _start_profile()
+
+    @app.after_request
+    def finish_request_profile(response: Response) -> Response:
+        path: Optional[Path] = _finish_profile()
+        if path is not None:
+            response.headers["X-Profile-File"] = path.name
+        return response
+
+    @app.teardown_request
+    def teardown_request_profile(error: Optional[BaseException]) -> None:
+        # Requests that fail with an unhandled error don't reach after_request.
+        _finish_profile()
+
+    @app.route("/profiles", methods=["GET"])
+    @protected_route(scopes_present(required_scopes=PROFILE_SCOPE))
+    def get_profiles() -> Response:
+        directory: Optional[str] = current_app.config["PROFILE_OUTPUT_DIR"]
+        if not directory:
+            return flask.jsonify([])
+        return flask.jsonify(
+            list_profiles(
+                Path(directory), limit=current_app.config["PROFILE_LIST_LIMIT"]
+            )
+        )
@@ -0,0 +1,206 @@
+"""
+Startup profiling
+
+Records the wall time and resident memory of each phase of create_app, and of the
+heavy imports that happen before it. Set STARTUP_PROFILE=true to log the phases of
+create_app when the service starts, or profile a cold start in a fresh interpreter:
+
+    python -m dhos_pdf_api.helper.startup_profile --max-seconds 10 --max-rss-mb 300
+
+which exits non-zero when a budget is exceeded, so it can be used to fail CI.
+"""
+import argparse
+import importlib
+import json
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Generator, Iterable, List, Optional
+
+from she_logging import logger
+
+# Imported in this order by the app. Later imports only pay for what earlier ones
+# haven't already loaded.
+HEAVY_IMPORTS = (
+    "flask",
+    "sqlalchemy",
+    "connexion",
+    "flask_batteries_included",
+    "kombu_batteries_included",
+    "lxml.etree",
+    "pdfkit",
+    "jinja2",
+    "dhos_pdf_api.blueprint_api",
+)
+
+
+def _read_status_kb(field: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def current_rss_kb() -> int:
+    rss = _read_status_kb("VmRSS")
+    if rss is None:
+        # Without /proc, the peak is the best available approximation.
+        return peak_rss_kb()
+    return rss
+
+
+def peak_rss_kb() -> int:
+    # ru_maxrss carries over the parent's value across exec, VmHWM doesn't.
+    peak = _read_status_kb("VmHWM")
+    if peak is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak
+
+
+class StartupProfiler:
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Generator[None, None, None]:
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        rss_before = current_rss_kb()
+        try:
+            yield
+        finally:
+            rss_after = current_rss_kb()
+            self.phases.append(
+                {
+                    "phase": name,
+                    "seconds": time.perf_counter() - start,
+                    "rss_kb": rss_after,
+                    "rss_delta_kb": rss_after - rss_before,
+                }
+            )
+
+    def import_modules(self, modules: Iterable[str]) -> None:
+        for module in modules:
+            with self.phase(f"import {module}"):
+                importlib.import_module(module)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "phases": self.phases,
+            "total_seconds": time.perf_counter() - self.started,
+            "peak_rss_kb": peak_rss_kb(),
+        }
+
+    def log(self) -> None:
+        for phase in self.phases:
+            logger.info(
+                "Startup phase '%s' took %.3fs, RSS %d kB (%+d kB)",
+                phase["phase"],
+                phase["seconds"],
+                phase["rss_kb"],
+                phase["rss_delta_kb"],
+            )
+        report = self.report()
+        logger.info(
+            "Startup took %.3fs, peak RSS %d kB",
+            report["total_seconds"],
+            report["peak_rss_kb"],
+        )
+
+
+def budget_failures(
+    report: Dict[str, Any],
+    max_seconds: Optional[float] = None,
+    max_rss_mb: Optional[float] = None,
+    max_phase_seconds: Optional[float] = None,
+) -> List[str]:
+    failures: List[str] = []
+    if max_seconds is not None and report["total_seconds"] > max_seconds:
+        failures.append(
+            f"startup took {report['total_seconds']:.3f}s, budget is {max_seconds}s"
+        )
+    if max_rss_mb is not None and report["peak_rss_kb"] > max_rss_mb * 1024:
+        failures.append(
+            f"peak RSS was {report['peak_rss_kb'] / 1024:.1f}MB, budget is {max_rss_mb}MB"
+        )
+    if max_phase_seconds is not None:
+        failures.extend(
+            f"phase '{phase['phase']}' took {phase['seconds']:.3f}s,"
+            f" budget is {max_phase_seconds}s"
+            for phase in report["phases"]
+            if phase["seconds"] > max_phase_seconds
+        )
+    return failures
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"{'phase':<45} {'seconds':>8} {'RSS kB':>9} {'delta kB':>9}")
+    for phase in report["phases"]:
+        print(
+            f"{phase['phase']:<45} {phase['seconds']:>8.3f} {phase['rss_kb']:>9d}"
+            f" {phase['rss_delta_kb']:>+9d}"
+        )
+    print(
+        f"{'total':<45} {report['total_seconds']:>8.3f} {report['peak_rss_kb']:>9d}"
+        " (peak)"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Profile a cold start of the app.")
+    parser.add_argument("--max-seconds", type=float, help="Budget for total startup")
+    parser.add_argument("--max-rss-mb", type=float, help="Budget for peak RSS")
+    parser.add_argument(
+        "--max-phase-seconds", type=float, help="Budget for any single phase"
+    )
+    parser.add_argument(
+        "--sqlite", action="store_true", help="Use an in-memory database"
+    )
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    profiler = StartupProfiler()
+    profiler.import_modules(HEAVY_IMPORTS)
+
+    from dhos_pdf_api.app import create_app
+    from dhos_pdf_api.blueprint_api.hl7_cda import get_cda_schema
+
+    if args.sqlite:
+        app = create_app(
+            testing=True, use_pgsql=False, use_sqlite=True, profiler=profiler
+        )
+    else:
+        app = create_app(profiler=profiler)
+    if app.config["SEND_BCP_CDA_UNC_PATH"]:
+        # Usually compiled in the background, waits for that if it has started.
+        with profiler.phase("cda schema"):
+            get_cda_schema()
+
+    report = profiler.report()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+
+    failures = budget_failures(
+        report,
+        max_seconds=args.max_seconds,
+        max_rss_mb=args.max_rss_mb,
+        max_phase_seconds=args.max_phase_seconds,
+    )
+    for failure in failures:
+        print(f"Startup budget exceeded: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import time
+from contextlib import contextmanager
+from typing import Generator
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from dhos_pdf_api.request_timing import record_stage
+
+CDA_SCHEMA_COMPILE_SECONDS = Gauge(
+    "dhos_pdf_cda_schema_compile_seconds",
+    "Time taken to parse and compile the HL7 CDA XML schema",
+)
+
+WKHTMLTOPDF_RUNNING = Gauge(
+    "dhos_pdf_wkhtmltopdf_running", "Number of wkhtmltopdf processes running"
+)
+
+WKHTMLTOPDF_TERMINATIONS = Counter(
+    "dhos_pdf_wkhtmltopdf_terminations_total",
+    "wkhtmltopdf processes killed for exceeding their time or memory limit",
+    ["reason"],
+)
+
+RENDER_RETRIES = Counter(
+    "dhos_pdf_render_retries_total",
+    "Failed PDF renders by what happened to their retry: queued, dropped because the"
+    " queue was full, succeeded, or failed after the last attempt",
+    ["outcome"],
+)
+
+RENDER_RETRY_QUEUE_SIZE = Gauge(
+    "dhos_pdf_render_retry_queue_size", "Number of PDF renders waiting to be retried"
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "dhos_pdf_admission_in_flight",
+    "Number of admitted requests running, by route class",
+    ["route_class"],
+)
+
+ADMISSION_REJECTIONS = Counter(
+    "dhos_pdf_admission_rejections_total",
+    "Requests rejected because their route class was at its limit",
+    ["route_class"],
+)
+
+# From sub-millisecond file writes up to wkhtmltopdf's default timeout.
+STAGE_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+STAGE_SECONDS = Histogram(
+    "dhos_pdf_stage_seconds",
+    "Time taken by each stage of generating a document, by product (gdm, dbm, send or"
+    " ward). cda_build includes cda_validate",
+    ["product", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+
+STAGE_ERRORS = Counter(
+    "dhos_pdf_stage_errors_total",
+    "Stages of generating a document that raised an error, by product",
+    ["product", "stage"],
+)
+
+OUTPUT_BYTES = Counter(
+    "dhos_pdf_output_bytes_total",
+    "Bytes of documents generated, by product",
+    ["product"],
+)
+
+
+WARD_REPORT_PEAK_ALLOC_BYTES = Histogram(
+    "dhos_pdf_ward_report_peak_alloc_bytes",
+    "Peak memory allocated while writing a ward report, when WARD_REPORT_TRACE_MALLOC"
+    " is set",
+    buckets=tuple(2**power for power in range(20, 31)),
+)
+
+WARD_REPORT_RSS_BYTES = Gauge(
+    "dhos_pdf_ward_report_rss_bytes",
+    "Resident memory of the process after writing the last ward report",
+)
+
+
+@contextmanager
+def time_stage(product: str, stage: str) -> Generator[None, None, None]:
+    """
+    Records how long the block takes in dhos_pdf_stage_seconds and in the current
+    request's timings, and counts it in dhos_pdf_stage_errors_total if it raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(product=product, stage=stage).inc()
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(product=product, stage=stage).observe(seconds)
+        record_stage(stage, seconds)
@@ -96,6 +96,168 @@ class WardReportRequestSchema(Schema):
     pdf_data = fields.List(fields.Nested(send_pdf_data.MetricSchema), required=True)
 
 
+class WardTrendLocationSchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+        ordered = True
+
+    location_uuid = fields.UUID(
+        metadata={
+            "description": "UUID of ward location",
+            "example": "7379e212-9bab-4df1-a95f-f927c4c9f7f1",
+        },
+        required=True,
+    )
+    ward_name = fields.String(
+        metadata={"description": "Name of ward", "example": "Dumbledore Ward"},
+        required=True,
+    )
+
+
+@openapi_schema(dhos_pdf_api_spec)
+class WardTrendReportRequestSchema(Schema):
+    class Meta:
+        title = "Ward trend report request data"
+        unknown = EXCLUDE
+        ordered = True
+
+    hospital_name = fields.String(
+        metadata={
+            "description": "Name of hospital",
+            "example": "Birchy Hospital",
+        },
+        required=True,
+    )
+    locations = fields.List(
+        fields.Nested(WardTrendLocationSchema),
+        metadata={"description": "Wards to include in the report"},
+        required=True,
+    )
+    start_month = fields.String(
+        metadata={"description": "First month of report", "example": "2019-01"},
+        required=True,
+    )
+    end_month = fields.String(
+        metadata={"description": "Last month of report", "example": "2019-12"},
+        required=True,
+    )
+
+
+@openapi_schema(dhos_pdf_api_spec)
+class WardReportSchema(Schema):
+    class Meta:
+        title = "Stored ward report"
+        ordered = True
+
+    location_uuid = fields.String(
+        metadata={
+            "description": "UUID of ward location",
+            "example": "7379e212-9bab-4df1-a95f-f927c4c9f7f1",
+        },
+        required=True,
+    )
+    year = fields.Integer(
+        metadata={"description": "Year of report", "example": 2019}, required=True
+    )
+    month = fields.Integer(
+        metadata={"description": "Month of report, from 1", "example": 7},
+        required=True,
+    )
+    size_bytes = fields.Integer(
+        metadata={"description": "Size of the PDF in bytes", "example": 182044},
+        required=True,
+    )
+    sha256 = fields.String(
+        metadata={
+            "description": "SHA-256 hash of the PDF, in hex",
+            "example": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
+        },
+        required=True,
+    )
+    generated = fields.String(
+        metadata={
+            "description": "When the report was generated",
+            "example": "2019-08-01T09:30:00.000Z",
+        },
+        required=True,
+    )
+
+
+@openapi_schema(dhos_pdf_api_spec)
+class WardReportSummarySchema(Schema):
+    class Meta:
+        title = "Ward report summary"
+        ordered = True
+
+    hospital_name = fields.String(
+        metadata={"description": "Name of hospital", "example": "Birchy Hospital"},
+        required=True,
+    )
+    ward_name = fields.String(
+        metadata={"description": "Name of ward", "example": "Dumbledore Ward"},
+        required=True,
+    )
+    report_month = fields.String(
+        metadata={"description": "Month of report", "example": "July"}, required=True
+    )
+    report_year = fields.String(
+        metadata={"description": "Year of report", "example": "2019"}, required=True
+    )
+    location_uuid = fields.String(
+        metadata={
+            "description": "UUID of ward location",
+            "example": "7379e212-9bab-4df1-a95f-f927c4c9f7f1",
+        },
+        required=True,
+    )
+    count_obs_sets_on_time = fields.Integer(
+        metadata={"description": "Observation sets taken on time", "example": 1835},
+        required=True,
+    )
+    count_obs_sets_late = fields.Integer(
+        metadata={"description": "Observation sets taken late", "example": 242},
+        required=True,
+    )
+    perc_obs_sets_on_time = fields.Float(
+        metadata={
+            "description": "Percentage of observation sets taken on time",
+            "example": 88.3,
+        },
+        required=True,
+    )
+    perc_obs_sets_late = fields.Float(
+        metadata={
+            "description": "Percentage of observation sets taken late",
+            "example": 11.7,
+        },
+        required=True,
+    )
+    count_obs_sets_complete = fields.Integer(
+        metadata={"description": "Complete observation sets", "example": 1990},
+        required=True,
+    )
+    count_obs_sets_partial = fields.Integer(
+        metadata={"description": "Partial observation sets", "example": 87},
+        required=True,
+    )
+    perc_obs_sets_complete = fields.Float(
+        metadata={
+            "description": "Percentage of observation sets that are complete",
+            "example": 95.8,
+        },
+        required=True,
+    )
+    count_obs_missing = fields.Dict(
+        keys=fields.String(),
+        values=fields.Integer(),
+        metadata={
+            "description": "Observations missing from partial sets, by vital sign",
+            "example": {"hr": 12, "spo2": 30},
+        },
+        required=True,
+    )
+
+
 @openapi_schema(dhos_pdf_api_spec)
 class GdmPdfRequestSchema(Schema):
     class Meta:
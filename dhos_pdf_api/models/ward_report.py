@@ -0,0 +1,40 @@
+from typing import Any, Dict
+
+from flask_batteries_included.sqldb import ModelIdentifier, db
+
+
+class WardReport(ModelIdentifier, db.Model):
+    """
+    Index of the stored ward reports, one per location and month.
+    """
+
+    location_uuid = db.Column(db.String, nullable=False, index=True)
+    report_year = db.Column(db.Integer, nullable=False)
+    report_month = db.Column(db.Integer, nullable=False)
+    # Relative to SEND_WARD_REPORT_OUTPUT_DIR.
+    file_name = db.Column(db.String, nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String, nullable=False)
+    generated = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint("location_uuid", "report_year", "report_month"),
+    )
+
+    def __init__(self, **kwargs: Any) -> None:
+        # Constructor to satisfy linters.
+        super(WardReport, self).__init__(**kwargs)
+
+    def to_dict(self) -> Dict:
+        return {
+            "location_uuid": self.location_uuid,
+            "year": self.report_year,
+            "month": self.report_month,
+            "size_bytes": self.size_bytes,
+            "sha256": self.sha256,
+            "generated": self.generated.isoformat(timespec="milliseconds") + "Z",
+        }
+
+    @classmethod
+    def schema(cls) -> Dict:
+        raise NotImplementedError
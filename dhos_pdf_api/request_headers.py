@@ -0,0 +1,10 @@
+from typing import Dict
+
+from she_logging.request_id import current_request_id
+
+
+def request_headers() -> Dict:
+    """
+    Headers passing the current request's ID on to the services it calls.
+    """
+    return {"X-Request-ID": current_request_id()}
@@ -0,0 +1,110 @@
+"""
+Per-request stage timings
+
+Each API request collects the time spent in each group of stages recorded with
+metrics.time_stage. The totals are returned in a Server-Timing header, and logged in
+a single line with the request id, so that one slow request can be explained without
+going to the histograms.
+
+The timings are held in a context variable, so stages run on the SEND pipeline
+threads (which run in a copy of the request's context) count towards the request that
+started them. Stages that overlap are each counted in full.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from flask import Flask, Response, request
+from she_logging import logger
+
+from dhos_pdf_api.request_headers import request_headers
+
+TIMING_GROUPS = ("validation", "render", "engine", "io", "db", "publish")
+
+# Group of each stage recorded with metrics.time_stage. cda_validate is part of
+# cda_build, so isn't counted again.
+STAGE_GROUPS: Dict[str, str] = {
+    "schema_load": "validation",
+    "template_render": "render",
+    "wkhtmltopdf": "render",
+    "cda_build": "render",
+    "report_write": "render",
+    "engine_http": "engine",
+    "write": "io",
+    "fsync": "io",
+    "rename": "io",
+    "spool_write": "publish",
+    "spool_fsync": "publish",
+    "spool_rename": "publish",
+    "filename_lookup_save": "db",
+    "publish": "publish",
+}
+
+
+class RequestTimings:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.seconds: Dict[str, float] = dict.fromkeys(TIMING_GROUPS, 0.0)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        group: Optional[str] = STAGE_GROUPS.get(stage)
+        if group is None:
+            return
+        with self._lock:
+            self.seconds[group] += seconds
+
+    def milliseconds(self) -> Dict[str, float]:
+        with self._lock:
+            timings = {group: seconds * 1000 for group, seconds in self.seconds.items()}
+        timings["total"] = (time.perf_counter() - self.started) * 1000
+        return timings
+
+
+def server_timing(milliseconds: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in milliseconds.items())
+
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """
+    Adds a stage's duration to the timings of the current request, if there is one.
+    """
+    timings: Optional[RequestTimings] = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def init_request_timing(app: Flask, path_prefix: str = "/dhos/") -> None:
+    @app.before_request
+    def start_request_timing() -> None:
+        timings: Optional[RequestTimings] = None
+        if request.path.startswith(path_prefix):
+            timings = RequestTimings()
+        _request_timings.set(timings)
+
+    @app.after_request
+    def add_server_timing(response: Response) -> Response:
+        timings: Optional[RequestTimings] = _request_timings.get()
+        if timings is None:
+            return response
+        _request_timings.set(None)
+        milliseconds: Dict[str, float] = timings.milliseconds()
+        response.headers["Server-Timing"] = server_timing(milliseconds)
+        logger.info(
+            "%s %s responded %d in %.1fms",
+            request.method,
+            request.path,
+            response.status_code,
+            milliseconds["total"],
+            extra={
+                "request_id": request_headers()["X-Request-ID"],
+                "timings_ms": {name: round(ms, 1) for name, ms in milliseconds.items()},
+            },
+        )
+        return response
@@ -0,0 +1,238 @@
+"""
+Load test of a running PDF API, driving a weighted mix of traffic at all eight routes
+and reporting the throughput and the p50, p95 and p99 latency of each.
+
+Start the stubs (see loadtest.stubs) and the PDF API pointing at them, then from the
+integration-tests folder, with the same environment variables as the behave tests:
+
+    python -m loadtest.run --concurrency 8 --duration 60 --output results.json
+
+The mix is given as route=weight pairs, e.g. --mix post_gdm_pdf=1 get_gdm_pdf=5.
+Before the timed run, one document of each kind is created so that the GET routes
+have something to fetch; documents created during the run are fetched too.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from clients import dhos_pdf_client
+from helpers.dbm_patient_helper import generate_dbm_patient
+from helpers.gdm_patient_helper import generate_gdm_patient
+from helpers.jwt_helper import get_system_token
+from helpers.send_patient_helper import generate_send_patient
+from helpers.ward_report_helper import generate_ward_report
+from requests import RequestException, Response
+
+DEFAULT_MIX: Dict[str, float] = {
+    "post_gdm_pdf": 2,
+    "get_gdm_pdf": 4,
+    "post_dbm_pdf": 1,
+    "get_dbm_pdf": 2,
+    "post_send_pdf": 4,
+    "get_send_pdf": 4,
+    "post_ward_report": 0.5,
+    "get_ward_report": 2,
+}
+
+
+class Documents:
+    """
+    Ids of the documents created so far, by kind, for the GET routes to fetch.
+    """
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, List[str]] = {"gdm": [], "dbm": [], "send": [], "ward": []}
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, document_id: str) -> None:
+        with self._lock:
+            self._ids[kind].append(document_id)
+
+    def choose(self, kind: str) -> str:
+        with self._lock:
+            return random.choice(self._ids[kind])
+
+
+def _routes(
+    documents: Documents, ward_days: int
+) -> Dict[str, Callable[[str], Response]]:
+    def post(
+        kind: str, generate: Callable[[], Dict], get_id: Callable[[Dict], str]
+    ) -> Callable[[str], Response]:
+        send: Callable[..., Response] = {
+            "gdm": dhos_pdf_client.post_gdm_pdf_request,
+            "dbm": dhos_pdf_client.post_dbm_pdf_request,
+            "send": dhos_pdf_client.post_send_pdf_request,
+        }[kind]
+
+        def run(jwt: str) -> Response:
+            data = generate()
+            response = send(patient_data=data, jwt=jwt)
+            if response.ok:
+                documents.add(kind, get_id(data))
+            return response
+
+        return run
+
+    def post_ward_report(jwt: str) -> Response:
+        data = generate_ward_report(days=ward_days)
+        response = dhos_pdf_client.post_ward_report_request(metrics_data=data, jwt=jwt)
+        if response.ok:
+            documents.add("ward", data["location_uuid"])
+        return response
+
+    return {
+        "post_gdm_pdf": post(
+            "gdm", generate_gdm_patient, lambda data: data["patient"]["uuid"]
+        ),
+        "get_gdm_pdf": lambda jwt: dhos_pdf_client.get_gdm_patient_pdf(
+            patient_uuid=documents.choose("gdm"), jwt=jwt
+        ),
+        "post_dbm_pdf": post(
+            "dbm", generate_dbm_patient, lambda data: data["patient"]["uuid"]
+        ),
+        "get_dbm_pdf": lambda jwt: dhos_pdf_client.get_dbm_patient_pdf(
+            patient_uuid=documents.choose("dbm"), jwt=jwt
+        ),
+        "post_send_pdf": post(
+            "send", generate_send_patient, lambda data: data["encounter"]["uuid"]
+        ),
+        "get_send_pdf": lambda jwt: dhos_pdf_client.get_send_patient_pdf(
+            encounter_uuid=documents.choose("send"), jwt=jwt
+        ),
+        "post_ward_report": post_ward_report,
+        "get_ward_report": lambda jwt: dhos_pdf_client.get_ward_report_pdf(
+            location_uuid=documents.choose("ward"), jwt=jwt
+        ),
+    }
+
+
+# Route, seconds taken and HTTP status, or 0 if the request failed.
+Sample = Tuple[str, float, int]
+
+
+def _call(route: str, run: Callable[[str], Response], jwt: str) -> Sample:
+    start = time.perf_counter()
+    try:
+        status = run(jwt).status_code
+    except RequestException:
+        status = 0
+    return route, time.perf_counter() - start, status
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Nearest-rank percentile of values, which must be sorted.
+    """
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def summarise(samples: List[Sample], seconds: float) -> Dict[str, Dict]:
+    by_route: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        by_route.setdefault(sample[0], []).append(sample)
+    summary: Dict[str, Dict] = {}
+    for route, route_samples in sorted(by_route.items()):
+        latencies = sorted(latency for _, latency, _ in route_samples)
+        summary[route] = {
+            "requests": len(route_samples),
+            "errors": sum(
+                1 for _, _, status in route_samples if not 200 <= status < 300
+            ),
+            "throughput_per_second": len(route_samples) / seconds,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    return summary
+
+
+def run_load(
+    mix: Dict[str, float], concurrency: int, duration: float, ward_days: int
+) -> Tuple[List[Sample], float]:
+    jwt: str = get_system_token()
+    documents = Documents()
+    routes = _routes(documents, ward_days)
+    for route in ("post_gdm_pdf", "post_dbm_pdf", "post_send_pdf", "post_ward_report"):
+        routes[route](jwt).raise_for_status()
+
+    names: List[str] = [name for name in mix if mix[name] > 0]
+    weights: List[float] = [mix[name] for name in names]
+    samples: List[Sample] = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def worker() -> None:
+        while time.perf_counter() < deadline:
+            route = random.choices(names, weights)[0]
+            sample = _call(route, routes[route], jwt)
+            with lock:
+                samples.append(sample)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def _parse_mix(pairs: Optional[List[str]]) -> Dict[str, float]:
+    if not pairs:
+        return DEFAULT_MIX
+    mix: Dict[str, float] = {}
+    for pair in pairs:
+        route, weight = pair.split("=")
+        if route not in DEFAULT_MIX:
+            raise SystemExit(
+                f"Unknown route '{route}', expected one of {list(DEFAULT_MIX)}"
+            )
+        mix[route] = float(weight)
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60, help="Seconds")
+    parser.add_argument("--mix", nargs="+", help="route=weight pairs")
+    parser.add_argument("--ward-days", type=int, default=30)
+    parser.add_argument("--output", help="Save the summary as JSON")
+    args = parser.parse_args()
+
+    samples, seconds = run_load(
+        _parse_mix(args.mix), args.concurrency, args.duration, args.ward_days
+    )
+    summary = summarise(samples, seconds)
+    print(
+        f"{'route':<18} {'requests':>8} {'errors':>6} {'req/s':>7} {'p50 ms':>8}"
+        f" {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for route, result in summary.items():
+        print(
+            f"{route:<18} {result['requests']:>8} {result['errors']:>6}"
+            f" {result['throughput_per_second']:>7.2f} {result['p50_ms']:>8.0f}"
+            f" {result['p95_ms']:>8.0f} {result['p99_ms']:>8.0f}"
+        )
+    print(f"{len(samples)} requests in {seconds:.1f}s, {len(samples) / seconds:.2f}/s")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(
+                {
+                    "concurrency": args.concurrency,
+                    "duration_seconds": seconds,
+                    "throughput_per_second": len(samples) / seconds,
+                    "routes": summary,
+                },
+                output,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Local stand-ins for the PDF engine and the trustomer API, for load testing the PDF API
+on a laptop. Each responds after a configurable latency with a payload of a
+configurable size:
+
+    python -m loadtest.stubs --engine-port 3000 --engine-latency-ms 800 \\
+        --engine-pdf-kb 300 --trustomer-port 8081 --trustomer-latency-ms 50
+
+then run the PDF API with DHOS_PDF_ENGINE_URL=http://localhost:3000 and
+DHOS_TRUSTOMER_API_HOST=http://localhost:8081. The trustomer config is read from
+MOCK_TRUSTOMER_CONFIG, as for wiremock, if it is set.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Type
+
+DEFAULT_TRUSTOMER_CONFIG: Dict = {"gdm_config": {}, "send_config": {}}
+
+
+class StubConfig:
+    def __init__(self, latency_ms: float, jitter_ms: float, body: bytes) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.body = body
+
+    def wait(self) -> None:
+        latency_ms = self.latency_ms + random.uniform(0, self.jitter_ms)
+        time.sleep(latency_ms / 1000)
+
+
+def make_pdf(size_kb: int) -> bytes:
+    """
+    Returns a placeholder PDF padded to roughly the given size.
+    """
+    header = b"%PDF-1.4\n"
+    footer = b"\n%%EOF\n"
+    padding = max(size_kb * 1024 - len(header) - len(footer), 0)
+    return header + b"%" + b"0" * padding + footer
+
+
+def make_trustomer_config(size_kb: int) -> bytes:
+    """
+    Returns the trustomer config as JSON, padded to at least the given size.
+    """
+    config: Dict = json.loads(
+        os.environ.get("MOCK_TRUSTOMER_CONFIG", json.dumps(DEFAULT_TRUSTOMER_CONFIG))
+    )
+    body = json.dumps(config)
+    if len(body) < size_kb * 1024:
+        config["padding"] = "0" * (size_kb * 1024 - len(body))
+    return json.dumps(config).encode("utf-8")
+
+
+def _handler(
+    config: StubConfig, method: str, path_prefix: str, content_type: str
+) -> Type[BaseHTTPRequestHandler]:
+    class StubHandler(BaseHTTPRequestHandler):
+        def _respond(self) -> None:
+            if not self.path.startswith(path_prefix):
+                self.send_error(404)
+                return
+            config.wait()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(config.body)))
+            self.end_headers()
+            self.wfile.write(config.body)
+
+        def do_GET(self) -> None:
+            if self.path == "/running":
+                self.send_response(200)
+                self.end_headers()
+            elif method == "GET":
+                self._respond()
+            else:
+                self.send_error(405)
+
+        def do_POST(self) -> None:
+            # Read the request so the client isn't left writing to a closed socket.
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if method == "POST":
+                self._respond()
+            else:
+                self.send_error(405)
+
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+    return StubHandler
+
+
+def start_stub(
+    port: int, config: StubConfig, method: str, path_prefix: str, content_type: str
+) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(
+        ("0.0.0.0", port), _handler(config, method, path_prefix, content_type)
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_engine_stub(port: int, config: StubConfig) -> ThreadingHTTPServer:
+    return start_stub(port, config, "POST", "/dhos/v1/", "application/pdf")
+
+
+def start_trustomer_stub(port: int, config: StubConfig) -> ThreadingHTTPServer:
+    return start_stub(port, config, "GET", "/dhos/v1/trustomer/", "application/json")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--engine-port", type=int, default=3000)
+    parser.add_argument("--engine-latency-ms", type=float, default=500)
+    parser.add_argument("--engine-jitter-ms", type=float, default=100)
+    parser.add_argument("--engine-pdf-kb", type=int, default=200)
+    parser.add_argument("--trustomer-port", type=int, default=8081)
+    parser.add_argument("--trustomer-latency-ms", type=float, default=50)
+    parser.add_argument("--trustomer-jitter-ms", type=float, default=10)
+    parser.add_argument("--trustomer-config-kb", type=int, default=4)
+    args = parser.parse_args()
+
+    servers: List[ThreadingHTTPServer] = [
+        start_engine_stub(
+            args.engine_port,
+            StubConfig(
+                args.engine_latency_ms,
+                args.engine_jitter_ms,
+                make_pdf(args.engine_pdf_kb),
+            ),
+        ),
+        start_trustomer_stub(
+            args.trustomer_port,
+            StubConfig(
+                args.trustomer_latency_ms,
+                args.trustomer_jitter_ms,
+                make_trustomer_config(args.trustomer_config_kb),
+            ),
+        ),
+    ]
+    print(
+        f"PDF engine stub on port {args.engine_port}, trustomer stub on port"
+        f" {args.trustomer_port}. Ctrl-C to stop."
+    )
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""ward report index
+
+Revision ID: c4e1f0a9b2d3
+Revises: 7b19ac1c5b8e
+Create Date: 2026-10-19 14:10:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c4e1f0a9b2d3"
+down_revision = "7b19ac1c5b8e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ward_report",
+        sa.Column("uuid", sa.String(length=36), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("created_by_", sa.String(), nullable=False),
+        sa.Column("modified", sa.DateTime(), nullable=False),
+        sa.Column("modified_by_", sa.String(), nullable=False),
+        sa.Column("location_uuid", sa.String(), nullable=False),
+        sa.Column("report_year", sa.Integer(), nullable=False),
+        sa.Column("report_month", sa.Integer(), nullable=False),
+        sa.Column("file_name", sa.String(), nullable=False),
+        sa.Column("size_bytes", sa.Integer(), nullable=False),
+        sa.Column("sha256", sa.String(), nullable=False),
+        sa.Column("generated", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("uuid"),
+        sa.UniqueConstraint("location_uuid", "report_year", "report_month"),
+    )
+    op.create_index(
+        op.f("ix_ward_report_location_uuid"),
+        "ward_report",
+        ["location_uuid"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_ward_report_location_uuid"), table_name="ward_report")
+    op.drop_table("ward_report")
@@ -14,7 +14,7 @@ export AUTH0_DOMAIN=https://login-sandbox.sensynehealth.com/
 export AUTH0_AUDIENCE=https://dev.sensynehealth.com/
 export AUTH0_METADATA=https://gdm.sensynehealth.com/metadata
 export AUTH0_JWKS_URL=https://login-sandbox.sensynehealth.com/.well-known/jwks.json
-export DHOS_PDF_ENGINE_URL=http://localhost:3000
+export DHOS_PDF_ENGINE_URL=${DHOS_PDF_ENGINE_URL:-http://localhost:3000}
 export GDM_BCP_OUTPUT_DIR=gdm-bcp-output
 export DBM_BCP_OUTPUT_DIR=dbm-bcp-output
 export SEND_BCP_OUTPUT_DIR=send-bcp-output
@@ -27,7 +27,7 @@ export HS_KEY=secret
 export REDIS_INSTALLED=False
 export IGNORE_JWT_VALIDATION=true
 export RABBITMQ_DISABLED=true
-export DHOS_TRUSTOMER_API_HOST=http://dhos-trustomer
+export DHOS_TRUSTOMER_API_HOST=${DHOS_TRUSTOMER_API_HOST:-http://dhos-trustomer}
 export CUSTOMER_CODE=dev
 export POLARIS_API_KEY=secret
 export LOG_LEVEL=${LOG_LEVEL:-DEBUG}
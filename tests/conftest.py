@@ -9,7 +9,6 @@ import kombu_batteries_included
 import pytest
 from _pytest.monkeypatch import MonkeyPatch
 from flask import Flask
-from lxml import etree
 from mock import Mock
 from pytest_mock import MockFixture
 from she_logging.request_id import reset_request_id, set_request_id
@@ -24,15 +23,6 @@ def app(pdf_output_path: str) -> Flask:
 
     current_app = create_app(testing=True, use_pgsql=False, use_sqlite=True)
     current_app.config["SEND_WARD_REPORT_OUTPUT_DIR"] = str(pdf_output_path)
-
-    root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    xsd = os.path.join(
-        root_path, "dhos_pdf_api", "schema", "infrastructure", "cda", "CDA_SDTC.xsd"
-    )
-    with open(xsd, "r") as f:
-        schema_doc = etree.parse(f)
-        schema = etree.XMLSchema(schema_doc)
-        current_app.config["CDA_XML_SCHEMA_PARSER"] = etree.XMLParser(schema=schema)
     return current_app
 
 
@@ -0,0 +1,42 @@
+from typing import Dict
+
+import dicttoxml
+
+from dhos_pdf_api.blueprint_api import controller
+
+
+def dicttoxml_pdf_metadata_xml(data: Dict) -> bytes:
+    """The dicttoxml implementation that create_pdf_metadata_xml replaced."""
+    encounter: Dict = data["encounter"]
+    patient: Dict = data["patient"]
+    full_data: Dict = {
+        "Docinfo": {
+            "ExternalReferenceNumber": data["encounter_id"],
+            "Documentfilename": data["pdf_filename"],
+            "DocumentTypeCode": "01",
+            "DocumentCreatedDateTime": controller.xml_datetime_convert(
+                controller.get_iso_format_time_now()
+            ),
+            "DocumentAuthor": "SEND",
+        },
+        "PatientInfo": {
+            "PatientEpisodeId": data["encounter_id"],
+            "PatientForename": patient.get("first_name"),
+            "PatientSurname": patient.get("last_name"),
+            "PatientDOB": controller.xml_opt_datetime_convert(patient.get("dob")),
+            "PatientNHSNumber": patient.get("nhs_number"),
+            "PatientURNumber": patient.get("hospital_number"),
+            "PatientGender": "Female",
+            "PatientAdmissionDateTime": controller.xml_opt_datetime_convert(
+                encounter.get("admitted_at")
+            ),
+            "PatientDischargeDateTime": controller.xml_opt_datetime_convert(
+                encounter.get("discharged_at")
+            ),
+            "SpecialtyCode": "",
+            "SpecialtyName": "",
+        },
+        "GPPractice": {"PracticeName": "", "GpName": "", "PracticeNacsCode": ""},
+    }
+    xml: bytes = dicttoxml.dicttoxml(full_data, attr_type=False, root=False)
+    return b'<xml version="1.0" encoding="UTF-8" >' + xml + b"</xml>"
@@ -0,0 +1,48 @@
+import io
+from typing import List
+
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+
+def sample_pdf(labels: List[str]) -> bytes:
+    """
+    Returns a PDF with a page for each label, showing the label.
+    """
+    output = io.BytesIO()
+    with PdfPages(output) as pdf:
+        for label in labels:
+            figure = Figure(figsize=(8.27, 11.69))
+            figure.text(0.5, 0.5, label)
+            pdf.savefig(figure)
+    return output.getvalue()
+
+
+def handwritten_pdf(contents: List[bytes]) -> bytes:
+    """
+    Returns a one page PDF whose page inherits its MediaBox and Resources from the
+    page tree, and whose content is split across several streams.
+    """
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 /MediaBox [0 0 200 100]"
+        b" /Resources << /Font << /F1 4 0 R >> >> >>",
+        b"<< /Type /Page /Parent 2 0 R /Contents [%s] >>"
+        % b" ".join(b"%d 0 R" % (5 + i) for i in range(len(contents))),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>",
+    ]
+    objects.extend(
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+        for content in contents
+    )
+    pdf = b"%PDF-1.4\n"
+    offsets: List[int] = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\n" % (len(objects) + 1)
+    pdf += b"startxref\n%d\n%%%%EOF\n" % xref
+    return pdf
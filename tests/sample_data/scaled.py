@@ -0,0 +1,94 @@
+import copy
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+PRANDIAL_TAGS: List[Any] = [
+    {"description": "Before breakfast"},
+    {"description": "After lunch"},
+    {"description": None},
+    {},
+    None,
+]
+COMMENTS: List[Any] = ["Felt dizzy", "Ate <cake> & biscuits", "", None]
+
+
+def scale_patient_pdf_data(data: Dict, readings: int) -> Dict:
+    """
+    Returns a copy of a GDM or DBM request with the given number of blood glucose
+    readings, covering the variations the readings table has to handle.
+    """
+    scaled = copy.deepcopy(data)
+    medication_ids = list(scaled["medications"])
+    start = datetime(2021, 1, 1, 7, 30)
+    scaled["blood_glucose_readings"] = [
+        _reading(i, start + timedelta(hours=4 * i), medication_ids)
+        for i in range(readings)
+    ]
+    return scaled
+
+
+def _reading(i: int, measured: datetime, medication_ids: List[str]) -> Dict:
+    reading: Dict[str, Any] = {
+        "measured_timestamp": measured.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "blood_glucose_value": round(4 + (i % 70) / 10, 1),
+        "units": "mmol/L",
+        "doses": [
+            {"amount": 1 + i % 4, "medication_id": medication_ids[i % 5]},
+            {"amount": 2.5, "medication_id": "unknown"},
+        ][: i % 3],
+    }
+    if i % 7:
+        reading["prandial_tag"] = PRANDIAL_TAGS[i % len(PRANDIAL_TAGS)]
+    if i % 5 == 0:
+        reading["alert"] = {"dismissed": i % 10 == 0}
+    if i % 11:
+        reading["comment"] = COMMENTS[i % len(COMMENTS)]
+    return reading
+
+
+def scale_send_data(data: Dict, observation_sets: int) -> Dict:
+    """
+    Returns a copy of a SEND request with the given number of observation sets, made
+    by repeating the sample's observation sets an hour apart.
+    """
+    scaled = copy.deepcopy(data)
+    samples: List[Dict] = data["observation_sets"]
+    start = datetime(2019, 1, 1)
+    scaled["observation_sets"] = []
+    for i in range(observation_sets):
+        obs_set = copy.deepcopy(samples[i % len(samples)])
+        timestamp = (start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        obs_set["uuid"] = f"obs-set-{i}"
+        obs_set["record_time"] = timestamp
+        for j, observation in enumerate(obs_set.get("observations", [])):
+            observation["uuid"] = f"obs-{i}-{j}"
+            observation["measured_time"] = timestamp
+        scaled["observation_sets"].append(obs_set)
+    return scaled
+
+
+def scale_ward_metrics(data: Dict, days: int) -> Dict:
+    """
+    Returns a copy of a ward report request with every metric in the sample reported
+    daily for the given number of days.
+    """
+    scaled = copy.deepcopy(data)
+    metric_values: Dict[str, List[int]] = {}
+    for metric in data["pdf_data"]:
+        metric_values.setdefault(metric["metric_name"], []).append(
+            int(metric["metric_value"])
+        )
+    start = datetime(2019, 1, 1)
+    scaled["pdf_data"] = [
+        {
+            "metric_name": name,
+            "metric_date": (start + timedelta(days=day)).strftime("%Y-%m-%d"),
+            "metric_value": values[day % len(values)] + day % 17,
+            "measurement_timestamp": (start + timedelta(days=day)).strftime(
+                "%Y-%m-%dT%H:%M:%S.000"
+            ),
+        }
+        for day in range(days)
+        for name, values in metric_values.items()
+    ]
+    return scaled
@@ -0,0 +1,122 @@
+import threading
+from typing import List, Optional
+
+import pytest
+from flask import Flask
+from mock import Mock
+from prometheus_client import REGISTRY
+from pytest_mock import MockFixture
+from werkzeug import Client
+
+from dhos_pdf_api.blueprint_api import admission, controller
+from dhos_pdf_api.blueprint_api.admission import AdmissionLimiter, AdmissionRejected
+
+
+def _rejections(route_class: str) -> float:
+    value: Optional[float] = REGISTRY.get_sample_value(
+        "dhos_pdf_admission_rejections_total", {"route_class": route_class}
+    )
+    return value or 0.0
+
+
+class TestAdmissionLimiter:
+    def test_waiting_request_is_admitted_when_a_slot_frees(self) -> None:
+        limiter = AdmissionLimiter(
+            "render", max_concurrent=1, max_waiting=1, max_wait_seconds=5
+        )
+        admitted: List[str] = []
+
+        def second() -> None:
+            with limiter.admit():
+                admitted.append("second")
+
+        with limiter.admit():
+            thread = threading.Thread(target=second)
+            thread.start()
+            while limiter.waiting == 0:
+                pass
+            admitted.append("first")
+        thread.join(5)
+
+        assert admitted == ["first", "second"]
+        assert limiter.running == 0
+        assert limiter.waiting == 0
+
+    def test_rejects_when_queue_is_full(self) -> None:
+        limiter = AdmissionLimiter(
+            "engine", max_concurrent=1, max_waiting=0, max_wait_seconds=5
+        )
+        before = _rejections("engine")
+        with limiter.admit():
+            with pytest.raises(AdmissionRejected) as error:
+                with limiter.admit():
+                    pass
+        assert "wait queue is full" in str(error.value)
+        assert error.value.retry_after >= 1
+        assert _rejections("engine") == before + 1
+        assert limiter.running == 0
+
+    def test_rejects_after_max_wait(self) -> None:
+        limiter = AdmissionLimiter(
+            "render", max_concurrent=1, max_waiting=1, max_wait_seconds=0.05
+        )
+        with limiter.admit():
+            with pytest.raises(AdmissionRejected):
+                with limiter.admit():
+                    pass
+        assert limiter.waiting == 0
+
+    def test_retry_after_grows_with_backlog(self) -> None:
+        limiter = AdmissionLimiter(
+            "render", max_concurrent=2, max_waiting=2, max_wait_seconds=5
+        )
+        limiter.average_seconds = 3.0
+        limiter.running = 2
+        assert limiter.retry_after() == 3
+        limiter.waiting = 2
+        assert limiter.retry_after() == 6
+
+
+@pytest.mark.usefixtures("mock_bearer_validation")
+class TestAdmissionApi:
+    @pytest.mark.parametrize("status", [503, 429])
+    def test_rejected_download(
+        self, app: Flask, client: Client, mocker: MockFixture, status: int
+    ) -> None:
+        app.config["ADMISSION_DOWNLOAD_CONCURRENCY"] = 1
+        app.config["ADMISSION_DOWNLOAD_QUEUE_SIZE"] = 0
+        app.config["ADMISSION_REJECT_STATUS"] = status
+        admission.init_admission(app)
+        mock_get: Mock = mocker.patch.object(controller, "get_patient_pdf")
+        limiter = admission.get_limiter("download")
+        assert limiter is not None
+
+        with limiter.admit():
+            response = client.get(
+                "/dhos/v1/gdm_pdf/some-uuid",
+                headers={"Authorization": "Bearer TOKEN"},
+            )
+
+        assert response.status_code == status
+        assert int(response.headers["Retry-After"]) >= 1
+        assert response.json is not None
+        assert "Too many download requests" in response.json["message"]
+        mock_get.assert_not_called()
+
+    def test_other_route_classes_are_not_limited(
+        self, app: Flask, client: Client, mocker: MockFixture
+    ) -> None:
+        app.config["ADMISSION_RENDER_CONCURRENCY"] = 1
+        admission.init_admission(app)
+        mocker.patch.object(controller, "get_patient_pdf", return_value=b"%PDF-1.4")
+        limiter = admission.get_limiter("render")
+        assert limiter is not None
+        assert admission.get_limiter("download") is None
+
+        with limiter.admit():
+            response = client.get(
+                "/dhos/v1/gdm_pdf/some-uuid",
+                headers={"Authorization": "Bearer TOKEN"},
+            )
+
+        assert response.status_code == 200
@@ -30,6 +30,17 @@ class TestApi:
         assert response.status_code == 201
         mock_create.assert_called_with(data=sample_gdm_data_handled, product_name="gdm")
 
+    def test_create_gdm_patient_pdf_retried_in_background(
+        self, client: Client, mocker: MockFixture, sample_gdm_data: Dict
+    ) -> None:
+        mocker.patch.object(controller, "create_patient_pdf", return_value=False)
+        response = client.post(
+            "/dhos/v1/gdm_pdf",
+            json=sample_gdm_data,
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 202
+
     def test_create_gdm_patient_pdf_no_nhs_number(
         self,
         client: Client,
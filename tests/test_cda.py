@@ -1,13 +1,16 @@
 import copy
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, Optional
 
 import pytest
+from _pytest.monkeypatch import MonkeyPatch
 from flask import Flask
 from mock import Mock
 from pytest_mock import MockFixture
 from requests_mock import Mocker
 
 import dhos_pdf_api.blueprint_api.hl7_cda
+import dhos_pdf_api.config
 
 
 @pytest.mark.freeze_time("2019-01-26T10:01:10.000Z")
@@ -15,7 +18,7 @@ import dhos_pdf_api.blueprint_api.hl7_cda
 def test_create_cda_xml(
     sample_send_data: Dict, date_of_birth: Optional[str], app: Flask
 ) -> None:
-    parser = app.config["CDA_XML_SCHEMA_PARSER"]
+    parser = dhos_pdf_api.blueprint_api.hl7_cda.get_cda_parser()
     if date_of_birth is None:
         date_of_birth = ""
         expected_dob = ""
@@ -131,3 +134,142 @@ def test_pdf_generation_publishes_cda(
         assert mock_publish_msg.call_args[1]["body"]["content"].startswith(
             "<?xml version='1.0'"
         )
+
+
+def test_cda_schema_compiled_once(mocker: MockFixture) -> None:
+    hl7_cda = dhos_pdf_api.blueprint_api.hl7_cda
+    mocker.patch.object(hl7_cda, "_schema", None)
+    spy = mocker.spy(hl7_cda.etree, "XMLSchema")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        schemas = list(executor.map(lambda _: hl7_cda.get_cda_schema(), range(8)))
+
+    assert spy.call_count == 1
+    assert all(schema is schemas[0] for schema in schemas)
+    assert hl7_cda.CDA_SCHEMA_COMPILE_SECONDS._value.get() > 0
+
+
+def test_cda_parser_is_per_thread() -> None:
+    hl7_cda = dhos_pdf_api.blueprint_api.hl7_cda
+    main_parser = hl7_cda.get_cda_parser()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        other_parser = executor.submit(hl7_cda.get_cda_parser).result()
+
+    assert hl7_cda.get_cda_parser() is main_parser
+    assert other_parser is not main_parser
+
+
+def test_app_without_cda_does_not_compile_schema(
+    mocker: MockFixture, monkeypatch: MonkeyPatch
+) -> None:
+    from dhos_pdf_api.app import create_app
+
+    monkeypatch.delenv("SEND_BCP_CDA_UNC_PATH", raising=False)
+    mocker.patch.object(
+        dhos_pdf_api.config.Configuration, "SEND_BCP_CDA_UNC_PATH", None
+    )
+    mock_warm_up = mocker.patch("dhos_pdf_api.app.start_schema_warm_up")
+
+    create_app(testing=True, use_pgsql=False, use_sqlite=True)
+
+    assert mock_warm_up.call_count == 0
+
+
+@pytest.mark.freeze_time("2019-01-26T10:01:10.000Z")
+@pytest.mark.parametrize("date_of_birth", ["1985-07-01", None])
+@pytest.mark.parametrize("with_obs_sets", [True, False])
+@pytest.mark.parametrize(
+    ["first_name", "last_name", "display_name"],
+    [
+        ('Mich<e>le & "Co"', "Smith", "Birch & Elm <Hospital>"),
+        ("", "Smith", "Birch Hospital"),
+        ("Michele", "", ""),
+    ],
+)
+def test_create_cda_xml_from_skeleton_matches_element_tree(
+    sample_send_data: Dict,
+    date_of_birth: Optional[str],
+    with_obs_sets: bool,
+    first_name: str,
+    last_name: str,
+    display_name: str,
+) -> None:
+    hl7_cda = dhos_pdf_api.blueprint_api.hl7_cda
+    parser = hl7_cda.get_cda_parser()
+    xml_data = copy.deepcopy(sample_send_data)
+    xml_data["patient"]["dob"] = date_of_birth
+    xml_data["patient"]["first_name"] = first_name
+    xml_data["patient"]["last_name"] = last_name
+    xml_data["location"]["display_name"] = display_name
+    if not with_obs_sets:
+        xml_data["observation_sets"] = []
+        xml_data["encounter"]["created_by"] = {
+            "uuid": "abc",
+            "first_name": "Jane",
+            "last_name": None,
+        }
+
+    expected = hl7_cda.create_hl7_cda_xml(
+        xml_data, "//server/share/folder", "2018L73782250.pdf", parser
+    )
+    actual = hl7_cda.create_hl7_cda_xml_from_skeleton(
+        xml_data, "//server/share/folder", "2018L73782250.pdf", parser
+    )
+
+    assert actual == expected
+    # Valid against the CDA schema in its own right.
+    hl7_cda.etree.fromstring(actual, parser)
+
+
+@pytest.mark.parametrize(["sample_rate", "validate_count"], [(0, 0), (1, 1)])
+def test_create_cda_xml_from_skeleton_sampled_validation(
+    mocker: MockFixture,
+    sample_send_data: Dict,
+    sample_rate: float,
+    validate_count: int,
+) -> None:
+    hl7_cda = dhos_pdf_api.blueprint_api.hl7_cda
+    mock_validate = mocker.patch.object(hl7_cda, "_validate_xml")
+    hl7_cda.create_hl7_cda_xml_from_skeleton(
+        sample_send_data,
+        "//server/share/folder",
+        "2018L73782250.pdf",
+        hl7_cda.get_cda_parser(),
+        validation_sample_rate=sample_rate,
+    )
+    assert mock_validate.call_count == validate_count
+
+
+@pytest.mark.usefixtures("mock_trustomer_config")
+def test_pdf_generation_publishes_skeleton_cda(
+    mocker: MockFixture,
+    mock_publish_msg: Mock,
+    app: Flask,
+    sample_send_data: Dict,
+    requests_mock: Mocker,
+) -> None:
+    hl7_cda = dhos_pdf_api.blueprint_api.hl7_cda
+    mocker.patch.dict(
+        app.config,
+        {"SEND_BCP_CDA_UNC_PATH": "//srv/shr/fldr", "CDA_GENERATION_MODE": "skeleton"},
+    )
+    spy_skeleton = mocker.spy(
+        dhos_pdf_api.blueprint_api.controller, "create_hl7_cda_xml_from_skeleton"
+    )
+    mocker.patch.object(dhos_pdf_api.blueprint_api.controller, "write_file")
+    requests_mock.post(
+        f"http://localhost:3000/dhos/v1/send_pdf",
+        headers={"Content-Type": "application/pdf"},
+        content=b"something",
+        status_code=200,
+    )
+
+    dhos_pdf_api.blueprint_api.controller.create_send_documents(
+        copy.deepcopy(sample_send_data)
+    )
+
+    assert spy_skeleton.call_count == 1
+    assert mock_publish_msg.call_count == 1
+    content = mock_publish_msg.call_args[1]["body"]["content"]
+    assert content.startswith("<?xml version='1.0'")
+    hl7_cda.etree.fromstring(content.encode("utf8"), hl7_cda.get_cda_parser())
@@ -0,0 +1,248 @@
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, List, Optional
+
+import kombu_batteries_included
+import pytest
+from flask import Flask
+from flask_batteries_included.helpers.error_handler import ServiceUnavailableException
+from kombu import Connection, Exchange, Queue
+from kombu_batteries_included import infra
+from prometheus_client import REGISTRY
+from pytest_mock import MockFixture
+
+from dhos_pdf_api.blueprint_api import cda_publisher, controller
+from dhos_pdf_api.blueprint_api.cda_publisher import BatchPublisher, InMemoryTransport
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.01)
+
+
+def spooled(spool_dir: Path) -> List[Path]:
+    return sorted(spool_dir.glob("*.json"))
+
+
+def stage_count(stage: str) -> float:
+    value: Optional[float] = REGISTRY.get_sample_value(
+        "dhos_pdf_stage_seconds_count", {"product": "send", "stage": stage}
+    )
+    return value or 0.0
+
+
+class TestBatchPublisher:
+    @pytest.fixture
+    def spool_dir(self, tmp_path: Path) -> Path:
+        return tmp_path / "spool"
+
+    @pytest.fixture
+    def transport(self) -> InMemoryTransport:
+        return InMemoryTransport()
+
+    @pytest.fixture
+    def publisher(
+        self, spool_dir: Path, transport: InMemoryTransport
+    ) -> Generator[BatchPublisher, None, None]:
+        publisher = BatchPublisher(
+            spool_dir=spool_dir,
+            transport=transport,
+            batch_size=3,
+            flush_interval=0.01,
+            max_retries=2,
+            retry_delay=0.01,
+        )
+        yield publisher
+        publisher.stop(timeout=5)
+
+    def test_publishes_in_batches(
+        self, publisher: BatchPublisher, transport: InMemoryTransport, spool_dir: Path
+    ) -> None:
+        for index in range(7):
+            publisher._queue.put((spool_dir / f"{index}.json", {"index": index}))
+        publisher.start()
+        publisher.stop(timeout=5)
+
+        published = [m["index"] for batch in transport.batches for m in batch]
+        assert published == list(range(7))
+        assert all(len(batch) <= 3 for batch in transport.batches)
+
+    def test_submit_removes_spooled_message_once_published(
+        self, publisher: BatchPublisher, transport: InMemoryTransport, spool_dir: Path
+    ) -> None:
+        publisher.start()
+        publisher.submit(routing_key="dhos.423779001", body={"content": "<xml/>"})
+
+        wait_for(lambda: len(transport.batches) == 1)
+        message = transport.batches[0][0]
+        assert message["routing_key"] == "dhos.423779001"
+        assert message["body"] == {"content": "<xml/>"}
+        wait_for(lambda: spooled(spool_dir) == [])
+
+    def test_retries_failed_batches(
+        self, publisher: BatchPublisher, transport: InMemoryTransport, spool_dir: Path
+    ) -> None:
+        transport.fail_next = 2
+        publisher.start()
+        publisher.submit(routing_key="dhos.423779001", body={"content": "<xml/>"})
+
+        wait_for(lambda: len(transport.batches) == 1)
+        wait_for(lambda: spooled(spool_dir) == [])
+
+    def test_failed_batches_stay_in_spool(
+        self, publisher: BatchPublisher, transport: InMemoryTransport, spool_dir: Path
+    ) -> None:
+        transport.fail_next = 100
+        publisher.start()
+        publisher.submit(routing_key="dhos.423779001", body={"content": "<xml/>"})
+        publisher.stop(timeout=5)
+
+        assert transport.batches == []
+        assert len(spooled(spool_dir)) == 1
+
+    def test_stop_does_not_wait_to_retry(
+        self, spool_dir: Path, transport: InMemoryTransport
+    ) -> None:
+        transport.fail_next = 100
+        publisher = BatchPublisher(
+            spool_dir=spool_dir,
+            transport=transport,
+            flush_interval=0.01,
+            max_retries=5,
+            retry_delay=60,
+        )
+        publisher.start()
+        publisher.submit(routing_key="dhos.423779001", body={"content": "<xml/>"})
+        wait_for(lambda: transport.fail_next == 99)
+
+        start = time.monotonic()
+        publisher.stop(timeout=5)
+
+        assert time.monotonic() - start < 5
+        assert transport.fail_next == 99
+        assert len(spooled(spool_dir)) == 1
+
+    def test_rescans_spool_for_failed_batches(
+        self, spool_dir: Path, transport: InMemoryTransport
+    ) -> None:
+        transport.fail_next = 1
+        publisher = BatchPublisher(
+            spool_dir=spool_dir,
+            transport=transport,
+            flush_interval=0.01,
+            max_retries=0,
+            spool_rescan_interval=0.05,
+        )
+        publisher.start()
+        publisher.submit(routing_key="dhos.423779001", body={"content": "<xml/>"})
+
+        wait_for(lambda: len(transport.batches) == 1)
+        wait_for(lambda: spooled(spool_dir) == [])
+        publisher.stop(timeout=5)
+
+        assert transport.batches[0][0]["body"] == {"content": "<xml/>"}
+
+    def test_submit_rejected_when_spooling_fails(
+        self, publisher: BatchPublisher, spool_dir: Path, mocker: MockFixture
+    ) -> None:
+        spool_dir.mkdir(parents=True)
+        mocker.patch("os.replace", side_effect=OSError("disk full"))
+        with pytest.raises(ServiceUnavailableException):
+            publisher.submit(routing_key="dhos.423779001", body={"content": "<xml/>"})
+
+        assert publisher._queue.empty()
+        assert list(spool_dir.iterdir()) == []
+
+    def test_spool_writes_timed_separately(
+        self, publisher: BatchPublisher, spool_dir: Path
+    ) -> None:
+        spool_dir.mkdir(parents=True)
+        spool_before = stage_count("spool_write")
+        write_before = stage_count("write")
+        publisher.submit(routing_key="dhos.423779001", body={"content": "<xml/>"})
+
+        assert stage_count("spool_write") == spool_before + 1
+        assert stage_count("write") == write_before
+
+    def test_replays_spool_on_start(
+        self, spool_dir: Path, transport: InMemoryTransport
+    ) -> None:
+        first = BatchPublisher(spool_dir=spool_dir, transport=InMemoryTransport(100))
+        first.spool_dir.mkdir(parents=True)
+        first.submit(routing_key="dhos.423779001", body={"content": "one"})
+        first.submit(routing_key="dhos.423779001", body={"content": "two"})
+        assert len(spooled(spool_dir)) == 2
+
+        second = BatchPublisher(
+            spool_dir=spool_dir, transport=transport, flush_interval=0.01
+        )
+        second.start()
+        wait_for(lambda: spooled(spool_dir) == [])
+        second.stop(timeout=5)
+
+        published = [m["body"]["content"] for batch in transport.batches for m in batch]
+        assert published == ["one", "two"]
+
+    def test_queue_full(self, spool_dir: Path, transport: InMemoryTransport) -> None:
+        publisher = BatchPublisher(
+            spool_dir=spool_dir,
+            transport=transport,
+            max_queue_size=1,
+            enqueue_timeout=0.01,
+        )
+        spool_dir.mkdir(parents=True)
+        publisher.submit(routing_key="dhos.423779001", body={"content": "one"})
+        with pytest.raises(ServiceUnavailableException):
+            publisher.submit(routing_key="dhos.423779001", body={"content": "two"})
+        # Only the queued message is spooled, a retry of the rejected one won't be
+        # published twice.
+        assert len(spooled(spool_dir)) == 1
+
+
+def test_kombu_batch_transport(mocker: MockFixture) -> None:
+    mocker.patch.object(kombu_batteries_included.config, "RABBITMQ_DISABLED", False)
+    exchange = Exchange(infra.TASK_EXCHANGE_NAME, type="topic")
+    cda_queue = Queue("cda-test", exchange, routing_key="dhos.423779001")
+    transport = cda_publisher.KombuBatchTransport("memory://", compression=None)
+    messages: List[Dict[str, Any]] = [
+        {
+            "routing_key": "dhos.423779001",
+            "body": {"content": f"<xml>{index}</xml>"},
+            "timestamp": 0,
+            "correlation_id": "request-id",
+        }
+        for index in range(3)
+    ]
+
+    with Connection("memory://") as conn:
+        cda_queue(conn.channel()).declare()
+        transport(messages)
+        received = []
+        while True:
+            message = cda_queue(conn.channel()).get(no_ack=True)
+            if message is None:
+                break
+            received.append(json.loads(message.body)["content"])
+
+    assert received == ["<xml>0</xml>", "<xml>1</xml>", "<xml>2</xml>"]
+
+
+@pytest.mark.usefixtures("app_context")
+def test_publish_hl7_cda_xml_batched(
+    app: Flask, mocker: MockFixture, sample_send_data: Dict
+) -> None:
+    mock_publish = mocker.patch.object(kombu_batteries_included, "publish_message")
+    mock_publisher = mocker.patch.object(cda_publisher, "get_publisher")
+    mocker.patch.dict(app.config, {"CDA_PUBLISH_MODE": "batched"})
+
+    controller.publish_hl7_cda_xml(sample_send_data, "//srv/shr/fldr", "some.pdf")
+
+    assert mock_publish.call_count == 0
+    submit = mock_publisher.return_value.submit
+    assert submit.call_count == 1
+    assert submit.call_args[1]["routing_key"] == "dhos.423779001"
+    assert submit.call_args[1]["body"]["content"].startswith("<?xml")
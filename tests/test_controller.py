@@ -1,18 +1,26 @@
 import copy
+import threading
+import time
 from pathlib import Path
 from typing import Any, Dict, Optional
 
 import pytest
 import requests
 from _pytest.logging import LogCaptureFixture
+from flask import Flask
 from flask_batteries_included.helpers.error_handler import ServiceUnavailableException
 from flask_batteries_included.sqldb import db, generate_uuid
 from mock import Mock
 from pytest_mock import MockFixture
 from requests_mock import Mocker
+from she_logging.request_id import current_request_id
 
-from dhos_pdf_api.blueprint_api import controller
+from dhos_pdf_api.blueprint_api import controller, render_retry
+from dhos_pdf_api.blueprint_api.wkhtmltopdf import Wkhtmltopdf, WkhtmltopdfTerminated
 from dhos_pdf_api.models.filename_lookup import FilenameLookup
+from tests.sample_data.legacy_metadata import dicttoxml_pdf_metadata_xml
+from tests.sample_data.pdfs import sample_pdf
+from tests.sample_data.scaled import scale_patient_pdf_data
 
 
 @pytest.mark.usefixtures("app", "mock_trustomer_config")
@@ -26,7 +34,9 @@ class TestController:
         first_name: str = sample_gdm_data["patient"]["first_name"]
         last_name: str = sample_gdm_data["patient"]["last_name"]
         nhs_number: str = sample_gdm_data["patient"]["nhs_number"]
-        mock_pdfkit: Mock = mocker.patch("pdfkit.from_string", return_value=expected)
+        mock_wkhtmltopdf: Mock = mocker.patch.object(
+            Wkhtmltopdf, "render", return_value=expected
+        )
         mock_write = mocker.patch.object(Path, "write_bytes")
         mocker.patch.object(Path, "mkdir")
 
@@ -34,7 +44,7 @@ class TestController:
         controller.create_patient_pdf(data=sample_gdm_data, product_name="gdm")
 
         # Assert
-        assert mock_pdfkit.call_count == 1
+        assert mock_wkhtmltopdf.call_count == 1
         assert mock_write.call_count == 1
         mock_write.assert_called_with(expected)
         lookup = FilenameLookup.query.filter_by(lookup_uuid=patient_uuid).first()
@@ -42,6 +52,140 @@ class TestController:
         assert lookup.lookup_uuid == patient_uuid
         assert lookup.file_name == f"{first_name}-{last_name}-{nhs_number}.pdf"
 
+    @pytest.mark.parametrize("product_name,parts", [("gdm", 5), ("dbm", 4)])
+    def test_create_patient_pdf_in_chunks(
+        self,
+        app: Flask,
+        mocker: MockFixture,
+        sample_gdm_data: Dict,
+        product_name: str,
+        parts: int,
+    ) -> None:
+        # Arrange
+        app.config["PATIENT_PDF_CHUNK_THRESHOLD"] = 10
+        app.config["PATIENT_PDF_CHUNK_SIZE"] = 4
+        data = scale_patient_pdf_data(sample_gdm_data, 10)
+        mock_wkhtmltopdf: Mock = mocker.patch.object(
+            Wkhtmltopdf,
+            "render",
+            side_effect=lambda html, options: sample_pdf(["part"]),
+        )
+        mock_write = mocker.patch.object(Path, "write_bytes")
+        mocker.patch.object(Path, "mkdir")
+
+        # Act
+        controller.create_patient_pdf(data=data, product_name=product_name)
+
+        # Assert
+        # The summary, three chunks of readings and, for GDM, the notes.
+        assert mock_wkhtmltopdf.call_count == parts
+        html = [call.args[0] for call in mock_wkhtmltopdf.call_args_list]
+        assert [h.count('<h2 class="noBoarder">Blood glucose') for h in html[1:4]] == [
+            1,
+            0,
+            0,
+        ]
+        for call in mock_wkhtmltopdf.call_args_list:
+            assert "--header-right" not in call.args[1]
+            assert "--no-outline" in call.args[1]
+        pdf: bytes = mock_write.call_args.args[0]
+        assert f"(Page {parts} of {parts}) Tj".encode() in pdf
+
+    def test_create_patient_pdf_below_chunk_threshold(
+        self, app: Flask, mocker: MockFixture, sample_gdm_data: Dict
+    ) -> None:
+        app.config["PATIENT_PDF_CHUNK_THRESHOLD"] = 11
+        data = scale_patient_pdf_data(sample_gdm_data, 10)
+        mock_wkhtmltopdf: Mock = mocker.patch.object(
+            Wkhtmltopdf, "render", return_value=b"pdf"
+        )
+        mock_write = mocker.patch.object(Path, "write_bytes")
+        mocker.patch.object(Path, "mkdir")
+
+        controller.create_patient_pdf(data=data, product_name="gdm")
+
+        assert mock_wkhtmltopdf.call_count == 1
+        assert "--header-right" in mock_wkhtmltopdf.call_args.args[1]
+        mock_write.assert_called_with(b"pdf")
+
+    def test_create_patient_pdf_render_failure_is_retried(
+        self, mocker: MockFixture, sample_gdm_data: Dict
+    ) -> None:
+        # Arrange
+        patient_uuid: str = sample_gdm_data["patient"]["uuid"]
+        mock_wkhtmltopdf: Mock = mocker.patch.object(
+            Wkhtmltopdf,
+            "render",
+            side_effect=ServiceUnavailableException(
+                "All wkhtmltopdf processes are busy"
+            ),
+        )
+        mock_submit: Mock = mocker.patch.object(
+            render_retry.get_retry_queue(), "submit", return_value=True
+        )
+        mock_write = mocker.patch.object(Path, "write_bytes")
+        mocker.patch.object(Path, "mkdir")
+
+        # Act
+        created = controller.create_patient_pdf(
+            data=sample_gdm_data, product_name="gdm"
+        )
+
+        # Assert
+        assert created is False
+        assert mock_submit.call_count == 1
+        description, retry = mock_submit.call_args.args
+        assert description == f"GDm-Health PDF for {patient_uuid}"
+        assert mock_write.call_count == 0
+
+        # The retry renders and saves the PDF, in a thread without an app context.
+        mock_wkhtmltopdf.side_effect = None
+        mock_wkhtmltopdf.return_value = b"pdf"
+        thread = threading.Thread(target=retry)
+        thread.start()
+        thread.join(5)
+        mock_write.assert_called_once_with(b"pdf")
+        assert FilenameLookup.query.filter_by(lookup_uuid=patient_uuid).first()
+
+    def test_create_patient_pdf_render_failure_fails_when_retry_queue_full(
+        self, mocker: MockFixture, sample_gdm_data: Dict
+    ) -> None:
+        mocker.patch.object(
+            Wkhtmltopdf,
+            "render",
+            side_effect=ServiceUnavailableException(
+                "All wkhtmltopdf processes are busy"
+            ),
+        )
+        mocker.patch.object(
+            render_retry.get_retry_queue(), "submit", return_value=False
+        )
+        mocker.patch.object(Path, "mkdir")
+
+        with pytest.raises(ServiceUnavailableException):
+            controller.create_patient_pdf(data=sample_gdm_data, product_name="gdm")
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            WkhtmltopdfTerminated("timeout", "took too long"),
+            IOError("No wkhtmltopdf executable found"),
+        ],
+    )
+    def test_create_patient_pdf_render_failure_not_retried(
+        self, mocker: MockFixture, sample_gdm_data: Dict, error: Exception
+    ) -> None:
+        mocker.patch.object(Wkhtmltopdf, "render", side_effect=error)
+        mock_submit: Mock = mocker.patch.object(
+            render_retry.get_retry_queue(), "submit"
+        )
+        mocker.patch.object(Path, "mkdir")
+
+        with pytest.raises(type(error)):
+            controller.create_patient_pdf(data=sample_gdm_data, product_name="gdm")
+
+        assert mock_submit.call_count == 0
+
     @pytest.mark.parametrize(
         "first_name,pdf_filename",
         [
@@ -60,7 +204,7 @@ class TestController:
         # Arrange
         sample_gdm_data["patient"]["first_name"] = first_name
         patient_uuid: str = sample_gdm_data["patient"]["uuid"]
-        mocker.patch("pdfkit.from_string", return_value={"some": "thing"})
+        mocker.patch.object(Wkhtmltopdf, "render", return_value={"some": "thing"})
         mocker.patch.object(Path, "write_bytes")
         mocker.patch.object(Path, "mkdir")
 
@@ -165,6 +309,66 @@ class TestController:
 
         assert mock_write.call_count == 4
 
+    def test_create_send_documents_runs_stages_concurrently(
+        self,
+        app: Flask,
+        sample_send_data: Dict,
+        requests_mock: Mocker,
+        mocker: MockFixture,
+        mock_publish_msg: Mock,
+        test_request_id: str,
+    ) -> None:
+        stage_delay = 0.3
+        sample_send_data["encounter"]["discharged_at"] = "2019-01-26T10:01:10.000Z"
+        mocker.patch.dict(app.config, {"SEND_BCP_CDA_UNC_PATH": "//srv/shr/fldr"})
+        mock_write = mocker.patch.object(controller, "write_file")
+        stage_request_ids = []
+
+        def slow_stage(*args: Any) -> bytes:
+            stage_request_ids.append(current_request_id())
+            time.sleep(stage_delay)
+            return b"<xml/>"
+
+        def slow_engine(request: Any, context: Any) -> bytes:
+            time.sleep(stage_delay)
+            return b"something"
+
+        mocker.patch.object(controller, "build_hl7_cda_xml", side_effect=slow_stage)
+        mocker.patch.object(
+            controller, "create_pdf_metadata_xml", side_effect=slow_stage
+        )
+        requests_mock.post(
+            f"http://localhost:3000/dhos/v1/send_pdf", content=slow_engine
+        )
+
+        start = time.perf_counter()
+        controller.create_send_documents(sample_send_data)
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 2 * stage_delay
+        assert stage_request_ids == [test_request_id, test_request_id]
+        assert mock_publish_msg.call_count == 1
+        assert mock_write.call_count == 4
+        mock_write.assert_called_with(mocker.ANY, b"<xml/>")
+
+    def test_create_send_documents_engine_failure_does_not_publish_cda(
+        self,
+        app: Flask,
+        sample_send_data: Dict,
+        requests_mock: Mocker,
+        mocker: MockFixture,
+        mock_publish_msg: Mock,
+    ) -> None:
+        mocker.patch.dict(app.config, {"SEND_BCP_CDA_UNC_PATH": "//srv/shr/fldr"})
+        mock_write = mocker.patch.object(controller, "write_file")
+        requests_mock.post(f"http://localhost:3000/dhos/v1/send_pdf", status_code=500)
+
+        with pytest.raises(ServiceUnavailableException):
+            controller.create_send_documents(sample_send_data)
+
+        assert mock_publish_msg.call_count == 0
+        assert mock_write.call_count == 0
+
     def test_create_send_documents_http_error(
         self, sample_send_data: Dict, requests_mock: Mocker
     ) -> None:
@@ -325,6 +529,56 @@ class TestController:
         response = controller.create_pdf_metadata_xml(xml_data)
         assert response == bytes(expected, "utf-8")
 
+    def test_create_pdf_metadata_xml_golden_file(
+        self, sample_send_data: Dict, mocker: MockFixture
+    ) -> None:
+        mocker.patch.object(
+            controller,
+            "get_iso_format_time_now",
+            return_value="2019-01-26T10:01:10.000Z",
+        )
+        golden_file = Path(__file__).parent / "sample_data" / "send_pdf_metadata.xml"
+        xml_data = copy.deepcopy(sample_send_data)
+        xml_data["pdf_filename"] = "2018L73782250.pdf"
+        xml_data["encounter_id"] = "2018L73782250"
+        xml_data["patient"]["first_name"] = "Zoë"
+        xml_data["patient"]["last_name"] = "O'Brien & <Sons>"
+        response = controller.create_pdf_metadata_xml(xml_data)
+        assert response == golden_file.read_bytes()
+
+    @pytest.mark.parametrize(
+        "first_name,last_name,encounter_id,discharged_at",
+        [
+            ("Michele", "Haynes", "2018L73782250", None),
+            ('"Shelly"', "O'Brien & <Sons>", "<&>", "2019-01-27T10:00:00.000Z"),
+            ("Zoë", None, None, None),
+            ("", "", "", None),
+        ],
+    )
+    def test_create_pdf_metadata_xml_matches_dicttoxml(
+        self,
+        sample_send_data: Dict,
+        mocker: MockFixture,
+        first_name: Optional[str],
+        last_name: Optional[str],
+        encounter_id: Optional[str],
+        discharged_at: Optional[str],
+    ) -> None:
+        mocker.patch.object(
+            controller,
+            "get_iso_format_time_now",
+            return_value="2019-01-26T10:01:10.000Z",
+        )
+        xml_data = copy.deepcopy(sample_send_data)
+        xml_data["pdf_filename"] = "2018L73782250.pdf"
+        xml_data["encounter_id"] = encounter_id
+        xml_data["patient"]["first_name"] = first_name
+        xml_data["patient"]["last_name"] = last_name
+        xml_data["encounter"]["discharged_at"] = discharged_at
+        assert controller.create_pdf_metadata_xml(
+            xml_data
+        ) == dicttoxml_pdf_metadata_xml(xml_data)
+
     def test_save_filename_lookup(self, mocker: MockFixture) -> None:
         """
         Tests that when there's no existing FilenameLookup to update, we try to create a new one.
@@ -0,0 +1,124 @@
+import json
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from flask import Flask
+from prometheus_client import REGISTRY
+from pytest_mock import MockFixture
+
+from dhos_pdf_api import app as dhos_pdf_app
+from dhos_pdf_api.blueprint_api import controller
+from dhos_pdf_api.config import Configuration
+from dhos_pdf_api.helper import memory_profile
+from dhos_pdf_api.helper.memory_profile import (
+    budget_failures,
+    measure_memory,
+    profile_ward_reports,
+)
+
+SAMPLE_DATA = Path("tests/sample_data/send_ward_report/sample_metric_data.json")
+
+
+@pytest.fixture
+def ward_report_data() -> Dict:
+    return json.loads(SAMPLE_DATA.read_text())
+
+
+def test_measure_memory_records_peak_allocation() -> None:
+    with measure_memory() as usage:
+        data = bytearray(4 * 2**20)
+        del data
+    assert usage.peak_alloc_bytes is not None
+    assert usage.peak_alloc_bytes >= 4 * 2**20
+    assert usage.rss_after_kb > 0
+
+
+def test_measure_memory_without_tracing() -> None:
+    with measure_memory(trace_malloc=False) as usage:
+        pass
+    assert usage.peak_alloc_bytes is None
+
+
+@pytest.mark.parametrize("leak", [False, True])
+def test_profile_ward_reports(mocker: MockFixture, tmp_path: Path, leak: bool) -> None:
+    # A fake report that leaks a known amount, to check the leak is found.
+    leaked: List[bytearray] = []
+
+    def write_ward_report(data: Dict, file_path: Path) -> None:
+        report = bytearray(2**20)
+        if leak:
+            leaked.append(report)
+
+    mocker.patch.object(memory_profile, "write_ward_report", write_ward_report)
+    report = profile_ward_reports({}, tmp_path / "ward_report.pdf", reports=3)
+
+    assert report["reports"] == 3
+    assert len(report["peak_alloc_bytes"]) == 3
+    assert min(report["peak_alloc_bytes"]) > 2**19
+    failures = budget_failures(report, max_traced_growth_kb=1024)
+    if leak:
+        assert report["traced_growth_kb"] >= 3 * 1024
+        assert failures
+        assert "test_memory_profile.py" in report["top_growth"][0]["location"]
+    else:
+        assert failures == []
+
+
+@pytest.mark.slow
+def test_repeated_ward_reports_do_not_leak(
+    ward_report_data: Dict, tmp_path: Path
+) -> None:
+    # Tracing one frame per allocation keeps this to a few seconds a report.
+    report = profile_ward_reports(
+        ward_report_data,
+        tmp_path / "ward_report.pdf",
+        reports=5,
+        warm_up=2,
+        traceback_frames=1,
+    )
+    assert len(report["peak_alloc_bytes"]) == 5
+    assert min(report["peak_alloc_bytes"]) > 0
+    # Some growth comes from caches that fill slowly, e.g. matplotlib's font and
+    # text layout caches; a leaked figure per report would be several MB.
+    assert budget_failures(report, max_traced_growth_kb=1024) == []
+
+
+def test_budget_failures() -> None:
+    report = {"reports": 10, "traced_growth_kb": 4096.0, "rss_growth_kb": 100}
+    failures = budget_failures(report, max_traced_growth_kb=1024, max_rss_growth_kb=200)
+    assert failures == ["traced memory grew 4096 kB over 10 reports, budget 1024 kB"]
+
+
+def test_ward_report_peak_allocation_metric(
+    app: Flask, ward_report_data: Dict, pdf_output_path: Path
+) -> None:
+    app.config["WARD_REPORT_TRACE_MALLOC"] = True
+    before = REGISTRY.get_sample_value("dhos_pdf_ward_report_peak_alloc_bytes_count")
+    with app.app_context():
+        controller.generate_send_ward_report_pdf(
+            {
+                key: ward_report_data[key]
+                for key in (
+                    "pdf_data",
+                    "hospital_name",
+                    "ward_name",
+                    "report_month",
+                    "report_year",
+                    "location_uuid",
+                )
+            },
+            ward_report_folder=pdf_output_path,
+        )
+    after = REGISTRY.get_sample_value("dhos_pdf_ward_report_peak_alloc_bytes_count")
+    assert after == (before or 0) + 1
+    assert REGISTRY.get_sample_value("dhos_pdf_ward_report_rss_bytes")
+
+
+def test_trace_malloc_refused_in_production(mocker: MockFixture) -> None:
+    mocker.patch.object(Configuration, "WARD_REPORT_TRACE_MALLOC", True)
+    mocker.patch.object(
+        dhos_pdf_app, "is_not_production_environment", return_value=False
+    )
+    with pytest.raises(ValueError, match="WARD_REPORT_TRACE_MALLOC"):
+        dhos_pdf_app.create_app(testing=True, use_pgsql=False, use_sqlite=True)
@@ -0,0 +1,38 @@
+from typing import Optional
+
+import pytest
+from prometheus_client import REGISTRY
+
+from dhos_pdf_api.metrics import time_stage
+
+
+def _sample(name: str, product: str, stage: str) -> float:
+    value: Optional[float] = REGISTRY.get_sample_value(
+        name, {"product": product, "stage": stage}
+    )
+    return value or 0.0
+
+
+class TestTimeStage:
+    def test_records_duration(self) -> None:
+        before = _sample("dhos_pdf_stage_seconds_count", "gdm", "test_stage")
+        with time_stage("gdm", "test_stage"):
+            pass
+        assert (
+            _sample("dhos_pdf_stage_seconds_count", "gdm", "test_stage") == before + 1
+        )
+
+    def test_counts_errors(self) -> None:
+        count_before = _sample("dhos_pdf_stage_seconds_count", "dbm", "test_stage")
+        errors_before = _sample("dhos_pdf_stage_errors_total", "dbm", "test_stage")
+        with pytest.raises(ValueError):
+            with time_stage("dbm", "test_stage"):
+                raise ValueError("failed")
+        assert (
+            _sample("dhos_pdf_stage_seconds_count", "dbm", "test_stage")
+            == count_before + 1
+        )
+        assert (
+            _sample("dhos_pdf_stage_errors_total", "dbm", "test_stage")
+            == errors_before + 1
+        )
@@ -0,0 +1,94 @@
+import io
+from typing import Any, List
+
+import pytest
+from pypdf import PdfReader
+
+from dhos_pdf_api.blueprint_api.pdf_merge import Stamp, merge_pdfs, overlay_pages
+from tests.sample_data.pdfs import handwritten_pdf, sample_pdf
+
+PAGE_NUMBERS = Stamp(text=lambda page, pages: f"Page {page} of {pages}")
+
+
+def _read(pdf: bytes) -> PdfReader:
+    # Strict, so anything a lenient reader would have to repair fails the test.
+    return PdfReader(io.BytesIO(pdf), strict=True)
+
+
+def _page_texts(pdf: bytes) -> List[str]:
+    return [page.extract_text() for page in _read(pdf).pages]
+
+
+class TestPdfMerge:
+    def test_merges_pages_in_order(self) -> None:
+        merged = merge_pdfs(
+            [sample_pdf(["a", "b"]), sample_pdf(["c", "d", "e"]), sample_pdf(["f"])]
+        )
+        assert [text.strip() for text in _page_texts(merged)] == list("abcdef")
+
+    def test_stamps_page_numbers(self) -> None:
+        merged = merge_pdfs(
+            [sample_pdf(["a", "b"]), sample_pdf(["c"])], stamp=PAGE_NUMBERS
+        )
+        texts = _page_texts(merged)
+        assert len(texts) == 3
+        for number, (label, text) in enumerate(zip("abc", texts), start=1):
+            assert label in text
+            assert f"Page {number} of 3" in text
+
+    def test_merged_document_can_be_merged_again(self) -> None:
+        merged = merge_pdfs([sample_pdf(["a"]), sample_pdf(["b"])], stamp=PAGE_NUMBERS)
+        assert len(_read(merge_pdfs([merged, sample_pdf(["c"])])).pages) == 3
+
+    def test_keeps_inherited_attributes_and_split_content(self) -> None:
+        pdf = handwritten_pdf(
+            [
+                b"BT /F1 12 Tf 10 50 Td (Hello) Tj ET",
+                b"BT /F1 12 Tf 10 20 Td (World) Tj ET",
+            ]
+        )
+        page = _read(merge_pdfs([pdf], stamp=PAGE_NUMBERS)).pages[0]
+
+        assert [float(n) for n in page.mediabox] == [0, 0, 200, 100]
+        resources: Any = page["/Resources"]
+        fonts = resources["/Font"]
+        assert fonts["/F1"]["/BaseFont"] == "/Courier"
+        assert fonts["/Stamp"]["/BaseFont"] == "/Helvetica"
+        contents = page.get_contents()
+        assert contents is not None
+        content = contents.get_data()
+        assert b"(Hello)" in content
+        assert b"(World)" in content
+        # The stamp is right-aligned with the default margin.
+        assert content.rstrip().endswith(b"Td (Page 1 of 1) Tj ET")
+        assert b" 86.00 Td" in content
+
+    def test_escapes_stamp_text(self) -> None:
+        merged = merge_pdfs(
+            [sample_pdf(["a"])], stamp=Stamp(text=lambda page, pages: "(a\\b)")
+        )
+        assert "(a\\b)" in _page_texts(merged)[0]
+
+    @pytest.mark.parametrize("pdf", [b"not a pdf", sample_pdf(["a"])[:200]])
+    def test_rejects_unreadable_documents(self, pdf: bytes) -> None:
+        with pytest.raises(ValueError):
+            merge_pdfs([pdf])
+
+    def test_rejects_encrypted_documents(self) -> None:
+        pdf = handwritten_pdf([b""]).replace(
+            b"/Root 1 0 R", b"/Root 1 0 R /Encrypt << /Filter /Standard >>"
+        )
+        with pytest.raises(ValueError):
+            merge_pdfs([pdf])
+
+    def test_overlays_chosen_pages(self) -> None:
+        overlaid = overlay_pages(
+            sample_pdf(["a", "b", "c"]), sample_pdf(["overlay"]), [0, 2]
+        )
+        texts = _page_texts(overlaid)
+        assert len(texts) == 3
+        for label, text in zip("abc", texts):
+            assert label in text
+        assert "overlay" in texts[0]
+        assert "overlay" not in texts[1]
+        assert "overlay" in texts[2]
@@ -0,0 +1,114 @@
+import os
+import re
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from dhos_pdf_api.blueprint_api import controller
+from dhos_pdf_api.blueprint_api.render_context import (
+    ReadingRow,
+    shape_patient_pdf_context,
+)
+from tests.sample_data.scaled import scale_patient_pdf_data
+
+# The HTML rendered from the sample data, whitespace normalised. Set
+# UPDATE_RENDERED_HTML=true to rewrite it after a deliberate change to the templates.
+RENDERED_HTML = Path(__file__).parent / "sample_data" / "rendered"
+
+
+def _normalise(html: str) -> str:
+    html = re.sub(r"\s+", " ", html)
+    return re.sub(r" ?(<[^>]*>) ?", r"\1", html)
+
+
+def _assert_matches_rendered(html: str, file_name: str) -> None:
+    expected_path = RENDERED_HTML / file_name
+    if os.environ.get("UPDATE_RENDERED_HTML") == "true":
+        expected_path.write_text(_normalise(html) + "\n")
+    assert _normalise(html) == expected_path.read_text().rstrip("\n")
+
+
+@pytest.mark.usefixtures("app_context")
+class TestRenderContext:
+    @pytest.mark.parametrize("readings", [0, 1, 200])
+    def test_gdm_matches_rendered_html(
+        self, sample_gdm_data: Dict, readings: int
+    ) -> None:
+        data = scale_patient_pdf_data(sample_gdm_data, readings)
+        data["patient"]["record"]["notes"] = [
+            {
+                "created": "2021-12-23T10:26:48.000Z",
+                "clinician": {"first_name": "OJ", "last_name": "Wolrab"},
+                "content": "Dose <increased>",
+            },
+            {"created": None, "clinician": None},
+        ]
+        data["messages"][0]["message_type"]["uuid"] = "DHOS-MESSAGES-FEEDBACK"
+        data["messages"][1]["clinician"] = None
+        actual = controller.template["gdm"].render(**shape_patient_pdf_context(data))
+        _assert_matches_rendered(actual, f"gdm_patient_{readings}_readings.html")
+
+    @pytest.mark.parametrize("readings", [0, 200])
+    def test_dbm_matches_rendered_html(
+        self, sample_dbm_post_data_session: Dict, readings: int
+    ) -> None:
+        data = scale_patient_pdf_data(sample_dbm_post_data_session, readings)
+        actual = controller.template["dbm"].render(**shape_patient_pdf_context(data))
+        _assert_matches_rendered(actual, f"dbm_patient_{readings}_readings.html")
+
+    def test_reading_rows(self, sample_gdm_data: Dict) -> None:
+        medication = sample_gdm_data["medications"]["109081006"]
+        sample_gdm_data["blood_glucose_readings"] = [
+            {
+                "alert": {"dismissed": False},
+                "measured_timestamp": "2021-01-01T07:30:00.000Z",
+                "prandial_tag": {"description": "Before breakfast"},
+                "blood_glucose_value": 7.8,
+                "units": "mmol/L",
+                "doses": [
+                    {"amount": 500, "medication_id": "109081006"},
+                    {"amount": 2, "medication_id": "unknown"},
+                ],
+                "comment": None,
+            },
+            {"alert": {"dismissed": True}, "prandial_tag": None, "doses": None},
+        ]
+        rows = shape_patient_pdf_context(sample_gdm_data)["reading_rows"]
+        assert rows == [
+            ReadingRow(
+                alert=True,
+                measured_at="2021-01-01T07:30:00.000Z",
+                activity="Before breakfast",
+                value="7.8 mmol/L",
+                doses=f"500 {medication['unit']} {medication['name']}"
+                " 2 UNKNOWN MEDICATION (unknown)",
+                comment="NOT SPECIFIED",
+            ),
+            ReadingRow(
+                alert=False,
+                measured_at="",
+                activity="",
+                value=" ",
+                doses="",
+                comment="",
+            ),
+        ]
+
+    @pytest.mark.parametrize(
+        "part,included,excluded",
+        [
+            ("summary", ["Summary", "Deliveries"], ["Blood glucose", "Messages"]),
+            ("readings", ["Blood glucose"], ["Summary", "Clinician notes"]),
+            ("notes", ["Clinician notes", "Messages"], ["Summary", "Blood glucose"]),
+        ],
+    )
+    def test_gdm_parts(
+        self, sample_gdm_data: Dict, part: str, included: List[str], excluded: List[str]
+    ) -> None:
+        context = shape_patient_pdf_context(scale_patient_pdf_data(sample_gdm_data, 2))
+        html = controller.template["gdm"].render(**{**context, "part": part})
+        for heading in included:
+            assert f">{heading}" in html
+        for heading in excluded:
+            assert f">{heading}" not in html
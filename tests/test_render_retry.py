@@ -0,0 +1,84 @@
+import threading
+from typing import List, Optional
+
+from flask_batteries_included.helpers.error_handler import ServiceUnavailableException
+from prometheus_client import REGISTRY
+
+from dhos_pdf_api.blueprint_api.render_retry import RetryQueue
+from dhos_pdf_api.blueprint_api.wkhtmltopdf import WkhtmltopdfTerminated
+
+
+def _retries(outcome: str) -> float:
+    value: Optional[float] = REGISTRY.get_sample_value(
+        "dhos_pdf_render_retries_total", {"outcome": outcome}
+    )
+    return value or 0.0
+
+
+class TestRetryQueue:
+    def test_retries_until_success(self) -> None:
+        attempts: List[int] = []
+        done = threading.Event()
+
+        def flaky() -> None:
+            attempts.append(len(attempts) + 1)
+            if len(attempts) < 3:
+                raise ServiceUnavailableException("All wkhtmltopdf processes are busy")
+            done.set()
+
+        retry_queue = RetryQueue(max_attempts=3, delay=0.01)
+        before = _retries("succeeded")
+        assert retry_queue.submit("test PDF", flaky)
+        assert done.wait(5)
+        retry_queue.stop(5)
+
+        assert attempts == [1, 2, 3]
+        assert _retries("succeeded") == before + 1
+
+    def test_gives_up_after_max_attempts(self) -> None:
+        attempts: List[int] = []
+
+        def failing() -> None:
+            attempts.append(1)
+            raise ServiceUnavailableException("All wkhtmltopdf processes are busy")
+
+        retry_queue = RetryQueue(max_attempts=2, delay=0.01)
+        before = _retries("failed")
+        retry_queue.submit("test PDF", failing)
+        for _ in range(500):
+            if _retries("failed") > before:
+                break
+            threading.Event().wait(0.01)
+        retry_queue.stop(5)
+
+        assert len(attempts) == 2
+        assert _retries("failed") == before + 1
+
+    def test_gives_up_on_error_that_is_not_retryable(self) -> None:
+        attempts: List[int] = []
+
+        def killed() -> None:
+            attempts.append(1)
+            raise WkhtmltopdfTerminated("timeout", "took too long")
+
+        retry_queue = RetryQueue(max_attempts=3, delay=0.01)
+        before = _retries("failed")
+        retry_queue.submit("test PDF", killed)
+        for _ in range(500):
+            if _retries("failed") > before:
+                break
+            threading.Event().wait(0.01)
+        retry_queue.stop(5)
+
+        assert len(attempts) == 1
+        assert _retries("failed") == before + 1
+
+    def test_drops_when_full(self) -> None:
+        retry_queue = RetryQueue(max_queue_size=1, delay=60)
+        before = _retries("dropped")
+
+        assert retry_queue.submit("first PDF", lambda: None)
+        assert not retry_queue.submit("second PDF", lambda: None)
+        retry_queue.stop(5)
+
+        assert _retries("dropped") == before + 1
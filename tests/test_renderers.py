@@ -0,0 +1,151 @@
+import re
+import threading
+from typing import Any, Dict, Generator, List
+
+import pytest
+from flask import Flask
+from flask_batteries_included.helpers.error_handler import ServiceUnavailableException
+from matplotlib.figure import Figure
+from pytest_mock import MockFixture
+
+from benchmarks.html_pdf import InProcessRenderer
+from dhos_pdf_api.blueprint_api import controller, renderers
+from dhos_pdf_api.blueprint_api.render_context import shape_patient_pdf_context
+from dhos_pdf_api.blueprint_api.renderers import (
+    PdfRenderer,
+    RenderRequest,
+    WkhtmltopdfPoolRenderer,
+)
+from dhos_pdf_api.blueprint_api.wkhtmltopdf import Wkhtmltopdf, WkhtmltopdfLimits
+from tests.sample_data.scaled import scale_patient_pdf_data
+
+
+@pytest.fixture
+def renderer_config(app: Flask) -> Generator[Dict[str, Any], None, None]:
+    config = dict(app.config)
+    yield config
+    renderers.init_renderers(app.config)
+
+
+def _gdm_html(data: Dict, readings: int) -> str:
+    context = shape_patient_pdf_context(scale_patient_pdf_data(data, readings))
+    return controller.template["gdm"].render(**context)
+
+
+class TestRenderers:
+    def test_default_renderers(self, app: Flask) -> None:
+        assert type(renderers.get_renderer("gdm")) is renderers.WkhtmltopdfRenderer
+        assert renderers.get_renderer("dbm") is renderers.get_renderer("gdm")
+        assert isinstance(
+            renderers.get_renderer("send"), renderers.RemoteEngineRenderer
+        )
+
+    def test_pool_is_shared_between_products(
+        self, renderer_config: Dict[str, Any]
+    ) -> None:
+        renderer_config["GDM_PDF_RENDERER"] = "wkhtmltopdf-pool"
+        renderer_config["DBM_PDF_RENDERER"] = "wkhtmltopdf-pool"
+        renderers.init_renderers(renderer_config)
+        pool = renderers.get_renderer("gdm")
+        assert isinstance(pool, WkhtmltopdfPoolRenderer)
+        assert pool.size == renderer_config["WKHTMLTOPDF_POOL_SIZE"]
+        assert renderers.get_renderer("dbm") is pool
+
+    @pytest.mark.parametrize(
+        "key,name,message",
+        [
+            ("GDM_PDF_RENDERER", "unknown", "Unknown PDF renderer 'unknown'"),
+            ("GDM_PDF_RENDERER", "remote", "can't render gdm PDFs"),
+            ("GDM_PDF_RENDERER", "in-process", "Unknown PDF renderer 'in-process'"),
+            ("SEND_PDF_RENDERER", "wkhtmltopdf", "can't render send PDFs"),
+        ],
+    )
+    def test_invalid_config(
+        self, renderer_config: Dict[str, Any], key: str, name: str, message: str
+    ) -> None:
+        renderer_config[key] = name
+        with pytest.raises(ValueError, match=message):
+            renderers.init_renderers(renderer_config)
+
+    def test_register_renderer(
+        self, renderer_config: Dict[str, Any], mocker: MockFixture
+    ) -> None:
+        class StaticRenderer(PdfRenderer):
+            products = frozenset({"dbm"})
+
+            def render(self, request: RenderRequest) -> bytes:
+                return b"static"
+
+        mocker.patch.dict(renderers.RENDERERS)
+        renderers.register_renderer("static", lambda config: StaticRenderer())
+        renderer_config["DBM_PDF_RENDERER"] = "static"
+        renderers.init_renderers(renderer_config)
+
+        request = RenderRequest(product="dbm", html="<html></html>")
+        assert renderers.get_renderer("dbm").render(request) == b"static"
+
+    def test_renderer_must_implement_render(self) -> None:
+        class IncompleteRenderer(PdfRenderer):
+            products = frozenset({"dbm"})
+
+        with pytest.raises(TypeError):
+            IncompleteRenderer()  # type: ignore[abstract]
+
+    def test_pool_limits_concurrent_renders(self, mocker: MockFixture) -> None:
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_render(html: str, options: Dict) -> bytes:
+            started.set()
+            release.wait(5)
+            return b"pdf"
+
+        wkhtmltopdf = Wkhtmltopdf(WkhtmltopdfLimits(timeout_seconds=10))
+        mocker.patch.object(wkhtmltopdf, "render", side_effect=slow_render)
+        pool = WkhtmltopdfPoolRenderer(wkhtmltopdf, size=1, acquire_timeout=0.05)
+        request = RenderRequest(product="gdm", html="<html></html>")
+        results: List[bytes] = []
+        thread = threading.Thread(target=lambda: results.append(pool.render(request)))
+        thread.start()
+        started.wait(5)
+
+        with pytest.raises(ServiceUnavailableException):
+            pool.render(request)
+
+        release.set()
+        thread.join(5)
+        assert results == [b"pdf"]
+        # The slot is free again.
+        assert pool.render(request) == b"pdf"
+
+
+@pytest.mark.usefixtures("app_context")
+class TestInProcessRenderer:
+    def test_render(self, mocker: MockFixture, sample_gdm_data: Dict) -> None:
+        text = mocker.patch.object(Figure, "text", autospec=True, wraps=Figure.text)
+        request = RenderRequest(
+            product="gdm",
+            html=_gdm_html(sample_gdm_data, 200),
+            options={"--header-right": "Page [page] of [toPage]"},
+        )
+
+        pdf = InProcessRenderer().render(request)
+
+        assert pdf.startswith(b"%PDF")
+        drawn = [call.args[3] for call in text.call_args_list]
+        page_numbers = [s for s in drawn if s.startswith("Page ")]
+        pages = len(page_numbers)
+        assert pages > 2
+        assert b"/Count %d" % pages in pdf
+        assert page_numbers == [f"Page {n} of {pages}" for n in range(1, pages + 1)]
+        assert "Summary" in drawn
+        # The readings table header is repeated on every page it continues on.
+        assert drawn.count("Read at") >= pages - 2
+        assert "Grace Galloway" in " ".join(drawn)
+
+    def test_render_is_not_parsed_as_mathtext(
+        self, mocker: MockFixture, sample_gdm_data: Dict
+    ) -> None:
+        sample_gdm_data["patient"]["first_name"] = "$\\alpha$"
+        request = RenderRequest(product="gdm", html=_gdm_html(sample_gdm_data, 0))
+        assert InProcessRenderer().render(request).startswith(b"%PDF")
@@ -0,0 +1,96 @@
+import pstats
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from flask import Flask
+from pytest_mock import MockFixture
+from werkzeug import Client
+
+from dhos_pdf_api.blueprint_api import controller
+from dhos_pdf_api.helper.request_profile import SamplingProfiler
+
+
+def _busy(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+class TestSamplingProfiler:
+    def test_samples_thread_stack(self, tmp_path: Path) -> None:
+        profiler = SamplingProfiler(threading.get_ident(), interval_seconds=0.001)
+        profiler.start()
+        _busy(0.1)
+        profiler.stop()
+
+        assert any(stack.endswith(":_busy") for stack in profiler.stacks)
+        path = tmp_path / "profile.collapsed"
+        profiler.write(path)
+        stack, count = path.read_text().splitlines()[0].rsplit(" ", 1)
+        assert int(count) >= 1
+        assert "tests.test_request_profile:test_samples_thread_stack" in stack
+
+
+@pytest.mark.usefixtures("mock_bearer_validation")
+class TestRequestProfileApi:
+    @pytest.fixture(autouse=True)
+    def profile_dir(self, app: Flask, tmp_path: Path) -> Path:
+        app.config["PROFILE_OUTPUT_DIR"] = str(tmp_path / "profiles")
+        return tmp_path / "profiles"
+
+    @pytest.fixture(autouse=True)
+    def mock_get_patient_pdf(self, mocker: MockFixture) -> None:
+        def get_patient_pdf(patient_uuid: str, product_name: str) -> bytes:
+            _busy(0.05)
+            return b"%PDF-1.4"
+
+        mocker.patch.object(controller, "get_patient_pdf", side_effect=get_patient_pdf)
+
+    @pytest.mark.parametrize("profile_format", ["collapsed", "pstats"])
+    def test_profiles_requested_request(
+        self, client: Client, profile_dir: Path, profile_format: str
+    ) -> None:
+        response = client.get(
+            "/dhos/v1/gdm_pdf/some-uuid",
+            headers={"Authorization": "Bearer TOKEN", "X-Profile": profile_format},
+        )
+        assert response.status_code == 200
+        path = profile_dir / response.headers["X-Profile-File"]
+        assert path.suffix == f".{profile_format}"
+        # Named after the route, without the patient UUID.
+        assert "-get-dhos_v1_gdm_pdf_patient_uuid-" in path.name
+        assert "some-uuid" not in path.name
+        if profile_format == "pstats":
+            assert pstats.Stats(str(path)).get_stats_profile().func_profiles
+        else:
+            assert path.read_text()
+
+        response = client.get("/profiles", headers={"Authorization": "Bearer TOKEN"})
+        assert response.status_code == 200
+        assert response.json is not None
+        assert [profile["name"] for profile in response.json] == [path.name]
+
+    def test_not_profiled_without_scope(
+        self, app: Flask, client: Client, profile_dir: Path
+    ) -> None:
+        app.config["IGNORE_JWT_VALIDATION"] = False
+        response = client.get(
+            "/dhos/v1/gdm_pdf/some-uuid", headers={"X-Profile": "collapsed"}
+        )
+        assert "X-Profile-File" not in response.headers
+        assert not profile_dir.exists()
+
+        response = client.get("/profiles")
+        assert response.status_code == 403
+
+    def test_not_profiled_without_header(
+        self, client: Client, profile_dir: Path
+    ) -> None:
+        response = client.get(
+            "/dhos/v1/gdm_pdf/some-uuid", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        assert "X-Profile-File" not in response.headers
+        assert not profile_dir.exists()
@@ -0,0 +1,82 @@
+from typing import Dict
+
+import pytest
+from _pytest.logging import LogCaptureFixture
+from flask import Flask
+from mock import Mock
+from pytest_mock import MockFixture
+from werkzeug import Client
+
+from dhos_pdf_api.blueprint_api import controller
+from dhos_pdf_api.metrics import time_stage
+from dhos_pdf_api.request_timing import RequestTimings, server_timing
+
+
+class TestRequestTimings:
+    def test_stages_are_grouped(self) -> None:
+        timings = RequestTimings()
+        timings.add("write", 0.002)
+        timings.add("fsync", 0.003)
+        timings.add("engine_http", 0.5)
+        timings.add("cda_validate", 1.0)
+        milliseconds: Dict[str, float] = timings.milliseconds()
+        assert milliseconds["io"] == pytest.approx(5)
+        assert milliseconds["engine"] == pytest.approx(500)
+        assert milliseconds["render"] == 0
+        assert milliseconds["total"] >= 0
+
+    def test_server_timing(self) -> None:
+        assert (
+            server_timing({"validation": 1.25, "total": 10})
+            == "validation;dur=1.2, total;dur=10.0"
+        )
+
+
+@pytest.mark.usefixtures("mock_bearer_validation")
+class TestRequestTimingApi:
+    def test_server_timing_header(
+        self, app: Flask, client: Client, mocker: MockFixture
+    ) -> None:
+        def get_patient_pdf(patient_uuid: str, product_name: str) -> bytes:
+            with time_stage(product_name, "filename_lookup_save"):
+                pass
+            return b"%PDF-1.4"
+
+        mock_get: Mock = mocker.patch.object(
+            controller, "get_patient_pdf", side_effect=get_patient_pdf
+        )
+        response = client.get(
+            "/dhos/v1/gdm_pdf/some-uuid", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        mock_get.assert_called_once()
+        names = [
+            entry.split(";")[0]
+            for entry in response.headers["Server-Timing"].split(", ")
+        ]
+        assert names == [
+            "validation",
+            "render",
+            "engine",
+            "io",
+            "db",
+            "publish",
+            "total",
+        ]
+
+    def test_no_header_outside_api(self, client: Client) -> None:
+        response = client.get("/running")
+        assert "Server-Timing" not in response.headers
+
+    def test_log_line_has_request_id(
+        self, client: Client, mocker: MockFixture, caplog: LogCaptureFixture
+    ) -> None:
+        mocker.patch.object(controller, "get_patient_pdf", return_value=b"%PDF-1.4")
+        response = client.get(
+            "/dhos/v1/gdm_pdf/some-uuid",
+            headers={"Authorization": "Bearer TOKEN", "X-Request-ID": "request-1"},
+        )
+        assert response.status_code == 200
+        record = next(r for r in caplog.records if "responded 200" in r.getMessage())
+        assert getattr(record, "request_id") == "request-1"
+        assert set(getattr(record, "timings_ms")) >= {"render", "total"}
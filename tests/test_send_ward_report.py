@@ -1,16 +1,27 @@
+import hashlib
+import io
 import json
+import os
 from pathlib import Path
 from time import sleep
-from typing import Any, List, Tuple
+from typing import Any, Dict, List, Tuple
 from uuid import uuid4
 
 import pytest
+from flask import Flask
 from flask_batteries_included.helpers import generate_uuid
+from pypdf import PdfReader
 from werkzeug import Client
 
 from dhos_pdf_api.blueprint_api import send_ward_report
 from dhos_pdf_api.blueprint_api.controller import generate_send_ward_report_pdf
+from dhos_pdf_api.blueprint_api.helpers import (
+    ward_report_digest,
+    ward_report_summary_path,
+    ward_report_thumbnail_path,
+)
 from dhos_pdf_api.blueprint_api.send_ward_report import SendWardReportWriter
+from dhos_pdf_api.models.ward_report import WardReport
 
 
 @pytest.mark.usefixtures("app")
@@ -32,8 +43,17 @@ class TestSendWardReport:
         "draw_bar_chart",
         "draw_bar_chart_text",
         "draw_vital_signs_recording",
+        "draw_pie_chart_headings",
+        "draw_pie_chart_legend_keys",
+        "draw_pie_chart_summary_text",
+        "draw_vital_signs_labels",
     ]
 
+    @pytest.fixture(autouse=True)
+    def static_layers(self, mocker: Any) -> Dict:
+        # Each test draws its own static layer.
+        return mocker.patch.dict(send_ward_report._static_layers, clear=True)
+
     @pytest.fixture
     def location_uuid(self) -> str:
         return str(uuid4())
@@ -72,6 +92,81 @@ class TestSendWardReport:
         writer.write()
         assert mock_draw.call_count == 1
 
+    def test_static_layer_is_drawn_once(
+        self, writer: SendWardReportWriter, mocker: Any
+    ) -> None:
+        spy = mocker.spy(writer, "draw_static_layer")
+        first = writer.write()
+        writer.hospital_name_ward_name = "Birch Hospital Hagrid Ward"
+        second = writer.write()
+        assert spy.call_count == 1
+
+        for content, name in ((first, self.ward_name), (second, "Hagrid Ward")):
+            text = PdfReader(io.BytesIO(content)).pages[0].extract_text()
+            assert name in text
+            assert "Overall Performance" in text
+            assert "had missing Systolic BP" in text
+
+    def test_failed_write_keeps_previous_report(
+        self, writer: SendWardReportWriter, pdf_path: Path, mocker: Any
+    ) -> None:
+        content = writer.write()
+        previous_report = pdf_path.read_bytes()
+        assert previous_report == content == writer.content
+
+        mocker.patch.object(writer, "draw_bar_chart", side_effect=RuntimeError)
+        with pytest.raises(RuntimeError):
+            writer.write()
+        assert pdf_path.read_bytes() == previous_report
+        # No temporary files are left behind.
+        digest = ward_report_digest(content)
+        assert sorted(pdf_path.parent.iterdir()) == sorted(
+            [
+                pdf_path,
+                ward_report_summary_path(pdf_path, digest),
+                ward_report_thumbnail_path(pdf_path, digest),
+            ]
+        )
+
+    def test_summary_and_thumbnail_are_saved(
+        self, writer: SendWardReportWriter, pdf_path: Path
+    ) -> None:
+        digest = ward_report_digest(writer.write())
+        summary = json.loads(ward_report_summary_path(pdf_path, digest).read_text())
+        assert summary["ward_name"] == self.ward_name
+        assert summary["report_month"] == self.report_month
+        assert summary["count_obs_sets_on_time"] == writer.data.count_obs_sets_on_time
+        assert set(summary["count_obs_missing"]) == {
+            "acvpu",
+            "hr",
+            "spo2",
+            "o2therapy",
+            "rr",
+            "sbp",
+            "temperature",
+        }
+        thumbnail = ward_report_thumbnail_path(pdf_path, digest).read_bytes()
+        assert thumbnail.startswith(b"\x89PNG")
+        assert len(thumbnail) < 10 * 1024
+
+    def test_earlier_summaries_and_thumbnails_are_removed(
+        self, writer: SendWardReportWriter, pdf_path: Path
+    ) -> None:
+        digests: List[str] = []
+        for ward_name in ("Ward A", "Ward B", "Ward C"):
+            writer.ward_name = ward_name
+            writer.hospital_name_ward_name = f"{self.hospital_name} {ward_name}"
+            digests.append(ward_report_digest(writer.write()))
+        # The replaced report's are kept for readers that have just read it.
+        assert sorted(pdf_path.parent.iterdir()) == sorted(
+            [pdf_path]
+            + [
+                path(pdf_path, digest)
+                for path in (ward_report_summary_path, ward_report_thumbnail_path)
+                for digest in digests[1:]
+            ]
+        )
+
     def test_file_name_is_correct(
         self, writer: SendWardReportWriter, output_pdf_filename: str
     ) -> None:
@@ -162,7 +257,7 @@ class TestSendWardReport:
         content = reader.read()
         assert isinstance(content, bytes)
 
-    def test_many_threads(self, pdf_output_path: Path) -> None:
+    def test_many_threads(self, app: Flask, pdf_output_path: Path) -> None:
         from multiprocessing.pool import ThreadPool
 
         n_threads = 2
@@ -170,27 +265,231 @@ class TestSendWardReport:
         pool = ThreadPool(processes=n_threads)
 
         results = pool.map(
-            threaded_writer, [(f"Ward {d}", pdf_output_path, d) for d in range(n_pdfs)]
+            threaded_writer,
+            [(app, f"Ward {d}", pdf_output_path, d) for d in range(n_pdfs)],
         )
         assert len(results) == n_pdfs
 
 
-def threaded_writer(args: Tuple[str, Path, int]) -> str:
-    ward_name, output_folder, index = args
+def threaded_writer(args: Tuple[Flask, str, Path, int]) -> str:
+    app, ward_name, output_folder, index = args
     sleep(index / 10)
     location_uuid = generate_uuid()
     data_frame = json.loads(
         Path("tests/sample_data/send_ward_report/sample_metric_data.json").read_text()
     )
-    generate_send_ward_report_pdf(
-        {
-            "pdf_data": data_frame["pdf_data"],
-            "hospital_name": "Birch Hospital",
-            "ward_name": ward_name,
-            "report_month": "March",
-            "report_year": "2019",
-            "location_uuid": location_uuid,
-        },
-        ward_report_folder=output_folder,
-    )
+    with app.app_context():
+        generate_send_ward_report_pdf(
+            {
+                "pdf_data": data_frame["pdf_data"],
+                "hospital_name": "Birch Hospital",
+                "ward_name": ward_name,
+                "report_month": "March",
+                "report_year": "2019",
+                "location_uuid": location_uuid,
+            },
+            ward_report_folder=output_folder,
+        )
     return location_uuid
+
+
+@pytest.mark.usefixtures("app", "mock_bearer_validation")
+class TestStoredWardReports:
+    @pytest.fixture
+    def post_data(self) -> Dict:
+        post_data = json.loads(
+            Path(
+                "tests/sample_data/send_ward_report/sample_metric_data.json"
+            ).read_text()
+        )
+        post_data["location_uuid"] = str(uuid4())
+        return post_data
+
+    def _post(self, client: Client, post_data: Dict) -> None:
+        response = client.post(
+            "/dhos/v1/ward_report",
+            json=post_data,
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 201, response.json
+
+    def test_get_by_month(
+        self, client: Client, post_data: Dict, pdf_output_path: Path
+    ) -> None:
+        self._post(client, post_data)
+        location_uuid = post_data["location_uuid"]
+        assert (pdf_output_path / location_uuid / "2019-08.pdf").exists()
+
+        response = client.get(
+            f"/dhos/v1/ward_report/{location_uuid}?year=2019&month=8",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.data.startswith(b"%PDF")
+
+        response = client.get(
+            f"/dhos/v1/ward_report/{location_uuid}",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+
+    def test_failed_rename_is_not_recorded(
+        self, app: Flask, post_data: Dict, pdf_output_path: Path, mocker: Any
+    ) -> None:
+        replace = os.replace
+
+        def fail_for_report(src: str, dst: str) -> None:
+            if dst.endswith(".pdf"):
+                raise OSError("No space left on device")
+            replace(src, dst)
+
+        mocker.patch.object(os, "replace", side_effect=fail_for_report)
+        location_uuid = post_data["location_uuid"]
+        with app.app_context(), pytest.raises(OSError):
+            generate_send_ward_report_pdf(
+                {
+                    key: post_data[key]
+                    for key in (
+                        "pdf_data",
+                        "hospital_name",
+                        "ward_name",
+                        "report_month",
+                        "report_year",
+                        "location_uuid",
+                    )
+                },
+                ward_report_folder=pdf_output_path,
+            )
+
+        assert not (pdf_output_path / location_uuid / "2019-08.pdf").exists()
+        # Only the summary and thumbnail, which were renamed before the report and
+        # belong to no report in place, so are never served.
+        assert sorted(
+            path.suffix for path in (pdf_output_path / location_uuid).iterdir()
+        ) == [".json", ".png"]
+        assert WardReport.query.filter_by(location_uuid=location_uuid).count() == 0
+
+    def test_get_missing_month(self, client: Client, post_data: Dict) -> None:
+        self._post(client, post_data)
+        response = client.get(
+            f"/dhos/v1/ward_report/{post_data['location_uuid']}?year=2019&month=9",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 404
+
+    def test_get_year_without_month(self, client: Client, post_data: Dict) -> None:
+        self._post(client, post_data)
+        response = client.get(
+            f"/dhos/v1/ward_report/{post_data['location_uuid']}?year=2019",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 400
+
+    def test_index(
+        self, client: Client, post_data: Dict, pdf_output_path: Path
+    ) -> None:
+        self._post(client, post_data)
+        post_data["report_month"] = "9"
+        self._post(client, post_data)
+        # A second report for the same month replaces the first.
+        self._post(client, post_data)
+        location_uuid = post_data["location_uuid"]
+
+        response = client.get(
+            f"/dhos/v1/ward_report/{location_uuid}/index",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        reports = response.json
+        assert reports is not None
+        assert [(r["year"], r["month"]) for r in reports] == [(2019, 9), (2019, 8)]
+        content = (pdf_output_path / location_uuid / "2019-09.pdf").read_bytes()
+        assert reports[0]["size_bytes"] == len(content)
+        assert reports[0]["sha256"] == hashlib.sha256(content).hexdigest()
+
+    def test_get_summary_and_thumbnail(self, client: Client, post_data: Dict) -> None:
+        self._post(client, post_data)
+        location_uuid = post_data["location_uuid"]
+
+        response = client.get(
+            f"/dhos/v1/ward_report/{location_uuid}/summary?year=2019&month=8",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.json is not None
+        assert response.json["location_uuid"] == location_uuid
+        assert response.json["hospital_name"] == post_data["hospital_name"]
+
+        response = client.get(
+            f"/dhos/v1/ward_report/{location_uuid}/thumbnail",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.mimetype == "image/png"
+        assert response.data.startswith(b"\x89PNG")
+
+    def test_summary_of_report_in_place(
+        self,
+        app: Flask,
+        client: Client,
+        post_data: Dict,
+        pdf_output_path: Path,
+        mocker: Any,
+    ) -> None:
+        self._post(client, post_data)
+        replace = os.replace
+
+        def fail_for_report(src: str, dst: str) -> None:
+            if dst.endswith(".pdf"):
+                raise OSError("No space left on device")
+            replace(src, dst)
+
+        # The new summary and thumbnail are in place, but the report isn't.
+        mock_replace = mocker.patch.object(os, "replace", side_effect=fail_for_report)
+        with app.app_context(), pytest.raises(OSError):
+            generate_send_ward_report_pdf(
+                {
+                    **{
+                        key: post_data[key]
+                        for key in (
+                            "pdf_data",
+                            "ward_name",
+                            "report_month",
+                            "report_year",
+                            "location_uuid",
+                        )
+                    },
+                    "hospital_name": "Elm Hospital",
+                },
+                ward_report_folder=pdf_output_path,
+            )
+        mock_replace.side_effect = replace
+
+        response = client.get(
+            f"/dhos/v1/ward_report/{post_data['location_uuid']}/summary",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.json is not None
+        assert response.json["hospital_name"] == post_data["hospital_name"]
+
+    def test_no_summary_for_legacy_report(
+        self, client: Client, pdf_output_path: Path
+    ) -> None:
+        location_uuid = str(uuid4())
+        (pdf_output_path / f"{location_uuid}.pdf").write_bytes(b"%PDF")
+        for output in ("summary", "thumbnail"):
+            response = client.get(
+                f"/dhos/v1/ward_report/{location_uuid}/{output}",
+                headers={"Authorization": "Bearer TOKEN"},
+            )
+            assert response.status_code == 404
+
+    def test_invalid_month(self, client: Client, post_data: Dict) -> None:
+        post_data["report_month"] = "Smarch"
+        response = client.post(
+            "/dhos/v1/ward_report",
+            json=post_data,
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 400
@@ -0,0 +1,154 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+from _pytest.capture import CaptureFixture
+from _pytest.logging import LogCaptureFixture
+from flask import Flask
+from pytest_mock import MockFixture
+
+from dhos_pdf_api.blueprint_api import controller
+from dhos_pdf_api.config import Configuration
+from dhos_pdf_api.helper.startup_profile import (
+    HEAVY_IMPORTS,
+    StartupProfiler,
+    budget_failures,
+    main,
+)
+
+HEAVY_MODULES = ("matplotlib", "numpy", "pandas")
+
+# Creates the app in a fresh interpreter and reports the memory it used and the heavy
+# modules it imported. With "eager" the ward report module is imported first, as the
+# controller used to do.
+STARTUP_SCRIPT = """
+import importlib, json, sys
+
+if sys.argv[1] == "eager":
+    importlib.import_module("dhos_pdf_api.blueprint_api.send_ward_report")
+from dhos_pdf_api.app import create_app
+
+create_app(testing=True, use_pgsql=False, use_sqlite=True)
+# Peak RSS of this process. ru_maxrss is no good here as Linux carries the parent's
+# value across exec.
+with open("/proc/self/status") as status:
+    peak_rss_kb = next(
+        int(line.split()[1]) for line in status if line.startswith("VmHWM:")
+    )
+print(
+    json.dumps(
+        {
+            "peak_rss_kb": peak_rss_kb,
+            "heavy_modules": [m for m in %r if m in sys.modules],
+        }
+    )
+)
+""" % (
+    HEAVY_MODULES,
+)
+
+
+def _measure_startup(mode: str) -> Dict:
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, mode],
+        cwd=Path(__file__).parent.parent,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return json.loads(result.stdout.decode().strip().splitlines()[-1])
+
+
+class TestStartup:
+    def test_create_app_does_not_import_ward_report_dependencies(self) -> None:
+        lazy = _measure_startup("lazy")
+        eager = _measure_startup("eager")
+
+        assert lazy["heavy_modules"] == []
+        assert eager["heavy_modules"] == list(HEAVY_MODULES)
+        # pandas, numpy and matplotlib account for well over 20MB of resident memory.
+        # Wall-clock time isn't compared, it is too noisy on a shared CI runner.
+        assert lazy["peak_rss_kb"] < eager["peak_rss_kb"] - 20 * 1024
+
+    def test_ward_report_warm_up(self) -> None:
+        controller.start_ward_report_warm_up().join(timeout=60)
+        assert controller.WARD_REPORT_MODULE in sys.modules
+
+    @pytest.mark.parametrize("warm_up", [True, False])
+    def test_create_app_starts_ward_report_warm_up(
+        self, mocker: MockFixture, warm_up: bool
+    ) -> None:
+        from dhos_pdf_api.app import create_app
+
+        mocker.patch.object(Configuration, "WARD_REPORT_WARM_UP", warm_up)
+        mock_warm_up = mocker.patch.object(controller, "start_ward_report_warm_up")
+        app: Flask = create_app(testing=True, use_pgsql=False, use_sqlite=True)
+        assert app.config["WARD_REPORT_WARM_UP"] is warm_up
+        assert mock_warm_up.call_count == int(warm_up)
+
+
+class TestStartupProfile:
+    def test_create_app_records_phases(self) -> None:
+        from dhos_pdf_api.app import create_app
+
+        profiler = StartupProfiler()
+        create_app(testing=True, use_pgsql=False, use_sqlite=True, profiler=profiler)
+        report = profiler.report()
+
+        assert [phase["phase"] for phase in report["phases"]] == [
+            "connexion",
+            "augment app",
+            "kombu",
+            "database",
+            "directories",
+        ]
+        for phase in report["phases"]:
+            assert phase["seconds"] >= 0
+            assert phase["rss_kb"] > 0
+        assert report["total_seconds"] >= sum(p["seconds"] for p in report["phases"])
+        assert report["peak_rss_kb"] > 0
+
+    def test_disabled_profiler_records_nothing(self) -> None:
+        profiler = StartupProfiler(enabled=False)
+        with profiler.phase("something"):
+            pass
+        assert profiler.phases == []
+
+    @pytest.mark.parametrize("enabled", [True, False])
+    def test_startup_profile_config(
+        self, mocker: MockFixture, caplog: LogCaptureFixture, enabled: bool
+    ) -> None:
+        from dhos_pdf_api.app import create_app
+
+        mocker.patch.object(Configuration, "STARTUP_PROFILE", enabled)
+        create_app(testing=True, use_pgsql=False, use_sqlite=True)
+        logged = any("Startup phase 'connexion'" in m for m in caplog.messages)
+        assert logged is enabled
+
+    def test_budget_failures(self) -> None:
+        report = {
+            "phases": [
+                {"phase": "fast", "seconds": 0.1, "rss_kb": 1, "rss_delta_kb": 1},
+                {"phase": "slow", "seconds": 2.0, "rss_kb": 1, "rss_delta_kb": 1},
+            ],
+            "total_seconds": 2.5,
+            "peak_rss_kb": 200 * 1024,
+        }
+        assert budget_failures(report) == []
+        assert budget_failures(report, max_seconds=3, max_rss_mb=250) == []
+        failures = budget_failures(
+            report, max_seconds=2, max_rss_mb=100, max_phase_seconds=1
+        )
+        assert len(failures) == 3
+        assert "phase 'slow'" in failures[2]
+
+    @pytest.mark.parametrize("max_seconds,expected", [("0", 1), ("600", 0)])
+    def test_main_fails_when_over_budget(
+        self, capsys: CaptureFixture, max_seconds: str, expected: int
+    ) -> None:
+        assert main(["--sqlite", "--json", "--max-seconds", max_seconds]) == expected
+        report = json.loads(capsys.readouterr().out)
+        assert report["phases"][0]["phase"] == f"import {HEAVY_IMPORTS[0]}"
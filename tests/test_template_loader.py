@@ -0,0 +1,109 @@
+import json
+import zipfile
+from pathlib import Path
+from typing import Dict
+
+import pytest
+from flask import Flask
+from jinja2 import ModuleLoader, PackageLoader
+from pytest_mock import MockFixture
+
+from dhos_pdf_api.blueprint_api import template_loader
+from dhos_pdf_api.blueprint_api.render_context import shape_patient_pdf_context
+
+
+@pytest.fixture
+def compiled_templates(tmp_path: Path) -> Path:
+    target = tmp_path / "templates.zip"
+    template_loader.compile_templates(target)
+    return target
+
+
+@pytest.mark.usefixtures("app_context")
+class TestTemplateLoader:
+    def test_compiled_templates_match_source(self, compiled_templates: Path) -> None:
+        assert template_loader.verify_compiled_templates(compiled_templates) == []
+
+    def test_compiled_templates_render_same_as_source(
+        self,
+        compiled_templates: Path,
+        sample_gdm_data: Dict,
+        sample_dbm_post_data_session: Dict,
+    ) -> None:
+        compiled = template_loader.create_environment(str(compiled_templates))
+        source = template_loader.create_environment()
+        assert isinstance(compiled.loader, ModuleLoader)
+        assert isinstance(source.loader, PackageLoader)
+        for name, data in [
+            ("gdm_181_patient.html", shape_patient_pdf_context(sample_gdm_data)),
+            (
+                "dbm_patient.html",
+                shape_patient_pdf_context(sample_dbm_post_data_session),
+            ),
+        ]:
+            assert compiled.get_template(name).render(**data) == source.get_template(
+                name
+            ).render(**data)
+
+    def test_out_of_date_templates_are_compiled_from_source(
+        self, compiled_templates: Path, tmp_path: Path
+    ) -> None:
+        # Rewrite the zip with a manifest that doesn't match the source.
+        stale = tmp_path / "stale.zip"
+        with zipfile.ZipFile(compiled_templates) as src, zipfile.ZipFile(
+            stale, "w"
+        ) as dst:
+            for item in src.infolist():
+                content = src.read(item)
+                if item.filename == template_loader.MANIFEST_NAME:
+                    manifest = json.loads(content)
+                    manifest["dbm_patient.html"] = "0" * 64
+                    manifest["removed.html"] = "0" * 64
+                    content = json.dumps(manifest).encode()
+                dst.writestr(item, content)
+
+        assert template_loader.verify_compiled_templates(stale) == [
+            "dbm_patient.html",
+            "removed.html",
+        ]
+        env = template_loader.create_environment(str(stale))
+        assert isinstance(env.loader, PackageLoader)
+
+    @pytest.mark.parametrize("content", [b"", b"not a zip"])
+    def test_unreadable_templates_are_compiled_from_source(
+        self, tmp_path: Path, content: bytes
+    ) -> None:
+        target = tmp_path / "templates.zip"
+        target.write_bytes(content)
+        env = template_loader.create_environment(str(target))
+        assert isinstance(env.loader, PackageLoader)
+
+    def test_bytecode_cache(self, tmp_path: Path, mocker: MockFixture) -> None:
+        cache_dir = tmp_path / "jinja-cache"
+        env = template_loader.create_environment(bytecode_cache_dir=str(cache_dir))
+        env.get_template("gdm_181_patient.html")
+        assert len(list(cache_dir.iterdir())) == 1
+
+        # A new environment loads the template from the cache.
+        env = template_loader.create_environment(bytecode_cache_dir=str(cache_dir))
+        mock_compile = mocker.patch.object(env, "compile")
+        env.get_template("gdm_181_patient.html")
+        assert mock_compile.call_count == 0
+
+
+def test_compile_templates_cli(app: Flask, tmp_path: Path) -> None:
+    target = tmp_path / "templates.zip"
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["compile-templates", str(target)])
+    assert result.exit_code == 0, result.output
+    assert "match the source templates" in result.output
+
+    result = runner.invoke(args=["verify-templates", str(target)])
+    assert result.exit_code == 0, result.output
+
+    with zipfile.ZipFile(target, "a") as compiled:
+        compiled.writestr(template_loader.MANIFEST_NAME, "{}")
+    result = runner.invoke(args=["verify-templates", str(target)])
+    assert result.exit_code == 1
+    assert "dbm_patient.html, gdm_181_patient.html" in result.output
@@ -0,0 +1,133 @@
+import json
+from datetime import date
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from flask import Flask
+from werkzeug import Client
+
+from dhos_pdf_api.blueprint_api.send_ward_report import SendWardReportData
+from dhos_pdf_api.blueprint_api.ward_metric_store import METRIC_NAMES, WardMetricStore
+
+SAMPLE_DATA = Path("tests/sample_data/send_ward_report/sample_metric_data.json")
+
+
+@pytest.fixture
+def ward_report_data() -> Dict:
+    return json.loads(SAMPLE_DATA.read_text())
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> WardMetricStore:
+    return WardMetricStore(tmp_path / "location.npy")
+
+
+def _on_day(pdf_data: List[Dict], day: str) -> List[Dict]:
+    return [metric for metric in pdf_data if metric["metric_date"] == day]
+
+
+def test_add_and_read_back(store: WardMetricStore, ward_report_data: Dict) -> None:
+    store.add(ward_report_data["pdf_data"])
+    daily_metrics = store.daily_metrics(date(2019, 8, 1), date(2019, 8, 31))
+    assert list(daily_metrics.index) == ["2019-08-01", "2019-08-02"]
+    assert list(daily_metrics.columns) == METRIC_NAMES
+    assert daily_metrics.loc["2019-08-02", "count_obs_sets_on_time_high_risk"] == 244
+
+
+def test_add_merges_days(store: WardMetricStore, ward_report_data: Dict) -> None:
+    pdf_data: List[Dict] = ward_report_data["pdf_data"]
+    store.add(_on_day(pdf_data, "2019-08-02"))
+    store.add(_on_day(pdf_data, "2019-08-01"))
+    later = [
+        {**metric, "metric_date": "2019-08-05", "metric_value": 1}
+        for metric in _on_day(pdf_data, "2019-08-01")
+    ]
+    store.add(later)
+
+    daily_metrics = store.daily_metrics(date(2019, 8, 1), date(2019, 8, 31))
+    # Days between the posted ones with no metrics are left out.
+    assert list(daily_metrics.index) == ["2019-08-01", "2019-08-02", "2019-08-05"]
+    assert daily_metrics.loc["2019-08-05"].sum() == len(METRIC_NAMES)
+
+
+def test_add_replaces_values(store: WardMetricStore, ward_report_data: Dict) -> None:
+    store.add(ward_report_data["pdf_data"])
+    store.add(
+        [
+            {
+                "metric_name": "count_obs_sets_partial",
+                "metric_date": "2019-08-01",
+                "metric_value": 7,
+            },
+            {"metric_name": "unknown", "metric_date": "2019-08-01", "metric_value": 1},
+        ]
+    )
+    daily_metrics = store.daily_metrics(date(2019, 8, 1), date(2019, 8, 1))
+    assert daily_metrics.loc["2019-08-01", "count_obs_sets_partial"] == 7
+    assert daily_metrics.loc["2019-08-01", "count_obs_sets_complete"] > 0
+
+
+def test_daily_metrics_outside_stored_days(
+    store: WardMetricStore, ward_report_data: Dict
+) -> None:
+    assert store.daily_metrics(date(2019, 8, 1), date(2019, 8, 31)).empty
+    store.add(ward_report_data["pdf_data"])
+    assert store.daily_metrics(date(2019, 7, 1), date(2019, 7, 31)).empty
+    assert store.daily_metrics(date(2019, 9, 1), date(2019, 9, 30)).empty
+
+
+def test_report_data_matches_posted_metrics(
+    store: WardMetricStore, ward_report_data: Dict
+) -> None:
+    pdf_data: List[Dict] = ward_report_data["pdf_data"]
+    store.add(pdf_data)
+    from_store = SendWardReportData(
+        [],
+        ward_report_data["location_uuid"],
+        store.daily_metrics(date(2019, 8, 1), date(2019, 8, 31)),
+    )
+    posted = SendWardReportData(pdf_data, ward_report_data["location_uuid"])
+
+    assert from_store.perc_obs_sets_on_time == posted.perc_obs_sets_on_time
+    assert from_store.perc_obs_sets_complete == posted.perc_obs_sets_complete
+    assert from_store.count_obs_missing_spo2 == posted.count_obs_missing_spo2
+    assert list(from_store.out_df.index) == list(posted.out_df.index)
+    assert (
+        from_store.out_df["perc_obs_sets_on_time"]
+        == posted.out_df["perc_obs_sets_on_time"]
+    ).all()
+
+
+@pytest.mark.usefixtures("mock_bearer_validation")
+def test_post_new_days_only(
+    app: Flask, client: Client, ward_report_data: Dict, tmp_path: Path
+) -> None:
+    app.config["WARD_METRIC_STORE_DIR"] = str(tmp_path / "metrics")
+    pdf_data: List[Dict] = ward_report_data["pdf_data"]
+    for day in ("2019-08-01", "2019-08-02"):
+        response = client.post(
+            "/dhos/v1/ward_report",
+            json={**ward_report_data, "pdf_data": _on_day(pdf_data, day)},
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 201, response.json
+
+    store = WardMetricStore(
+        tmp_path / "metrics" / f"{ward_report_data['location_uuid']}.npy"
+    )
+    daily_metrics = store.daily_metrics(date(2019, 8, 1), date(2019, 8, 31))
+    assert list(daily_metrics.index) == ["2019-08-01", "2019-08-02"]
+
+
+@pytest.mark.usefixtures("mock_bearer_validation")
+def test_post_without_metrics_for_month(
+    app: Flask, client: Client, ward_report_data: Dict, tmp_path: Path
+) -> None:
+    app.config["WARD_METRIC_STORE_DIR"] = str(tmp_path / "metrics")
+    response = client.post(
+        "/dhos/v1/ward_report",
+        json={**ward_report_data, "report_month": "September", "pdf_data": []},
+        headers={"Authorization": "Bearer TOKEN"},
+    )
+    assert response.status_code == 400
@@ -0,0 +1,126 @@
+import json
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+from flask import Flask
+from flask_batteries_included.helpers.error_handler import EntityNotFoundException
+from werkzeug import Client
+
+from dhos_pdf_api.blueprint_api.ward_metric_store import WardMetricStore
+from dhos_pdf_api.blueprint_api.ward_trend_report import trend_report_data
+
+SAMPLE_DATA = Path("tests/sample_data/send_ward_report/sample_metric_data.json")
+WARD_A = "5b3b5f7c-2a57-4e8b-9a2e-6c1d0f0e9a11"
+WARD_B = "0c6f1e3d-8b7a-4f5e-a1d2-3e4f5a6b7c8d"
+LOCATIONS: List[Dict] = [
+    {"location_uuid": WARD_A, "ward_name": "Ward A"},
+    {"location_uuid": WARD_B, "ward_name": "Ward B"},
+]
+
+
+@pytest.fixture
+def metric_store_dir(tmp_path: Path) -> Path:
+    pdf_data: List[Dict] = json.loads(SAMPLE_DATA.read_text())["pdf_data"]
+    WardMetricStore(tmp_path / f"{WARD_A}.npy").add(pdf_data)
+    # Ward B has the same metrics in August and September.
+    WardMetricStore(tmp_path / f"{WARD_B}.npy").add(
+        pdf_data
+        + [
+            {**metric, "metric_date": metric["metric_date"].replace("-08-", "-09-")}
+            for metric in pdf_data
+        ]
+    )
+    return tmp_path
+
+
+def test_trend_report_data(metric_store_dir: Path) -> None:
+    hospital, wards = trend_report_data(
+        metric_store_dir, LOCATIONS, date(2019, 8, 1), date(2019, 9, 30)
+    )
+    assert [name for name, _ in wards] == ["Ward A", "Ward B"]
+    ward_a, ward_b = wards[0][1], wards[1][1]
+    assert list(ward_a.out_df.index) == ["2019-08"]
+    assert list(ward_b.out_df.index) == ["2019-08", "2019-09"]
+    assert list(hospital.out_df.index) == ["2019-08", "2019-09"]
+
+    assert ward_b.count_obs_sets_on_time == 2 * ward_a.count_obs_sets_on_time
+    assert hospital.count_obs_sets_on_time == 3 * ward_a.count_obs_sets_on_time
+    # The same metrics in each ward and month give the same percentages.
+    assert hospital.perc_obs_sets_on_time == pytest.approx(ward_a.perc_obs_sets_on_time)
+    assert hospital.out_df.loc["2019-08", "count_obs_sets_on_time"] == (
+        2 * ward_a.out_df.loc["2019-08", "count_obs_sets_on_time"]
+    )
+
+
+def test_trend_report_data_leaves_out_wards_without_metrics(
+    metric_store_dir: Path,
+) -> None:
+    _, wards = trend_report_data(
+        metric_store_dir, LOCATIONS, date(2019, 9, 1), date(2019, 12, 31)
+    )
+    assert [name for name, _ in wards] == ["Ward B"]
+
+    with pytest.raises(EntityNotFoundException):
+        trend_report_data(
+            metric_store_dir, LOCATIONS, date(2020, 1, 1), date(2020, 12, 31)
+        )
+
+
+def test_trend_report_data_keeps_to_metric_store(metric_store_dir: Path) -> None:
+    locations = [{"location_uuid": "../ward", "ward_name": "Ward A"}]
+    with pytest.raises(ValueError):
+        trend_report_data(
+            metric_store_dir / "store", locations, date(2019, 8, 1), date(2019, 9, 30)
+        )
+
+
+@pytest.mark.usefixtures("mock_bearer_validation")
+class TestWardTrendReportEndpoint:
+    def _post(self, client: Client, start_month: str, end_month: str) -> Any:
+        return client.post(
+            "/dhos/v1/ward_trend_report",
+            json={
+                "hospital_name": "Birchy Hospital",
+                "locations": LOCATIONS,
+                "start_month": start_month,
+                "end_month": end_month,
+            },
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+
+    def test_trend_report(
+        self, app: Flask, client: Client, metric_store_dir: Path
+    ) -> None:
+        app.config["WARD_METRIC_STORE_DIR"] = str(metric_store_dir)
+        response = self._post(client, "2019-07", "2019-09")
+        assert response.status_code == 200
+        assert response.data.startswith(b"%PDF")
+
+    def test_invalid_months(
+        self, app: Flask, client: Client, metric_store_dir: Path
+    ) -> None:
+        app.config["WARD_METRIC_STORE_DIR"] = str(metric_store_dir)
+        assert self._post(client, "July 2019", "2019-09").status_code == 400
+        assert self._post(client, "2019-09", "2019-07").status_code == 400
+
+    def test_metrics_not_stored(self, app: Flask, client: Client) -> None:
+        app.config["WARD_METRIC_STORE_DIR"] = None
+        assert self._post(client, "2019-07", "2019-09").status_code == 404
+
+    def test_invalid_location_uuid(
+        self, app: Flask, client: Client, metric_store_dir: Path
+    ) -> None:
+        app.config["WARD_METRIC_STORE_DIR"] = str(metric_store_dir)
+        response = client.post(
+            "/dhos/v1/ward_trend_report",
+            json={
+                "hospital_name": "Birchy Hospital",
+                "locations": [{"location_uuid": "../ward", "ward_name": "Ward A"}],
+                "start_month": "2019-07",
+                "end_month": "2019-09",
+            },
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 400
@@ -0,0 +1,116 @@
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import pytest
+from prometheus_client import REGISTRY
+
+from dhos_pdf_api.blueprint_api.wkhtmltopdf import (
+    Wkhtmltopdf,
+    WkhtmltopdfLimits,
+    WkhtmltopdfTerminated,
+)
+
+# Stands in for wkhtmltopdf, behaving according to the HTML it is given.
+FAKE_WKHTMLTOPDF = """#!{python}
+import os, subprocess, sys, time
+html = sys.stdin.read()
+with open({pid_file!r}, "a") as pids:
+    pids.write(f"{{os.getpid()}}\\n")
+    if "CHILD" in html:
+        child = subprocess.Popen(["sleep", "60"])
+        pids.write(f"{{child.pid}}\\n")
+if "HANG" in html:
+    time.sleep(60)
+if "GROW" in html:
+    data = b"x" * (200 * 1024 * 1024)
+    time.sleep(60)
+if "FAIL" in html:
+    sys.stderr.write("Error: Failed loading page\\n")
+    sys.exit(1)
+sys.stdout.write("%PDF " + " ".join(sys.argv[1:]))
+"""
+
+
+@pytest.fixture
+def pid_file(tmp_path: Path) -> Path:
+    return tmp_path / "pids"
+
+
+@pytest.fixture
+def executable(tmp_path: Path, pid_file: Path) -> str:
+    path = tmp_path / "wkhtmltopdf"
+    path.write_text(
+        FAKE_WKHTMLTOPDF.format(python=sys.executable, pid_file=str(pid_file))
+    )
+    path.chmod(0o755)
+    return str(path)
+
+
+def _terminations(reason: str) -> float:
+    value: Optional[float] = REGISTRY.get_sample_value(
+        "dhos_pdf_wkhtmltopdf_terminations_total", {"reason": reason}
+    )
+    return value or 0.0
+
+
+def _running(pid: int) -> bool:
+    try:
+        state = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()[0]
+    except FileNotFoundError:
+        return False
+    return state != "Z"
+
+
+class TestWkhtmltopdf:
+    def test_render(self, executable: str) -> None:
+        wkhtmltopdf = Wkhtmltopdf(WkhtmltopdfLimits(timeout_seconds=10), executable)
+        options: Dict[str, Optional[str]] = {"--header-right": "Page [page]"}
+        pdf = wkhtmltopdf.render("<html></html>", options)
+        assert pdf == b"%PDF --header-right Page [page] --quiet - -"
+
+    def test_failure(self, executable: str) -> None:
+        wkhtmltopdf = Wkhtmltopdf(WkhtmltopdfLimits(timeout_seconds=10), executable)
+        with pytest.raises(IOError, match="Failed loading page"):
+            wkhtmltopdf.render("FAIL", {})
+
+    def test_timeout_kills_session(self, executable: str, pid_file: Path) -> None:
+        # Long enough for the fake to start its child when the machine is busy.
+        wkhtmltopdf = Wkhtmltopdf(WkhtmltopdfLimits(timeout_seconds=2), executable)
+        before = _terminations("timeout")
+        start = time.monotonic()
+
+        with pytest.raises(WkhtmltopdfTerminated) as error:
+            wkhtmltopdf.render("CHILD HANG", {})
+
+        assert error.value.reason == "timeout"
+        assert time.monotonic() - start < 10
+        assert _terminations("timeout") == before + 1
+        pid, child_pid = (int(pid) for pid in pid_file.read_text().split())
+        # The process has been reaped, and its own child killed. The child is delivered
+        # SIGKILL asynchronously, so may still be running briefly.
+        assert not Path(f"/proc/{pid}").exists()
+        deadline = time.monotonic() + 5
+        while _running(child_pid) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not _running(child_pid)
+
+    def test_memory_limit(self, executable: str) -> None:
+        wkhtmltopdf = Wkhtmltopdf(
+            WkhtmltopdfLimits(timeout_seconds=10, max_memory_mb=100), executable
+        )
+        before = _terminations("memory")
+
+        with pytest.raises(WkhtmltopdfTerminated) as error:
+            wkhtmltopdf.render("GROW", {})
+
+        assert error.value.reason == "memory"
+        assert _terminations("memory") == before + 1
+
+    def test_missing_executable(self, tmp_path: Path) -> None:
+        wkhtmltopdf = Wkhtmltopdf(
+            WkhtmltopdfLimits(timeout_seconds=10), str(tmp_path / "missing")
+        )
+        with pytest.raises(IOError, match="No wkhtmltopdf executable found"):
+            wkhtmltopdf.render("<html></html>", {})